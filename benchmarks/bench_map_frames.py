@@ -0,0 +1,71 @@
+# Cost of animating the prediction map: one deck per week with the borough
+# GeoJSON rebuilt every frame (previous behaviour) vs. a single deck built
+# once with the cached boundary payload and animated in the browser.
+# Run from the repo root with the database in data/:
+#     python -m benchmarks.bench_map_frames
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+
+from utils.database_queries import get_alcaldia_boundaries
+from utils.map_visualization import (
+    _prediction_frame, get_borough_geojson_payload, plot_prediction_animated_map
+)
+
+N_FRAMES = 4
+
+
+def legacy_boundary_layer():
+    df_bounds = get_alcaldia_boundaries()
+    geojson_features = []
+    for _, row in df_bounds.iterrows():
+        coords = json.loads(row['coordinates']) if isinstance(row['coordinates'], str) else row['coordinates']
+        if isinstance(coords, np.ndarray):
+            coords = coords.tolist()
+        rings = coords if row['geom_type'] == 'Polygon' else [ring for poly in coords for ring in poly]
+        for ring in rings:
+            geojson_features.append({
+                "type": "Feature",
+                "geometry": {"type": "Polygon", "coordinates": [[(lon, lat) for lon, lat in ring]]},
+            })
+    return pdk.Layer("GeoJsonLayer", data={"type": "FeatureCollection", "features": geojson_features},
+                     stroked=True, filled=False)
+
+
+def time_render(render, repeat=3):
+    times, size = [], 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        size = sum(len(spec) for spec in render())
+        times.append(time.perf_counter() - t0)
+    return np.median(times) * 1000, size
+
+
+def main():
+    pred_df = pd.DataFrame({
+        'Semana termina el': [f"2025-01-{d:02d}" for d in (5, 12, 19, 26)][:N_FRAMES],
+        'Prob. de evento (%)': np.linspace(5, 45, N_FRAMES),
+    })
+    get_alcaldia_boundaries()  # warm the query cache for both variants
+    get_borough_geojson_payload()
+
+    def before():
+        for prob in pred_df['Prob. de evento (%)']:
+            frame = _prediction_frame(19.4326, -99.1332, "Zócalo", float(prob))
+            column = pdk.Layer("ColumnLayer", data=frame, get_position=["lon", "lat"],
+                               get_elevation="liquid_height", radius=120, extruded=True)
+            yield pdk.Deck(layers=[legacy_boundary_layer(), column]).to_json()
+
+    def after():
+        yield plot_prediction_animated_map(19.4326, -99.1332, "Zócalo", pred_df, 150)
+
+    for label, render in [("before", before), ("after", after)]:
+        ms, size = time_render(render)
+        print(f"{label:>6}: {ms:8.1f} ms for {N_FRAMES} weeks  {size / 1024:8.1f} KiB sent")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# Per-layer payload of the crime map decks, with and without dropping
+# unused columns and quantizing coordinates before serialization.
+# Run from the repo root with the database in data/:
+#     python -m benchmarks.bench_map_payload
+import pandas as pd
+
+import utils.map_visualization as mv
+from utils.database_queries import get_metro_stations
+
+VARIANTS = {
+    "base": {},
+    "affluence": {"show_affluence": True},
+    "grid": {"show_grid": True},
+}
+
+
+def build_reports():
+    station = get_metro_stations().iloc[0]
+    reports = {}
+    for label, kwargs in VARIANTS.items():
+        mv.plot_crime_map.clear()
+        mv.plot_crime_map(**kwargs)
+        reports[label] = mv.get_payload_report("crime_map")
+    mv.plot_crime_map.clear()
+    mv.plot_crime_map(highlight_station=pd.Series(station))
+    reports["station"] = mv.get_payload_report("crime_map")
+    return reports
+
+
+def main():
+    slim_layer = mv.slim_layer
+    mv.slim_layer = lambda layer, tooltip=None: layer
+    before = build_reports()
+    mv.slim_layer = slim_layer
+    after = build_reports()
+
+    for label in before:
+        print(f"\n== {label}: {before[label]['kb'].sum():.1f} KB -> {after[label]['kb'].sum():.1f} KB")
+        table = after[label].assign(kb_before=before[label]["kb"].values)
+        print(table[["type", "rows", "kb_before", "kb", "serialize_ms"]].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# Memory of the crime frame used by the prediction model and peak memory
+# of the crime-side work of one prediction request (station radius
+# selection, daily series, day/hour/type report): the previous float64 /
+# datetime / object-string frame with full haversine passes and copies vs.
+# the compact frame with CrimeIndex row views.
+# Run from the repo root with the database in data/:
+#     python -m benchmarks.bench_model_memory
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import models.xgboost_plus_prophet as m
+
+STATIONS = 5
+RADIUS_M = 150
+
+
+def legacy_frame(rb):
+    # rb as load_and_normalize used to return it
+    old = pd.DataFrame({
+        "fecha_hecho": m.days_to_timestamps(rb["day"]),
+        "hora_hecho": [f"{h:02d}:00:00" if h >= 0 else None for h in rb["hora"]],
+        "lat": rb["lat"].astype(np.float64),
+        "lon": rb["lon"].astype(np.float64),
+        "delito": rb["delito"].astype(object),
+    })
+    old["hora_int"] = rb["hora"].where(rb["hora"] >= 0).astype(float)
+    old["tipo_robo"] = rb["tipo_robo"].astype(object)
+    return old
+
+def legacy_request(af, rb, st_lat, st_lon, station_key, radius_m):
+    d_m = m.haversine_m(st_lat, st_lon, rb["lat"].to_numpy(), rb["lon"].to_numpy())
+    rb_st = rb.loc[d_m <= radius_m].copy()
+    rb_st["ds"] = pd.to_datetime(rb_st["fecha_hecho"].dt.date)
+    rob_d = rb_st.groupby("ds").size().rename("robos").to_frame()
+    af_st = af[af["key"].map(m.canon_key_ascii) == station_key].copy()
+    af_st = af_st[["fecha","afluencia"]].dropna().rename(columns={"fecha":"ds"})
+    af_d = af_st.set_index("ds").resample("D")["afluencia"].sum().to_frame().reset_index()
+    daily = pd.merge(af_d, rob_d, on="ds", how="left")
+
+    rb_loc = rb.dropna(subset=["lat","lon","fecha_hecho"]).copy()
+    rb_loc["fecha_hecho"] = pd.to_datetime(rb_loc["fecha_hecho"], errors="coerce")
+    rb_loc = rb_loc.dropna(subset=["fecha_hecho"])
+    d_m = m.haversine_m(st_lat, st_lon, rb_loc["lat"].to_numpy(), rb_loc["lon"].to_numpy())
+    rb_st = rb_loc.loc[d_m <= radius_m].copy()
+    rb_st["dow"] = rb_st["fecha_hecho"].dt.weekday
+    dow_counts = rb_st["dow"].value_counts().sort_index()
+    rb_st["hora"] = pd.to_datetime(rb_st["hora_hecho"], format="%H:%M:%S", errors="coerce").dt.hour
+    rb_st = rb_st.dropna(subset=["hora"]).copy()
+    hour_counts = rb_st["hora"].astype(int).value_counts().reindex(range(24), fill_value=0)
+    tipo_counts = rb_st["delito"].astype(str).str.strip().str.lower().value_counts()
+    return daily, dow_counts, hour_counts, tipo_counts
+
+def compact_request(af, co, rb, station_key, radius_m):
+    daily, _ = m.build_daily_station_frame(af, co, rb, station_key, radius_m=radius_m)
+    report = m.hour_day_probability_report(station_key, rb, co, radius_m=radius_m)
+    return daily, report
+
+
+def measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2**20, elapsed * 1000
+
+
+def main():
+    af, co, rb = m.load_and_normalize()
+    m.get_crime_index(rb)  # shared, built once per data version
+    old = legacy_frame(rb)
+    print(f"rb frame: {old.memory_usage(deep=True).sum() / 2**20:8.1f} MiB -> "
+          f"{rb.memory_usage(deep=True).sum() / 2**20:6.1f} MiB  ({len(rb):,} rows)")
+
+    stations = co.head(STATIONS)
+    peaks = {"before": [], "after": []}
+    for _, st in stations.iterrows():
+        key = m.canon_key_ascii(st["key"])
+        lat, lon = float(st["lat"]), float(st["lon"])
+        # Only this station's affluence rows, so both variants measure the
+        # crime side of the request
+        af_st = af[af["key"] == st["key"]]
+        peaks["before"].append(measure(lambda: legacy_request(af_st, old, lat, lon, key, RADIUS_M)))
+        peaks["after"].append(measure(lambda: compact_request(af_st, co, rb, key, RADIUS_M)))
+
+    for label, runs in peaks.items():
+        mib, ms = np.median(np.array(runs), axis=0)
+        print(f"{label:>6}: peak {mib:8.1f} MiB per request  {ms:8.1f} ms  (median of {len(runs)} stations)")
+
+
+if __name__ == "__main__":
+    main()
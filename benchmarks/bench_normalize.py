@@ -0,0 +1,52 @@
+# Hour parsing and crime-type normalization in load_and_normalize over the
+# full crime table: per-row parsing (previous behaviour) vs. one pass over
+# the distinct values mapped back through factorized codes.
+# Run from the repo root with the database in data/:
+#     python -m benchmarks.bench_normalize
+import time
+
+import numpy as np
+import pandas as pd
+
+from models.xgboost_plus_prophet import normalize_tipo, parse_hours
+from utils.database_queries import get_all_crimes
+
+
+def legacy_parse_hour(h):
+    if pd.isna(h): return np.nan
+    s = str(h).strip()
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try: return pd.to_datetime(s, format=fmt).hour
+        except Exception: pass
+    try: return int(s.split(":")[0])
+    except Exception: return np.nan
+
+def legacy_normalize_tipo(values):
+    return (values.astype(str).str.strip().str.lower()
+            .str.normalize("NFKD").str.encode("ascii", errors="ignore").str.decode("ascii"))
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    rb = get_all_crimes()
+    print(f"{len(rb):,} crimes, {rb['hora_hecho'].nunique():,} distinct hours, "
+          f"{rb['delito'].nunique():,} distinct delitos")
+
+    h_old, t_old = timed(lambda s: s.apply(legacy_parse_hour), rb["hora_hecho"])
+    h_new, t_new = timed(parse_hours, rb["hora_hecho"])
+    same = np.array_equal(h_old.to_numpy(dtype=float), h_new, equal_nan=True)
+    print(f"hora_int : {t_old:8.2f} s -> {t_new:6.3f} s  ({t_old / t_new:,.0f}x)  identical: {same}")
+
+    d_old, t_old = timed(legacy_normalize_tipo, rb["delito"])
+    d_new, t_new = timed(normalize_tipo, rb["delito"])
+    same = np.array_equal(d_old.to_numpy(dtype=object), d_new)
+    print(f"tipo_robo: {t_old:8.2f} s -> {t_new:6.3f} s  ({t_old / t_new:,.0f}x)  identical: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Per-station Prophet + XGBoost models (one fit per station) vs. the pooled
+# XGBoost model (one fit on the stacked frames of every station): total
+# fit time, time to forecast every station, and one-day-ahead test MAE /
+# RMSE on the same chronological holdout rows of each station, next to
+# predicting each station's training mean.
+# Run from the repo root with the database in data/:
+#     python -m benchmarks.bench_pooled_model [n_stations]
+import logging
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import models.model_registry as model_registry
+import models.xgboost_plus_prophet as m
+
+STATIONS = 10
+RADIUS_M = 150
+
+
+def per_station(daily):
+    rows, models = [], {}
+    t0 = time.perf_counter()
+    for key, df in daily.items():
+        prop, scaler, xgb, feat_cols, (_, _, df_te) = m.fit_models_daily(df)
+        models[key] = (prop, scaler, xgb, feat_cols)
+        rows.append({"key": key, **model_registry.holdout_metrics(scaler, xgb, feat_cols, df_te)})
+    fit_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for key, df in daily.items():
+        _, base_lambda_week = m.weekly_base_lambda(df)
+        m.forecast_28d_daily_and_aggregate_weekly(df, *models[key], base_lambda_week=base_lambda_week)
+    return pd.DataFrame(rows).set_index("key"), fit_s, time.perf_counter() - t0
+
+def pooled(daily, registry):
+    t0 = time.perf_counter()
+    model, splits = m.fit_pooled_daily(daily, registry)
+    fit_s = time.perf_counter() - t0
+    metrics = m.pooled_holdout_metrics(model, splits)
+    baseline = {key: float(np.abs(te["robos"] - tr["robos"].mean()).mean()) for key, (tr, _, te) in splits.items()}
+
+    t0 = time.perf_counter()
+    m.predict_pooled(daily, model)
+    metrics = pd.DataFrame.from_dict(metrics, orient="index").assign(mae_media=pd.Series(baseline))
+    return metrics, fit_s, time.perf_counter() - t0
+
+def main():
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else STATIONS
+    af, co, rb = m.load_and_normalize()
+    registry = m.get_station_registry(af, co)
+    daily, skipped = m.build_station_frames(af, co, rb, registry.keys[:n], RADIUS_M, registry=registry)
+    print(f"{len(daily)} estaciones, radio {RADIUS_M} m ({len(skipped)} sin datos suficientes)")
+
+    results = {"por estación": per_station(daily), "conjunto": pooled(daily, registry)}
+    for label, (metrics, fit_s, pred_s) in results.items():
+        print(f"{label:>13}: fit {fit_s:8.1f} s   pronóstico {pred_s * 1000:8.1f} ms   "
+              f"MAE {metrics['mae'].mean():.4f}   RMSE {metrics['rmse'].mean():.4f}   (media por estación)")
+
+    print(f"{'media':>13}: MAE {results['conjunto'][0]['mae_media'].mean():.4f}   (media de entrenamiento por estación)")
+    both = results["por estación"][0][["mae"]].join(results["conjunto"][0][["mae"]], rsuffix="_conjunto")
+    better = int(np.sum(both["mae_conjunto"] < both["mae"]))
+    print(f"El modelo conjunto tiene menor MAE en {better} de {len(both)} estaciones.")
+
+
+if __name__ == "__main__":
+    main()
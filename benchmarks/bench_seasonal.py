@@ -0,0 +1,66 @@
+# Seasonal component of fit_models_daily: Prophet (cmdstan) vs. the
+# closed-form Fourier ridge in models/seasonal.py. Per station, the fit
+# time of the seasonal model alone, its own test MAE, and the fit time and
+# test MAE of the full seasonal + XGB model, on the same chronological
+# splits.
+# Run from the repo root with the database in data/:
+#     python -m benchmarks.bench_seasonal [n_stations]
+import logging
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import models.model_registry as model_registry
+import models.xgboost_plus_prophet as m
+from models.seasonal import ENGINES, make_seasonal
+
+STATIONS = 10
+RADIUS_M = 150
+
+
+def seasonal_only(df, engine):
+    df_tr, _, df_te = m.split_series_chron(df, test_frac=0.15, val_frac=0.15)
+    model = make_seasonal(engine, holidays=m._mx_basic_holidays())
+    t0 = time.perf_counter()
+    model.fit(df_tr[["ds", "robos"]].rename(columns={"robos": "y"}))
+    fit_s = time.perf_counter() - t0
+    yhat = np.clip(model.predict(df_te[["ds"]])["yhat"].to_numpy(), 0, None)
+    return fit_s, float(np.abs(yhat - df_te["robos"].to_numpy()).mean())
+
+def full_model(df, engine):
+    t0 = time.perf_counter()
+    _, scaler, xgb, feat_cols, (_, _, df_te) = m.fit_models_daily(df, seasonal=engine)
+    fit_s = time.perf_counter() - t0
+    return fit_s, model_registry.holdout_metrics(scaler, xgb, feat_cols, df_te)["mae"]
+
+def main():
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else STATIONS
+    af, co, rb = m.load_and_normalize()
+    registry = m.get_station_registry(af, co)
+    daily, skipped = m.build_station_frames(af, co, rb, registry.keys[:n], RADIUS_M, registry=registry)
+    print(f"{len(daily)} estaciones, radio {RADIUS_M} m ({len(skipped)} sin datos suficientes)")
+
+    rows = []
+    for key, df in daily.items():
+        for engine in ENGINES:
+            seas_s, seas_mae = seasonal_only(df, engine)
+            full_s, full_mae = full_model(df, engine)
+            rows.append({"key": key, "engine": engine, "seasonal_fit_s": seas_s, "seasonal_mae": seas_mae,
+                         "total_fit_s": full_s, "xgb_mae": full_mae})
+
+    res = pd.DataFrame(rows)
+    summary = res.groupby("engine").agg(
+        seasonal_fit_ms=("seasonal_fit_s", lambda s: 1000 * s.median()),
+        seasonal_mae=("seasonal_mae", "mean"),
+        total_fit_s=("total_fit_s", "sum"),
+        xgb_mae=("xgb_mae", "mean"),
+    )
+    print("\nMediana del fit estacional, MAE medio por estación, tiempo total de entrenamiento:")
+    print(summary.round(4).to_string())
+
+
+if __name__ == "__main__":
+    main()
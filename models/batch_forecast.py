@@ -0,0 +1,261 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+import pandas as pd
+from threadpoolctl import threadpool_limits
+
+import models.dataset_cache as dataset_cache
+import models.xgboost_plus_prophet as model
+from models.seasonal import ENGINES
+from utils.database_queries import get_write_connection
+
+FORECASTS_TABLE = "station_risk_forecasts"
+MODELS_TABLE = "station_models"
+
+# Read by OpenMP (XGBoost), BLAS and Stan when a worker starts
+THREAD_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "STAN_NUM_THREADS")
+
+
+def store_forecasts(forecasts, radius_m):
+    # One set of forecasts per radius: a new run replaces the previous one
+    con = get_write_connection()
+    try:
+        con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {FORECASTS_TABLE} (
+            key VARCHAR, nombre VARCHAR, lat DOUBLE, lon DOUBLE,
+            radius_m INTEGER, ds DATE,
+            robos_pred DOUBLE, prob_semana DOUBLE, riesgo VARCHAR,
+            generated_at TIMESTAMP
+        )
+        """)
+        con.execute(f"DELETE FROM {FORECASTS_TABLE} WHERE radius_m = {int(radius_m)}")
+        if not forecasts.empty:
+            con.register("df_forecasts", forecasts)
+            con.execute(f"INSERT INTO {FORECASTS_TABLE} BY NAME SELECT * FROM df_forecasts")
+    finally:
+        con.close()
+
+def store_models(models):
+    # Registry entries behind the forecasts, one row per station, radius
+    # and engine (seasonal component, or pooled with no seasonal term)
+    if models.empty:
+        return
+    con = get_write_connection()
+    try:
+        con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MODELS_TABLE} (
+            key VARCHAR, radius_m INTEGER, data_version VARCHAR, model_schema INTEGER,
+            train_start DATE, train_end DATE, n_train INTEGER,
+            n_test INTEGER, mae DOUBLE, rmse DOUBLE,
+            fit_seconds DOUBLE, reused BOOLEAN, created_at TIMESTAMP, task_seconds DOUBLE,
+            seasonal VARCHAR, pooled BOOLEAN
+        )
+        """)
+        # Tables written before the engine columns existed only hold Prophet models
+        con.execute(f"ALTER TABLE {MODELS_TABLE} ADD COLUMN IF NOT EXISTS seasonal VARCHAR DEFAULT 'prophet'")
+        con.execute(f"ALTER TABLE {MODELS_TABLE} ADD COLUMN IF NOT EXISTS pooled BOOLEAN DEFAULT FALSE")
+        con.register("df_models", models)
+        con.execute(f"""
+        DELETE FROM {MODELS_TABLE} t USING df_models m
+        WHERE t.key = m.key AND t.radius_m = m.radius_m
+        AND t.seasonal IS NOT DISTINCT FROM m.seasonal AND t.pooled = m.pooled
+        """)
+        con.execute(f"INSERT INTO {MODELS_TABLE} BY NAME SELECT * FROM df_models")
+    finally:
+        con.close()
+
+# ----------------------------
+# ---------- Workers ---------
+# ----------------------------
+_worker = {}
+
+def _init_worker(version, threads):
+    threadpool_limits(threads)
+    # The normalized frames are memory-mapped from the Feather cache, so
+    # workers share the parent's pages instead of receiving pickled copies
+    af, co, rb = model.load_and_normalize(version=version)
+    _worker.update(af=af, co=co, rb=rb, registry=model.get_station_registry(af, co),
+                   version=version, threads=threads)
+
+def _train(task):
+    key, radius_m, rows, refit, seasonal = task
+    w = _worker
+    t0 = time.perf_counter()
+    try:
+        result = model.forecast_station(
+            w["af"], w["co"], w["rb"], key, radius_m, rb_st=w["rb"].iloc[rows],
+            registry=w["registry"], version=w["version"], n_jobs=w["threads"], refit=refit,
+            seasonal=seasonal
+        )
+        return key, radius_m, result, time.perf_counter() - t0, None
+    except Exception as e:
+        return key, radius_m, None, time.perf_counter() - t0, str(e)
+
+def _model_row(meta, seconds):
+    row = {k: meta[k] for k in ("station_key", "radius_m", "data_version", "model_schema",
+                                "train_start", "train_end", "n_train", "fit_seconds", "reused")}
+    row.update(meta["metrics"])
+    row["created_at"] = pd.Timestamp(meta["created_at"])
+    row["task_seconds"] = round(seconds, 2)
+    row["seasonal"] = meta.get("seasonal", "prophet")
+    row["pooled"] = bool(meta.get("pooled", False))
+    return row
+
+# ----------------------------
+# ----------- Batch ----------
+# ----------------------------
+def pooled_conflicts(workers=None, refit=False, seasonal="prophet"):
+    # The pooled model is fitted in-process, always from scratch and
+    # without a seasonal term, so these options would do nothing
+    conflicts = []
+    if workers is not None: conflicts.append("--workers")
+    if refit: conflicts.append("--refit")
+    if seasonal != "prophet": conflicts.append("--seasonal")
+    return conflicts
+
+def train_stations(radii=(150,), station_keys=None, workers=None, refit=False, pooled=False,
+                   seasonal="prophet"):
+    """
+    Yields (key, radius_m, result, seconds, error) per station and radius
+    as workers finish; result is forecast_station's dict. pooled=True fits
+    one model per radius for all stations instead (no workers).
+    """
+    if pooled and pooled_conflicts(workers, refit, seasonal):
+        raise ValueError(f"El modelo conjunto no admite {', '.join(pooled_conflicts(workers, refit, seasonal))}.")
+    t0 = time.perf_counter()
+    radii = [int(r) for r in ([radii] if isinstance(radii, (int, float)) else radii)]
+    workers = workers or os.cpu_count() or 1
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    version = dataset_cache.data_version()
+    af, co, rb = model.load_and_normalize(version=version)
+    registry = model.get_station_registry(af, co)
+    keys_list = model.station_keys_for(registry, station_keys)
+
+    if pooled:
+        print(f"Datos cargados ({version}) en {time.perf_counter() - t0:.1f}s: {len(keys_list)} estaciones x "
+              f"{len(radii)} radios, un modelo conjunto por radio")
+        yield from _pooled_outputs(af, co, rb, registry, keys_list, radii, version)
+        return
+
+    tasks = []
+    for radius_m in radii:
+        near = model.crimes_near_stations(rb, registry, keys_list, radius_m)
+        tasks += [(key, radius_m, near[key], refit, seasonal) for key in keys_list]
+    print(f"Datos cargados ({version}) en {time.perf_counter() - t0:.1f}s: {len(keys_list)} estaciones x "
+          f"{len(radii)} radios = {len(tasks)} modelos, {workers} procesos x {threads} hilos")
+
+    if workers == 1:
+        _init_worker(version, threads)
+        outputs = map(_train, tasks)
+    else:
+        outputs = _pool_outputs(tasks, version, workers, threads)
+
+    for done, out in enumerate(outputs, 1):
+        key, radius_m, result, seconds, error = out
+        if error:
+            status = f"error, se omite ({error})"
+        elif result["model_meta"].get("pooled"):
+            status = "modelo conjunto"
+        elif result["model_meta"]["reused"]:
+            status = "reutilizado"
+        else:
+            status = f"entrenado ({result['model_meta']['fit_seconds']:.1f}s)"
+        print(f"[{done}/{len(tasks)}] {key} r={radius_m}m: {status}  {seconds:.1f}s  "
+              f"(total {time.perf_counter() - t0:.0f}s)")
+        yield out
+
+def _pooled_outputs(af, co, rb, registry, keys_list, radii, version):
+    for radius_m in radii:
+        t0 = time.perf_counter()
+        results, skipped = model.forecast_stations_pooled(af, co, rb, keys_list, radius_m,
+                                                          registry=registry, version=version)
+        seconds = (time.perf_counter() - t0) / len(keys_list)
+        print(f"Radio {radius_m} m: {len(results)} estaciones en {time.perf_counter() - t0:.1f}s")
+        for key in keys_list:
+            if key in results:
+                yield key, radius_m, results[key], seconds, None
+            else:
+                yield key, radius_m, None, seconds, skipped.get(key, "sin resultado")
+
+def _pool_outputs(tasks, version, workers, threads):
+    env = {v: os.environ.get(v) for v in THREAD_VARS}
+    os.environ.update({v: str(threads) for v in THREAD_VARS})
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                 initializer=_init_worker, initargs=(version, threads)) as pool:
+            futures = [pool.submit(_train, task) for task in tasks]
+            for fut in as_completed(futures):
+                yield fut.result()
+    finally:
+        for v, value in env.items():
+            if value is None: os.environ.pop(v, None)
+            else: os.environ[v] = value
+
+def store_batch(outputs, radii, elapsed=None):
+    # station_risk_forecasts per radius, station_models and a timing report
+    radii = [int(r) for r in ([radii] if isinstance(radii, (int, float)) else radii)]
+    generated_at = pd.Timestamp.now()
+    forecasts, models, failed = [], [], []
+    for key, radius_m, result, seconds, error in outputs:
+        if error:
+            failed.append((key, radius_m))
+            continue
+        forecasts.append(result["forecast"])
+        models.append(_model_row(result["model_meta"], seconds))
+
+    forecasts = pd.concat(forecasts, ignore_index=True) if forecasts else pd.DataFrame()
+    if not forecasts.empty:
+        forecasts["ds"] = pd.to_datetime(forecasts["ds"]).dt.date
+        forecasts["generated_at"] = generated_at
+    for radius_m in radii:
+        part = forecasts[forecasts["radius_m"] == radius_m] if not forecasts.empty else forecasts
+        if part.empty:
+            print(f"Radio {radius_m} m: no se generó ningún pronóstico.")
+            continue
+        store_forecasts(part, radius_m)
+    models = pd.DataFrame(models).rename(columns={"station_key": "key"})
+    store_models(models)
+
+    elapsed_text = f" en {elapsed:.1f}s" if elapsed is not None else ""
+    print(f"\n- {FORECASTS_TABLE} / {MODELS_TABLE}: {len(models)} modelos{elapsed_text} "
+          f"(suma de tareas {models['task_seconds'].sum() if len(models) else 0:.1f}s)")
+    if not models.empty:
+        report = models.groupby("radius_m").agg(
+            modelos=("key", "size"), reutilizados=("reused", "sum"),
+            fit_s=("fit_seconds", "sum"), tarea_s=("task_seconds", "sum"), mae=("mae", "mean"),
+        )
+        print(report.round(3).to_string())
+    if failed:
+        print(f"Sin pronóstico ({len(failed)}): " + ", ".join(f"{k}@{r}m" for k, r in failed))
+    return forecasts
+
+def run_batch(radii=(150,), station_keys=None, workers=None, refit=False, pooled=False, seasonal="prophet"):
+    t0 = time.perf_counter()
+    outputs = list(train_stations(radii, station_keys, workers, refit, pooled, seasonal))
+    return store_batch(outputs, radii, elapsed=time.perf_counter() - t0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Weekly risk forecasts for every metro station.")
+    parser.add_argument("--radius", type=int, nargs="+", default=[150],
+                        help="One or more radii in metres.")
+    parser.add_argument("--stations", nargs="*", default=None,
+                        help="Station keys to forecast (default: all).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: one per CPU).")
+    parser.add_argument("--refit", action="store_true",
+                        help="Retrain even when the registry has fresh models.")
+    parser.add_argument("--pooled", action="store_true",
+                        help="One XGBoost model per radius for all stations.")
+    parser.add_argument("--seasonal", choices=ENGINES, default="prophet",
+                        help="Seasonal component of the per-station models.")
+    args = parser.parse_args()
+    if args.pooled and pooled_conflicts(args.workers, args.refit, args.seasonal):
+        parser.error(f"--pooled no admite {', '.join(pooled_conflicts(args.workers, args.refit, args.seasonal))}")
+
+    run_batch(radii=args.radius, station_keys=args.stations, workers=args.workers,
+              refit=args.refit, pooled=args.pooled, seasonal=args.seasonal)
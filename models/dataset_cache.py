@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from utils.database_queries import get_model_data_fingerprint
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CACHE_DIR = os.environ.get("MODEL_CACHE_DIR", os.path.join(BASE_DIR, "data", "model_cache"))
+
+FRAMES = ("af", "co", "rb")
+
+_memo = {}
+_lock = threading.Lock()
+
+
+# ----------------------------
+# ------- Data version -------
+# ----------------------------
+def data_version():
+    """
+    Short hash of the source tables' fingerprint. Everything derived from
+    af/co/rb (normalized frames, indexes, fitted models) is keyed on it.
+    """
+    fp = get_model_data_fingerprint()
+    raw = json.dumps({k: str(v) for k, v in fp.items()}, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+# ----------------------------
+# ------- Feather store ------
+# ----------------------------
+def _read(folder):
+    paths = [os.path.join(folder, f"{name}.feather") for name in FRAMES]
+    if not all(os.path.exists(p) for p in paths):
+        return None
+    # Uncompressed Feather maps straight from the page cache: numeric
+    # columns are not copied, and every process shares the same pages.
+    return tuple(feather.read_table(p, memory_map=True).to_pandas() for p in paths)
+
+def _write(folder, frames):
+    # Written to a private folder and renamed into place, so readers in
+    # other processes never see a half-written version.
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = f"{folder}.{os.getpid()}.tmp"
+    os.makedirs(tmp, exist_ok=True)
+    for name, df in zip(FRAMES, frames):
+        table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+        feather.write_feather(table, os.path.join(tmp, f"{name}.feather"), compression="uncompressed")
+    try:
+        os.replace(tmp, folder)
+    except OSError:
+        # Another process stored the same version first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def _prune(keep):
+    for entry in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, entry)
+        if entry != keep and not entry.endswith(".tmp") and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+def cached_frames(build, schema=1, version=None):
+    """
+    (af, co, rb) for the current data version and frame `schema`: from
+    this process' memory, else from the Feather files, else built with
+    `build()` and stored. Older versions are removed when a new one is
+    written.
+    """
+    entry = f"{version or data_version()}_s{schema}"
+    with _lock:
+        if entry in _memo:
+            return _memo[entry]
+
+        frames = _read(os.path.join(CACHE_DIR, entry))
+        if frames is None:
+            frames = build()
+            _write(os.path.join(CACHE_DIR, entry), frames)
+            _prune(keep=entry)
+
+        _memo.clear()
+        _memo[entry] = frames
+        return frames
+
+def clear_cache():
+    with _lock:
+        _memo.clear()
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
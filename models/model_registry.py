@@ -0,0 +1,162 @@
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+from xgboost import XGBRegressor
+
+from models.seasonal import seasonal_from_json, seasonal_to_json
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MODELS_DIR = os.environ.get("MODEL_REGISTRY_DIR", os.path.join(BASE_DIR, "data", "models"))
+
+# Bump when features or model settings change, so artifacts fitted by
+# older code are not served for the same data version.
+MODEL_SCHEMA = 3
+
+
+def _entry(version):
+    return f"{version}_m{MODEL_SCHEMA}"
+
+def artifact_dir(station_key, radius_m, version, seasonal="prophet"):
+    return os.path.join(MODELS_DIR, _entry(version), f"{station_key}_r{int(radius_m)}_{seasonal}")
+
+# ----------------------------
+# ------ Serialization -------
+# ----------------------------
+def _scaler_to_dict(scaler):
+    return {
+        "mean": scaler.mean_.tolist(),
+        "scale": scaler.scale_.tolist(),
+        "var": scaler.var_.tolist(),
+        "n_samples_seen": int(np.max(scaler.n_samples_seen_)),
+    }
+
+def _scaler_from_dict(d):
+    scaler = StandardScaler()
+    scaler.mean_ = np.asarray(d["mean"])
+    scaler.scale_ = np.asarray(d["scale"])
+    scaler.var_ = np.asarray(d["var"])
+    scaler.n_samples_seen_ = d["n_samples_seen"]
+    scaler.n_features_in_ = len(scaler.mean_)
+    return scaler
+
+def holdout_metrics(scaler, xgb, feat_cols, df_te):
+    if df_te is None or len(df_te) == 0:
+        return {"n_test": 0, "mae": None, "rmse": None}
+    pred = np.clip(xgb.predict(scaler.transform(df_te[feat_cols].values)), 0, None)
+    err = pred - df_te["robos"].to_numpy()
+    return {"n_test": int(len(df_te)),
+            "mae": round(float(np.abs(err).mean()), 4),
+            "rmse": round(float(np.sqrt((err ** 2).mean())), 4)}
+
+# ----------------------------
+# --------- Registry ---------
+# ----------------------------
+def artifact_meta(station_key, radius_m, version, scaler, xgb, feat_cols, splits, fit_seconds,
+                  seasonal="prophet"):
+    df_tr, _, df_te = splits
+    return {
+        "station_key": station_key,
+        "radius_m": int(radius_m),
+        "seasonal": seasonal,
+        "data_version": version,
+        "model_schema": MODEL_SCHEMA,
+        "feat_cols": list(feat_cols),
+        "train_start": str(pd.to_datetime(df_tr["ds"]).min().date()),
+        "train_end": str(pd.to_datetime(df_tr["ds"]).max().date()),
+        "n_train": int(len(df_tr)),
+        "metrics": holdout_metrics(scaler, xgb, feat_cols, df_te),
+        "fit_seconds": round(float(fit_seconds), 2),
+        "created_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+    }
+
+def save_artifact(prop, scaler, xgb, meta):
+    station_key, radius_m, version = meta["station_key"], meta["radius_m"], meta["data_version"]
+    # Written to a private folder and renamed into place, so concurrent
+    # readers never load a half-written artifact
+    folder = artifact_dir(station_key, radius_m, version, meta["seasonal"])
+    tmp = f"{folder}.{os.getpid()}.tmp"
+    os.makedirs(tmp, exist_ok=True)
+    with open(os.path.join(tmp, "seasonal.json"), "w") as f:
+        f.write(seasonal_to_json(prop))
+    with open(os.path.join(tmp, "scaler.json"), "w") as f:
+        json.dump(_scaler_to_dict(scaler), f)
+    xgb.save_model(os.path.join(tmp, "xgb.json"))
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+
+    shutil.rmtree(folder, ignore_errors=True)
+    try:
+        os.replace(tmp, folder)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+    prune(keep_version=version)
+
+def load_artifact(station_key, radius_m, version, seasonal="prophet"):
+    """
+    (prop, scaler, xgb, meta) fitted on this data version, or None when
+    there is no stored artifact for the station, radius and seasonal engine.
+    """
+    folder = artifact_dir(station_key, radius_m, version, seasonal)
+    if not os.path.exists(os.path.join(folder, "meta.json")):
+        return None
+    try:
+        with open(os.path.join(folder, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(folder, "seasonal.json")) as f:
+            prop = seasonal_from_json(meta["seasonal"], f.read())
+        with open(os.path.join(folder, "scaler.json")) as f:
+            scaler = _scaler_from_dict(json.load(f))
+        xgb = XGBRegressor()
+        xgb.load_model(os.path.join(folder, "xgb.json"))
+    except Exception as e:
+        print(f"Artefacto ilegible en {folder}, se reentrena ({e})")
+        return None
+    return prop, scaler, xgb, meta
+
+def list_artifacts(version=None):
+    root = os.path.join(MODELS_DIR, _entry(version)) if version else MODELS_DIR
+    rows = []
+    for dirpath, _, files in os.walk(root):
+        if "meta.json" in files and not dirpath.endswith(".tmp"):
+            with open(os.path.join(dirpath, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            rows.append({k: v for k, v in meta.items() if k not in ("feat_cols", "metrics")} | meta["metrics"])
+    return pd.DataFrame(rows)
+
+def prune(keep_version):
+    # Artifacts of other data versions or model schemas are never fresh
+    if not os.path.isdir(MODELS_DIR):
+        return
+    for entry in os.listdir(MODELS_DIR):
+        path = os.path.join(MODELS_DIR, entry)
+        if entry != _entry(keep_version) and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+def fit_or_load(df_daily, station_key, radius_m, version, fit, use_registry=True, refit=False,
+                seasonal="prophet"):
+    """
+    Models for a station/radius: the stored artifact when there is one for
+    this data version and seasonal engine, else `fit(df_daily)`
+    (fit_models_daily with that engine), stored for the next request.
+    use_registry=False always fits and stores nothing; refit=True always
+    fits and replaces the stored artifact.
+    Returns prop, scaler, xgb, feat_cols, meta; meta["reused"] tells which.
+    """
+    if use_registry and not refit:
+        artifact = load_artifact(station_key, radius_m, version, seasonal)
+        if artifact is not None:
+            prop, scaler, xgb, meta = artifact
+            return prop, scaler, xgb, meta["feat_cols"], dict(meta, reused=True)
+
+    t0 = time.perf_counter()
+    prop, scaler, xgb, feat_cols, splits = fit(df_daily)
+    meta = artifact_meta(station_key, radius_m, version, scaler, xgb, feat_cols, splits,
+                         time.perf_counter() - t0, seasonal=seasonal)
+    if use_registry:
+        save_artifact(prop, scaler, xgb, meta)
+    return prop, scaler, xgb, feat_cols, dict(meta, reused=False)
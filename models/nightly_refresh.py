@@ -0,0 +1,151 @@
+# Nightly precomputation of the prediction page for every station at the
+# standard radii. Meant for cron, e.g. every night at 02:30:
+#     30 2 * * * cd /path/to/repo && python -m models.nightly_refresh >> logs/nightly.log 2>&1
+import argparse
+import time
+
+import pandas as pd
+
+import models.batch_forecast as batch
+import models.dataset_cache as dataset_cache
+import models.xgboost_plus_prophet as model
+from models.seasonal import ENGINES
+from utils.database_queries import PREDICTION_TABLES, get_station_prediction, get_write_connection
+
+# Radii served from the stored runs; any other radius is computed on demand
+STANDARD_RADII = (100, 150, 250, 500)
+KEEP_RUNS = 7
+RUNS_TABLE = "prediction_runs"
+
+
+def _stack(outputs, name, run_id):
+    parts = []
+    for key, radius_m, result, _, error in outputs:
+        df = None if error else result[name]
+        if df is None or df.empty:
+            continue
+        part = df.reset_index(drop=True).copy()
+        part.insert(0, "row_n", range(len(part)))
+        part.insert(0, "radius_m", int(radius_m))
+        part.insert(0, "key", key)
+        part.insert(0, "run_id", run_id)
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+def store_run(run, outputs, keep_runs=KEEP_RUNS):
+    con = get_write_connection()
+    try:
+        for name, table in PREDICTION_TABLES.items():
+            df = _stack(outputs, name, run["run_id"])
+            if df.empty:
+                continue
+            con.register("df_part", df)
+            con.execute(f"CREATE TABLE IF NOT EXISTS {table} AS SELECT * FROM df_part LIMIT 0")
+            con.execute(f"INSERT INTO {table} BY NAME SELECT * FROM df_part")
+            con.unregister("df_part")
+
+        con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {RUNS_TABLE} (
+            run_id VARCHAR, started_at TIMESTAMP, finished_at TIMESTAMP,
+            data_version VARCHAR, radii VARCHAR, n_models INTEGER, n_failed INTEGER,
+            seasonal VARCHAR, pooled BOOLEAN
+        )
+        """)
+        con.execute(f"ALTER TABLE {RUNS_TABLE} ADD COLUMN IF NOT EXISTS seasonal VARCHAR DEFAULT 'prophet'")
+        con.execute(f"ALTER TABLE {RUNS_TABLE} ADD COLUMN IF NOT EXISTS pooled BOOLEAN DEFAULT FALSE")
+        con.register("df_run", pd.DataFrame([run]))
+        con.execute(f"INSERT INTO {RUNS_TABLE} BY NAME SELECT * FROM df_run")
+
+        # Older runs are dropped from every table
+        old = f"SELECT run_id FROM {RUNS_TABLE} ORDER BY run_id DESC OFFSET {int(keep_runs)}"
+        for table in list(PREDICTION_TABLES.values()):
+            exists = con.execute(
+                f"SELECT COUNT(*) FROM information_schema.tables WHERE table_name = '{table}'"
+            ).fetchone()[0]
+            if exists:
+                con.execute(f"DELETE FROM {table} WHERE run_id IN ({old})")
+        con.execute(f"DELETE FROM {RUNS_TABLE} WHERE run_id IN ({old})")
+    finally:
+        con.close()
+
+def run_refresh(radii=STANDARD_RADII, station_keys=None, workers=None, refit=False, pooled=False,
+                seasonal="prophet", keep_runs=KEEP_RUNS):
+    started_at = pd.Timestamp.now()
+    run_id = started_at.strftime("%Y%m%d-%H%M%S")
+    t0 = time.perf_counter()
+    print(f"Corrida {run_id}: radios {list(radii)}")
+
+    outputs = list(batch.train_stations(radii, station_keys, workers, refit, pooled, seasonal))
+    batch.store_batch(outputs, radii, elapsed=time.perf_counter() - t0)
+
+    run = {
+        "run_id": run_id,
+        "started_at": started_at,
+        "finished_at": pd.Timestamp.now(),
+        "data_version": dataset_cache.data_version(),
+        "radii": ",".join(str(int(r)) for r in radii),
+        "n_models": sum(1 for out in outputs if out[4] is None),
+        "n_failed": sum(1 for out in outputs if out[4] is not None),
+        "seasonal": None if pooled else seasonal,
+        "pooled": bool(pooled),
+    }
+    store_run(run, outputs, keep_runs=keep_runs)
+    print(f"- {RUNS_TABLE}: corrida {run_id} guardada, {run['n_models']} modelos, "
+          f"{run['n_failed']} con error, {time.perf_counter() - t0:.1f}s")
+    return run
+
+def load_precomputed_prediction(station_key, radius_m):
+    """
+    The prediction page's results for a station from the latest stored
+    run built from the current data version, or None when the radius is
+    not standard, there is no such run, or it cannot be read; the page
+    then runs the pipeline. Only the daily history is rebuilt.
+
+    The weekly forecast is dated from the day after the run (weekly_risk),
+    so only runs started today are served.
+    """
+    if int(radius_m) not in STANDARD_RADII:
+        return None
+    key = model.canon_key_ascii(station_key)
+    try:
+        version = dataset_cache.data_version()
+        stored = get_station_prediction(key, int(radius_m), version, pd.Timestamp.today().normalize())
+        if not stored:
+            return None
+        af, co, rb = model.load_and_normalize(version=version)
+        registry = model.get_station_registry(af, co)
+        df_daily, _ = model.build_daily_station_frame(af, co, rb, key, radius_m=int(radius_m), registry=registry)
+    except Exception as e:
+        print(f"Predicción precalculada no disponible para {key} r={radius_m}m, se calcula al momento ({e})")
+        return None
+
+    results = {name: stored[name].copy() for name in PREDICTION_TABLES}
+    results.update({
+        "station_name": registry.names.get(key, "Desconocida"),
+        "station_key": key,
+        "radius": int(radius_m),
+        "daily_history": df_daily,
+        "run": stored["run"],
+    })
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nightly refresh of the stored station predictions.")
+    parser.add_argument("--radius", type=int, nargs="+", default=list(STANDARD_RADII))
+    parser.add_argument("--stations", nargs="*", default=None,
+                        help="Station keys to refresh (default: all).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: one per CPU).")
+    parser.add_argument("--refit", action="store_true",
+                        help="Retrain even when the registry has fresh models.")
+    parser.add_argument("--pooled", action="store_true",
+                        help="One XGBoost model per radius for all stations.")
+    parser.add_argument("--seasonal", choices=ENGINES, default="prophet",
+                        help="Seasonal component of the per-station models.")
+    parser.add_argument("--keep-runs", type=int, default=KEEP_RUNS)
+    args = parser.parse_args()
+    if args.pooled and batch.pooled_conflicts(args.workers, args.refit, args.seasonal):
+        parser.error(f"--pooled no admite {', '.join(batch.pooled_conflicts(args.workers, args.refit, args.seasonal))}")
+
+    run_refresh(radii=args.radius, station_keys=args.stations, workers=args.workers,
+                refit=args.refit, pooled=args.pooled, seasonal=args.seasonal, keep_runs=args.keep_runs)
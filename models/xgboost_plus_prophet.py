@@ -1,10 +1,13 @@
-import re, unicodedata, difflib
+import re, unicodedata, difflib, threading, time, weakref
 import numpy as np
 import pandas as pd
 from xgboost import XGBRegressor
+from sklearn.neighbors import BallTree
 from sklearn.preprocessing import StandardScaler
-from prophet import Prophet
 
+import models.dataset_cache as dataset_cache
+import models.model_registry as model_registry
+from models.seasonal import make_seasonal
 from utils.database_queries import get_daily_affluence, get_metro_coords, get_all_crimes
 
 # --------------------------------------------
@@ -56,64 +59,164 @@ def haversine_m(lat1, lon1, lat2, lon2):
     a = np.sin(dlat/2.0)**2 + np.cos(p1)*np.cos(p2)*np.sin(dlon/2.0)**2
     return 2 * R * np.arcsin(np.sqrt(a))
 
-def _parse_hour(h):
-    if pd.isna(h): return np.nan
-    s = str(h).strip()
-    for fmt in ("%H:%M:%S", "%H:%M"):
-        try: return pd.to_datetime(s, format=fmt).hour
-        except Exception: pass
-    try: return int(s.split(":")[0])
-    except Exception: return np.nan
+def parse_hours(hora):
+    # "HH:MM[:SS]" -> HH as float, NaN when missing or unparseable. Parsed
+    # once per distinct value (a day has at most 86400) and mapped back.
+    codes, uniques = pd.factorize(hora)
+    first = pd.Series(uniques, dtype=object).astype(str).str.strip().str.split(":", n=1).str[0]
+    hours = pd.to_numeric(first.str.extract(r"^\s*([+-]?\d+)\s*$")[0], errors="coerce").to_numpy(dtype=float)
+    return np.append(hours, np.nan)[codes]
+
+def normalize_tipo(values):
+    # lower-case ASCII crime type as a categorical, computed once per
+    # distinct value
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    norm = (pd.Series(uniques, dtype=object).astype(str).str.strip().str.lower()
+            .str.normalize("NFKD").str.encode("ascii", errors="ignore").str.decode("ascii"))
+    norm_codes, norm_uniques = pd.factorize(norm)
+    return pd.Categorical.from_codes(norm_codes[codes], norm_uniques)
+
+def days_to_timestamps(days):
+    # rb["day"] (days since 1970-01-01) back to timestamps
+    return pd.to_datetime(np.asarray(days, dtype=np.int64), unit="D")
+
+def day_to_dow(days):
+    # 1970-01-01 was a Thursday; Monday = 0
+    return (np.asarray(days) + 3) % 7
 
 # --------------------------------------------
-# ----------- Probability Reports ------------
+# -------------- Spatial Index ---------------
 # --------------------------------------------
-def hour_day_probability_report(station_key, rb, co, radius_m=150, top_k_hours=3):
-    skey = canon_key_ascii(station_key)
-    row = co.loc[co["key"].map(canon_key_ascii) == skey]
-    if row.empty: raise ValueError(f"No hay coordenadas para '{station_key}'")
-    row = row.iloc[0]; st_lat, st_lon = float(row["lat"]), float(row["lon"])
+EARTH_R_M = 6371000.0
+
+class CrimeIndex:
+    """
+    BallTree (haversine) over every crime in `rb`. Radius queries return
+    positional row indices into `rb`, sorted, in O(log n + k) instead of
+    a haversine pass over every crime per station.
+    """
+
+    def __init__(self, rb):
+        self.n = len(rb)
+        coords = np.radians(rb[["lat","lon"]].to_numpy(dtype=np.float64))
+        self.tree = BallTree(coords, metric="haversine")
+
+    def within_many(self, lats, lons, radius_m):
+        pts = np.radians(np.column_stack([np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)]))
+        return [np.sort(i) for i in self.tree.query_radius(pts, r=radius_m / EARTH_R_M)]
+
+    def within(self, lat, lon, radius_m):
+        return self.within_many([lat], [lon], radius_m)[0]
+
+_derived_lock = threading.Lock()
+_derived = {}
+
+def _per_dataset(name, frames, build):
+    # af/co/rb come from the per-version dataset cache, so the frame
+    # objects identify the data version: one `build(*frames)` per version
+    # and process, dropped when the frames are replaced.
+    with _derived_lock:
+        hit = _derived.get(name)
+        if hit is not None and all(ref() is f for ref, f in zip(hit[0], frames)):
+            return hit[1]
+        obj = build(*frames)
+        _derived[name] = ([weakref.ref(f) for f in frames], obj)
+        return obj
+
+def get_crime_index(rb):
+    return _per_dataset("crime_index", (rb,), CrimeIndex)
+
+def crimes_within(rb, lat, lon, radius_m, index=None):
+    index = index or get_crime_index(rb)
+    return rb.iloc[index.within(lat, lon, radius_m)]
 
-    if "fecha_hecho" not in rb.columns:
-        raise KeyError("Se espera columna 'fecha_hecho' en robos_filtrados")
-    rb_loc = rb.dropna(subset=["lat","lon","fecha_hecho"]).copy()
-    rb_loc["fecha_hecho"] = pd.to_datetime(rb_loc["fecha_hecho"], errors="coerce")
-    rb_loc = rb_loc.dropna(subset=["fecha_hecho"])
+# --------------------------------------------
+# ------------- Station Registry -------------
+# --------------------------------------------
+def canon_keys(values):
+    # canon_key_ascii once per distinct value
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    return np.array([canon_key_ascii(k) for k in uniques], dtype=object)[codes]
+
+class StationRegistry:
+    """
+    Every station with both coordinates and affluence: canonical key,
+    display name, coordinates and the [start, stop) rows of its block in
+    `af` (sorted by key and fecha in load_and_normalize). Resolving a
+    station and slicing its affluence are dict lookups.
+    """
+
+    def __init__(self, af, co):
+        af_keys = af["key"].to_numpy()
+        starts = np.concatenate([[0], np.flatnonzero(af_keys[1:] != af_keys[:-1]) + 1]) if len(af_keys) else np.array([], dtype=int)
+        stops = np.append(starts[1:], len(af_keys))
+        aflu_rows = {k: (int(a), int(b)) for k, a, b in zip(af_keys[starts], starts, stops)}
+        if len(aflu_rows) != len(starts):
+            raise ValueError("La afluencia debe venir ordenada por estación.")
+
+        co = co[co["key"].isin(aflu_rows.keys())]
+        self.keys = sorted(co["key"])
+        self.aflu_rows = {k: aflu_rows[k] for k in self.keys}
+        self.coords = {k: (float(lat), float(lon)) for k, lat, lon in zip(co["key"], co["lat"], co["lon"])}
+        self.names = {k: fix_mojibake(str(n)).strip().title() for k, n in zip(co["key"], co["nombre"])}
+        lineas = co["linea"] if "linea" in co.columns else pd.Series("", index=co.index)
+        self.lines = {k: str(l) for k, l in zip(co["key"], lineas)}
+        self.by_name = {canon_key_ascii(n): k for k, n in zip(co["key"], co["nombre"])}
+
+    def __contains__(self, key):
+        return key in self.aflu_rows
+
+    def resolve(self, query):
+        q = canon_key_ascii(query)
+        if q in self.by_name:
+            return self.by_name[q]
+        if q in self.aflu_rows:
+            return q
+        key, cands = choose_station_key_once(query, self.keys)
+        print(f"Input '{query}' resuelto a '{key}' de {cands}")
+        return key
+
+    def affluence(self, af, key):
+        start, stop = self.aflu_rows[key]
+        return af.iloc[start:stop]
+
+def get_station_registry(af, co):
+    return _per_dataset("station_registry", (af, co), StationRegistry)
 
-    d_m = haversine_m(st_lat, st_lon, rb_loc["lat"].to_numpy(), rb_loc["lon"].to_numpy())
-    rb_st = rb_loc.loc[d_m <= radius_m].copy()
+# --------------------------------------------
+# ----------- Probability Reports ------------
+# --------------------------------------------
+def hour_day_probability_report(station_key, rb, co, radius_m=150, top_k_hours=3, index=None, rb_st=None):
+    # rb_st: crimes already known to be within radius_m (batch runs)
+    if rb_st is None:
+        # co["key"] is canonical since load_and_normalize
+        row = co.loc[co["key"] == canon_key_ascii(station_key)]
+        if row.empty: raise ValueError(f"No hay coordenadas para '{station_key}'")
+        row = row.iloc[0]; st_lat, st_lon = float(row["lat"]), float(row["lon"])
+        rb_st = crimes_within(rb, st_lat, st_lon, radius_m, index=index)
     if rb_st.empty:
         print("No hay robos asignados a esta estación dentro del radio seleccionado.")
         return (pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame(),
                 {"best_dow":0,"best_hour_start":11,"best_hour_end":12,"hour_conf":0.0,
                  "tipo_prob":"desconocido","tipo_conf":0.0})
 
-    rb_st["dow"] = rb_st["fecha_hecho"].dt.weekday
-    dow_counts = rb_st["dow"].value_counts().sort_index()
+    dow_counts = pd.Series(np.bincount(day_to_dow(rb_st["day"].to_numpy()), minlength=7))
+    dow_counts = dow_counts[dow_counts > 0]
     dow_probs = (dow_counts / dow_counts.sum() * 100).round(2)
     dias = ["Lunes","Martes","Miércoles","Jueves","Viernes","Sábado","Domingo"]
     dow_df = pd.DataFrame({"dow": dow_probs.index,
                            "dia": [dias[i] for i in dow_probs.index],
                            "prob_%": dow_probs.values})
 
-    if "hora_hecho" in rb_st.columns:
-        h = pd.to_datetime(rb_st["hora_hecho"], errors="coerce").dt.hour
-        if h.isna().all():
-            h = rb_st["hora_hecho"].astype(str).str.extract(r"^(\d{1,2})")[0].astype(float)
-        rb_st["hora"] = h
-    elif "hora" in rb_st.columns:
-        rb_st["hora"] = pd.to_numeric(rb_st["hora"], errors="coerce")
-    else:
-        rb_st["hora"] = np.nan
-    rb_st = rb_st.dropna(subset=["hora"]).copy()
-    rb_st["hora"] = rb_st["hora"].astype(int).clip(0, 23)
+    hora = rb_st["hora"].to_numpy()
+    hora = hora[hora >= 0]
 
     hour_df = pd.DataFrame(columns=["hora","prob_%"])
     hour2_df = pd.DataFrame(columns=["hora_inicio","prob_%"])
     best_h_start, best_h_end, hour_conf = 11, 12, 0.0
 
-    if len(rb_st) > 0 and rb_st["hora"].notna().any():
-        hour_counts = rb_st["hora"].value_counts().reindex(range(24), fill_value=0)
+    if len(hora) > 0:
+        hour_counts = pd.Series(np.bincount(hora, minlength=24))
         if hour_counts.sum() > 0:
             hour_probs = (hour_counts / hour_counts.sum() * 100).round(2)
             hour_df = pd.DataFrame({"hora": range(24), "prob_%": hour_probs.values})
@@ -127,15 +230,18 @@ def hour_day_probability_report(station_key, rb, co, radius_m=150, top_k_hours=3
 
     tipo_prob, tipo_conf = "desconocido", 0.0
     tipo_top_df = pd.DataFrame(columns=["tipo","porcentaje"])
-    for col in ["delito", "categoria_delito", "subcategoria","tipo"]:
-        if col in rb_st.columns:
-            counts = rb_st[col].astype(str).str.strip().str.lower().value_counts()
-            if len(counts) > 0:
-                tipo_prob = counts.index[0]
-                tipo_conf = round(float(counts.iloc[0] / counts.sum() * 100.0), 2)
-                tipo_top_df = (counts.head(5)/counts.sum()*100.0).round(2).reset_index()
-                tipo_top_df.columns = ["tipo","porcentaje"]
-            break
+    # Counted on the categorical codes; only the few category names are
+    # lower-cased (names that differ only in case or spaces are merged)
+    codes = rb_st["delito"].cat.codes.to_numpy()
+    names = pd.Index(rb_st["delito"].cat.categories.astype(str)).str.strip().str.lower()
+    counts = pd.Series(np.bincount(codes[codes >= 0], minlength=len(names)), index=names)
+    counts = counts.groupby(level=0).sum().sort_values(ascending=False)
+    counts = counts[counts > 0]
+    if len(counts) > 0:
+        tipo_prob = counts.index[0]
+        tipo_conf = round(float(counts.iloc[0] / counts.sum() * 100.0), 2)
+        tipo_top_df = (counts.head(5)/counts.sum()*100.0).round(2).reset_index()
+        tipo_top_df.columns = ["tipo","porcentaje"]
 
     meta = {
         "best_dow": int(dow_df.sort_values("prob_%", ascending=False).iloc[0]["dow"]) if len(dow_df) else 0,
@@ -168,6 +274,10 @@ def add_time_features_daily(df):
     df["feriado"] = d.dt.strftime("%Y-%m-%d").isin(hol).astype(int)
     return df
 
+# Built from the same day's robos: known in history, unknown when
+# forecasting, so they are shown but never used as model features
+TARGET_DERIVED_COLS = ["ratio"]
+
 def make_lags(df, col, L=[1,2,3,7,14]):
     for lag in L:
         df[f"{col}_lag{lag}"] = df[col].shift(lag)
@@ -183,7 +293,18 @@ def oversample_positives_local(d, col="robos", factor=3, seed=42):
 # --------------------------------------------
 # ------ DB Calling and Normalization --------
 # --------------------------------------------
-def load_and_normalize():
+# Bump when the normalized frames change shape, so cached copies of the
+# previous layout are rebuilt even if the data did not change.
+FRAMES_SCHEMA = 4
+
+def load_and_normalize(use_cache=True, version=None):
+    # Normalized frames are stored per data version in data/model_cache,
+    # so only the first call after the database changes pays for this.
+    if use_cache:
+        return dataset_cache.cached_frames(_normalize_from_db, schema=FRAMES_SCHEMA, version=version)
+    return _normalize_from_db()
+
+def _normalize_from_db():
     af = get_daily_affluence()
     co = get_metro_coords()
     rb = get_all_crimes()
@@ -205,7 +326,9 @@ def load_and_normalize():
     if "afluencia" not in af.columns:
         raise KeyError("La tabla 'daily_affluence' debe tener la columna 'afluencia'.")
     af["afluencia"] = pd.to_numeric(af["afluencia"], errors="coerce").fillna(0)
-
+    # Claves canónicas y filas contiguas por estación (StationRegistry)
+    af["key"] = canon_keys(af["key"])
+    af = af.sort_values(["key","fecha"], kind="stable").reset_index(drop=True)
 
     # 3. Normalizar CO (Coordenadas)
     co.columns = [c.lower() for c in co.columns]
@@ -219,56 +342,66 @@ def load_and_normalize():
     co["lat"] = pd.to_numeric(co["lat"], errors="coerce")
     co["lon"] = pd.to_numeric(co["lon"], errors="coerce")
     # 'key' es la PK de la estación ('num'), 'nombre' es el nombre legible
-    co = co.dropna(subset=["key","lat","lon"]).drop_duplicates(subset=["key"])
+    co = co.dropna(subset=["key","lat","lon"])
+    co["key"] = canon_keys(co["key"])
+    co = co.drop_duplicates(subset=["key"]).reset_index(drop=True)
 
-    # 4. Normalizar RB (Robos)
+    # 4. Normalizar RB (Robos) a columnas compactas:
+    #    lat/lon float32, day = días desde 1970-01-01 (int32), hora int8
+    #    (-1 si falta) y el tipo de delito como categórico.
     rb.columns = [c.lower() for c in rb.columns]
     # 'fecha_hecho', 'lat', 'lon' ya vienen de la consulta
     if "fecha_hecho" not in rb.columns:
         raise KeyError("La tabla 'crimes_clean' debe tener 'fecha_hecho'.")
-    rb["fecha_hecho"] = pd.to_datetime(rb["fecha_hecho"], errors="coerce")
-    rb = rb.dropna(subset=["fecha_hecho","lat","lon"]).copy()
-
-    if "hora_hecho" in rb.columns: rb["hora_int"] = rb["hora_hecho"].apply(_parse_hour)
-    else: rb["hora_int"] = np.nan
-
-    # El script original busca 'categoria_delito', 'delito', etc.
-    # Nuestra consulta 'get_all_crimes' solo trae 'delito', así que la encontrará.
-    _tipo_cols = [c for c in ["categoria_delito","delito","subcategoria","tipo"] if c in rb.columns]
-    if _tipo_cols:
-        rb["tipo_robo"] = (rb[_tipo_cols[0]].astype(str).str.strip().str.lower()
-                            .str.normalize("NFKD").str.encode("ascii", errors="ignore").str.decode("ascii"))
-    else:
-        rb["tipo_robo"] = "desconocido"
+    fecha = pd.to_datetime(rb["fecha_hecho"], errors="coerce")
 
     # Filtrar robos al rango de fechas de afluencia
     fmin, fmax = af["fecha"].min(), af["fecha"].max()
     if pd.isna(fmin) or pd.isna(fmax):
         raise ValueError("No se pudo determinar el rango de fechas de la afluencia.")
-        
-    rb = rb[(rb["fecha_hecho"]>=fmin) & (rb["fecha_hecho"]<=fmax)].copy()
+    keep = (fecha.notna() & rb["lat"].notna() & rb["lon"].notna()
+            & (fecha >= fmin) & (fecha <= fmax)).to_numpy()
+    rb, fecha = rb.loc[keep], fecha.loc[keep]
+
+    if "hora_hecho" in rb.columns: hora = parse_hours(rb["hora_hecho"])
+    else: hora = np.full(len(rb), np.nan)
+
+    # El script original busca 'categoria_delito', 'delito', etc.
+    # Nuestra consulta 'get_all_crimes' solo trae 'delito', así que la encontrará.
+    _tipo_cols = [c for c in ["categoria_delito","delito","subcategoria","tipo"] if c in rb.columns]
+    delito = rb[_tipo_cols[0]] if _tipo_cols else pd.Series("desconocido", index=rb.index)
+
+    rb = pd.DataFrame({
+        "lat": rb["lat"].to_numpy(dtype=np.float32),
+        "lon": rb["lon"].to_numpy(dtype=np.float32),
+        "day": fecha.to_numpy().astype("datetime64[D]").astype(np.int32),
+        "hora": np.where(np.isnan(hora), -1, np.clip(np.nan_to_num(hora), 0, 23)).astype(np.int8),
+        "delito": delito.astype("category").array,
+        "tipo_robo": normalize_tipo(delito),
+    })
     
     return af, co, rb
 
 # --------------------------------------------
 # ------------- Building Stats ---------------
 # --------------------------------------------
-def build_daily_station_frame(af, co, rb, station_key, radius_m=100):
-    row = co.loc[co["key"].map(canon_key_ascii) == station_key]
-    if row.empty: raise ValueError(f"No hay coordenadas para '{station_key}'.")
-    st_lat = float(row.iloc[0]["lat"]); st_lon = float(row.iloc[0]["lon"])
-
-    d_m = haversine_m(st_lat, st_lon, rb["lat"].to_numpy(), rb["lon"].to_numpy())
-    rb_st = rb.loc[d_m <= radius_m].copy()
-    rb_st["ds"] = pd.to_datetime(rb_st["fecha_hecho"].dt.date)
-    rob_d = rb_st.groupby("ds").size().rename("robos").to_frame()
-
-    # 'station_key' of af (af['key']) MUST be the same as co (co['key'])
-    af_st = af[af["key"].map(canon_key_ascii) == station_key].copy()
-    if af_st.empty: raise ValueError(f"No tengo afluencia para '{station_key}'.")
-    af_st = af_st[["fecha","afluencia"]].dropna().rename(columns={"fecha":"ds"})
+def build_daily_station_frame(af, co, rb, station_key, radius_m=100, rb_st=None, index=None, registry=None):
+    # rb_st: crimes already known to be within radius_m (batch runs)
+    registry = registry or get_station_registry(af, co)
+    if station_key not in registry:
+        # The registry only keeps stations with both; co has every station with coordinates
+        if not (co["key"] == station_key).any(): raise ValueError(f"No hay coordenadas para '{station_key}'.")
+        raise ValueError(f"No tengo afluencia para '{station_key}'.")
+    if rb_st is None:
+        st_lat, st_lon = registry.coords[station_key]
+        rb_st = crimes_within(rb, st_lat, st_lon, radius_m, index=index)
+    af_st = registry.affluence(af, station_key)[["fecha","afluencia"]]
+    af_st = af_st.dropna().rename(columns={"fecha":"ds"})
     af_d = (af_st.set_index("ds").resample("D")["afluencia"].sum().to_frame().reset_index())
 
+    days, n = np.unique(rb_st["day"].to_numpy(), return_counts=True)
+    rob_d = pd.DataFrame({"ds": days_to_timestamps(days).astype(af_d["ds"].dtype), "robos": n})
+
     df = pd.merge(af_d, rob_d, on="ds", how="left").sort_values("ds")
     df["robos"] = df["robos"].fillna(0)
 
@@ -318,7 +451,17 @@ def _align(part: pd.DataFrame, feat_cols, strict=True) -> pd.DataFrame:
         out[other] = out[other].fillna(0.0)
     return out.reset_index(drop=True)
 
-def fit_models_daily(df):
+def _xgb_regressor(n_jobs=None):
+    return XGBRegressor(
+        objective="count:poisson",
+        n_estimators=1200, max_depth=6, learning_rate=0.03,
+        subsample=0.9, colsample_bytree=0.85, min_child_weight=1.0,
+        reg_alpha=0.5, reg_lambda=4.0, random_state=42,
+        tree_method="hist", eval_metric="rmse",
+        early_stopping_rounds=50, n_jobs=n_jobs
+    )
+
+def fit_models_daily(df, n_jobs=None, seasonal="prophet"):
     if len(df) < 60:
         raise ValueError(f"Datos insuficientes para entrenar (n={len(df)}). Se necesitan al menos 60 días de datos limpios.")
 
@@ -327,7 +470,9 @@ def fit_models_daily(df):
 
     df_tr_os = oversample_positives_local(df_tr, col="robos", factor=3)
 
-    prop = Prophet(daily_seasonality=True, weekly_seasonality=True, yearly_seasonality=True)
+    # seasonal: "prophet" or "fourier" (models/seasonal.py); either way its
+    # prediction is the yhat_prophet feature
+    prop = make_seasonal(seasonal, holidays=_mx_basic_holidays())
     prop.fit(df_tr_os[["ds","robos"]].rename(columns={"robos":"y"}))
 
     df_tr["yhat_prophet"] = prop.predict(df_tr[["ds"]])["yhat"].values
@@ -336,7 +481,7 @@ def fit_models_daily(df):
     if len(df_te) > 0:
         df_te["yhat_prophet"] = prop.predict(df_te[["ds"]])["yhat"].values
 
-    feat_cols = [c for c in df.columns if c not in ["ds","robos"]] + ["yhat_prophet"]
+    feat_cols = [c for c in df.columns if c not in ["ds","robos"] + TARGET_DERIVED_COLS] + ["yhat_prophet"]
 
     df_tr_os = df_tr_os.merge(
         prop.predict(df_tr_os[["ds"]])[["ds","yhat"]].rename(columns={"yhat":"yhat_prophet"}),
@@ -367,14 +512,7 @@ def fit_models_daily(df):
         X_te, y_te = df_te[feat_cols].values, df_te["robos"].values
         X_te_s = scaler.transform(X_te)
 
-    xgb = XGBRegressor(
-        objective="count:poisson",
-        n_estimators=1200, max_depth=6, learning_rate=0.03,
-        subsample=0.9, colsample_bytree=0.85, min_child_weight=1.0,
-        reg_alpha=0.5, reg_lambda=4.0, random_state=42,
-        tree_method="hist", eval_metric="rmse",
-        early_stopping_rounds=50
-    )
+    xgb = _xgb_regressor(n_jobs)
     
     fit_params = {
     "verbose": False
@@ -392,23 +530,27 @@ def fit_models_daily(df):
 # --------------------------------------------
 # -------------- Forecasting -----------------
 # --------------------------------------------
-def forecast_28d_daily_and_aggregate_weekly(df, prop, scaler, xgb, feat_cols,
-                                            base_lambda_week=None, alpha=0.7):
+def future_feature_frame(df, feat_cols, prop=None, const=None):
+    # Features of the 28 days after df: affluence held at its recent
+    # median, lags rolled from the history tail; const adds columns that
+    # are fixed per station (pooled model).
     last_day = pd.to_datetime(df["ds"]).max()
     future_days = pd.date_range(last_day + pd.Timedelta(days=1), periods=28, freq="D")
     fut = pd.DataFrame({"ds": future_days})
 
-    fut["yhat_prophet"] = prop.predict(fut[["ds"]])["yhat"].values
+    if prop is not None:
+        fut["yhat_prophet"] = prop.predict(fut[["ds"]])["yhat"].values
+    for c, v in (const or {}).items():
+        fut[c] = v
 
     last_aflu = df["afluencia"].tail(14).median()
     fut["afluencia"] = last_aflu
     fut["aflu_ma7"]  = last_aflu
     fut["aflu_ma14"] = last_aflu
-    fut["ratio"]     = 0.0
 
     fut = add_time_features_daily(fut)
 
-    hist_tail = df[["ds","robos","afluencia","aflu_ma7","aflu_ma14","ratio",
+    hist_tail = df[["ds","robos","afluencia","aflu_ma7","aflu_ma14",
                     "dow","month","weekofyear","is_quincena","is_weekend","feriado"]].tail(30)
     roll = pd.concat([hist_tail, fut], ignore_index=True)
     for L in [1,2,3,7,14]:
@@ -419,18 +561,18 @@ def forecast_28d_daily_and_aggregate_weekly(df, prop, scaler, xgb, feat_cols,
     for c in feat_cols:
         if c not in future_feat.columns:
             future_feat[c] = 0.0
-    future_feat = future_feat[feat_cols].fillna(method="ffill").fillna(0.0)
-
-    XF  = scaler.transform(future_feat.values)
-    yF  = np.clip(xgb.predict(XF), 0, None)
+    return future_feat[feat_cols].fillna(method="ffill").fillna(0.0)
 
+def weekly_risk(df, yF, yhat_prophet=None, base_lambda_week=None, alpha=0.7):
+    # 28 daily XGB predictions -> weekly counts shrunk towards the
+    # station's base rate, weekly probability and risk label
     display_start_date = pd.Timestamp.today().normalize() + pd.Timedelta(days=1)
     display_dates = pd.date_range(start=display_start_date, periods=28, freq="D")
 
     daily_pred = pd.DataFrame({
         "ds": display_dates,  # <--- Aquí inyectamos las fechas actuales
         "robos_pred_xgb_diario": np.round(yF, 3),
-        "yhat_prophet_diario": np.round(future_feat["yhat_prophet"].values, 3)
+        "yhat_prophet_diario": np.round(yhat_prophet, 3) if yhat_prophet is not None else np.nan
     })
 
     wk = (daily_pred.set_index("ds")
@@ -439,6 +581,8 @@ def forecast_28d_daily_and_aggregate_weekly(df, prop, scaler, xgb, feat_cols,
                     .rename(columns={"robos_pred_xgb_diario":"robos_pred_xgb",
                                      "yhat_prophet_diario":"yhat_prophet"})\
                     .reset_index()
+    if yhat_prophet is None:
+        wk["yhat_prophet"] = np.nan
 
     if base_lambda_week is None or not np.isfinite(base_lambda_week) or base_lambda_week < 0:
         base_lambda_week = max(0.0, float(df["robos"].mean()) * 7.0)
@@ -458,9 +602,24 @@ def forecast_28d_daily_and_aggregate_weekly(df, prop, scaler, xgb, feat_cols,
 
     return wk, daily_pred
 
-def enrich_with_calendar(pred_week_df, rb, co, station_key, radius_m=150):
+def forecast_28d_daily_and_aggregate_weekly(df, prop, scaler, xgb, feat_cols,
+                                            base_lambda_week=None, alpha=0.7):
+    future_feat = future_feature_frame(df, feat_cols, prop=prop)
+    XF  = scaler.transform(future_feat.values)
+    yF  = np.clip(xgb.predict(XF), 0, None)
+    return weekly_risk(df, yF, future_feat["yhat_prophet"].values,
+                       base_lambda_week=base_lambda_week, alpha=alpha)
+
+def weekly_base_lambda(df_daily):
+    base_lambda_daily = float(df_daily["robos"].mean())
+    base_lambda_week  = float(df_daily.set_index("ds")["robos"].resample("W-SUN").sum().mean())
+    if not np.isfinite(base_lambda_week) or base_lambda_week < 0:
+        base_lambda_week = max(0.0, base_lambda_daily * 7.0)
+    return base_lambda_daily, base_lambda_week
+
+def enrich_with_calendar(pred_week_df, rb, co, station_key, radius_m=150, index=None, rb_st=None):
     dow_df, hour_df, hour2_df, tipo_top_df, meta = hour_day_probability_report(
-        station_key, rb, co, radius_m=radius_m, top_k_hours=3
+        station_key, rb, co, radius_m=radius_m, top_k_hours=3, index=index, rb_st=rb_st
     )
     def _dow_name(d): return ["Lunes","Martes","Miércoles","Jueves","Viernes","Sábado","Domingo"][int(d)]
     rows = []
@@ -504,48 +663,33 @@ def get_available_stations():
 # --------------------------------------------
 # --------------- Full Model -----------------
 # --------------------------------------------
-def run_full_prediction_pipeline(station_key_or_name: str, radius_m: int = 100):
+def run_full_prediction_pipeline(station_key_or_name: str, radius_m: int = 100, use_registry=True,
+                                 seasonal="prophet"):
     print(f"Iniciando pipeline para: {station_key_or_name}, radio: {radius_m}m")
     
     try:
-        af, co, rb = load_and_normalize()
+        version = dataset_cache.data_version()
+        af, co, rb = load_and_normalize(version=version)
         print(f"Datos cargados: af={af.shape}, co={co.shape}, rb={rb.shape}")
     except Exception as e:
         print(f"Error en load_and_normalize: {e}")
         raise ValueError(f"Error al cargar datos base: {e}")
+    index = get_crime_index(rb)
 
-    keys_from_coords = co["key"].dropna().unique().tolist()
-    keys_from_aflu = af["key"].dropna().unique().tolist()
-    
-    keys_list = sorted(list(set(keys_from_coords) & set(keys_from_aflu)))
-    
-    if not keys_list:
+    registry = get_station_registry(af, co)
+    if not registry.keys:
         raise ValueError("No hay estaciones que tengan *tanto* coordenadas como datos de afluencia.")
 
-    co_map = co.set_index(co['nombre'].map(canon_key_ascii))['key'].map(canon_key_ascii).to_dict()
-    q_canon = canon_key_ascii(station_key_or_name)
-    
-    selected_key = None
-    if q_canon in co_map:
-        selected_key = co_map[q_canon]
-    
-    if selected_key is None and q_canon in keys_list:
-        selected_key = q_canon
-        
-    if selected_key is None:
-        try:
-            selected_key, cands = choose_station_key_once(station_key_or_name, keys_list)
-            print(f"Input '{station_key_or_name}' resuelto a '{selected_key}' de {cands}")
-        except ValueError as e:
-             raise ValueError(f"No se encontró la estación '{station_key_or_name}'. Error: {e}")
-    
-    if selected_key not in keys_list:
-        raise ValueError(f"Estación '{selected_key}' no tiene datos completos (coordenadas Y afluencia).")
+    try:
+        selected_key = registry.resolve(station_key_or_name)
+    except ValueError as e:
+        raise ValueError(f"No se encontró la estación '{station_key_or_name}'. Error: {e}")
 
     print(f"Usando estación (key): {selected_key}")
 
     try:
-        df_daily, rb_st = build_daily_station_frame(af, co, rb, selected_key, radius_m=radius_m)
+        df_daily, rb_st = build_daily_station_frame(af, co, rb, selected_key, radius_m=radius_m,
+                                                    index=index, registry=registry)
         print(f"DataFrame diario construido: {df_daily.shape}")
     except Exception as e:
         print(f"Error en build_daily_station_frame: {e}")
@@ -554,15 +698,18 @@ def run_full_prediction_pipeline(station_key_or_name: str, radius_m: int = 100):
     if df_daily.empty:
         raise ValueError(f"No se generaron datos diarios para '{selected_key}'. (¿Sin afluencia?)")
 
-    base_lambda_daily = float(df_daily["robos"].mean())
-    base_lambda_week  = float(df_daily.set_index("ds")["robos"].resample("W-SUN").sum().mean())
-    if not np.isfinite(base_lambda_week) or base_lambda_week < 0:
-        base_lambda_week = max(0.0, base_lambda_daily * 7.0)
+    base_lambda_daily, base_lambda_week = weekly_base_lambda(df_daily)
     print(f"Lambdas base: daily={base_lambda_daily:.4f}, weekly={base_lambda_week:.4f}")
 
     try:
-        prop, scaler, xgb, feat_cols, splits = fit_models_daily(df_daily)
-        print("Modelos (Prophet + XGB) entrenados.")
+        prop, scaler, xgb, feat_cols, model_meta = model_registry.fit_or_load(
+            df_daily, selected_key, radius_m, version,
+            lambda d: fit_models_daily(d, seasonal=seasonal), use_registry=use_registry, seasonal=seasonal
+        )
+        if model_meta["reused"]:
+            print(f"Modelos ({seasonal} + XGB) cargados del registro ({model_meta['created_at']}).")
+        else:
+            print(f"Modelos ({seasonal} + XGB) entrenados en {model_meta['fit_seconds']}s.")
     except Exception as e:
         print(f"Error en fit_models_daily: {e}")
         raise ValueError(f"Error al entrenar modelos: {e}")
@@ -574,18 +721,12 @@ def run_full_prediction_pipeline(station_key_or_name: str, radius_m: int = 100):
     print("Predicción de 4 semanas generada.")
 
     pred_enriched, (dow_df, hour_df, hour2_df, tipo_top_df) = enrich_with_calendar(
-        pred_week_raw, rb, co, selected_key, radius_m=radius_m
+        pred_week_raw, rb, co, selected_key, radius_m=radius_m, index=index
     )
     print("Reportes de calendario generados.")
 
-    station_name_readable = "Desconocida"
-    try:
-        station_name_readable = co.loc[co['key'].map(canon_key_ascii) == selected_key, 'nombre'].iloc[0]
-    except Exception:
-        pass
-
     return {
-        "station_name": station_name_readable,
+        "station_name": registry.names.get(selected_key, "Desconocida"),
         "station_key": selected_key,
         "radius": radius_m,
         "pred_enriched": pred_enriched,
@@ -593,5 +734,266 @@ def run_full_prediction_pipeline(station_key_or_name: str, radius_m: int = 100):
         "prob_hour": hour_df,
         "prob_hour_2h": hour2_df,
         "prob_tipo": tipo_top_df,
-        "daily_history": df_daily
-    }
\ No newline at end of file
+        "daily_history": df_daily,
+        "model_meta": model_meta
+    }
+
+# --------------------------------------------
+# ------------- All Stations -----------------
+# --------------------------------------------
+def crimes_near_stations(rb, registry, station_keys, radius_m, index=None):
+    # One radius query for every station instead of a full haversine
+    # pass over all crimes per station.
+    lats, lons = zip(*(registry.coords[k] for k in station_keys))
+    index = index or get_crime_index(rb)
+    idx = index.within_many(lats, lons, radius_m)
+    return dict(zip(station_keys, idx))
+
+def forecast_station(af, co, rb, key, radius_m, rb_st=None, registry=None, version=None,
+                     alpha=0.70, n_jobs=None, refit=False, seasonal="prophet"):
+    """
+    Everything the prediction page shows for one station and radius, with
+    models from the registry when fresh; used by forecast_all_stations and
+    the batch workers. "forecast" holds the rows of station_risk_forecasts.
+    """
+    registry = registry or get_station_registry(af, co)
+    version = version or dataset_cache.data_version()
+    if rb_st is None:
+        rb_st = crimes_within(rb, *registry.coords[key], radius_m)
+    df_daily, _ = build_daily_station_frame(af, co, rb, key, radius_m=radius_m,
+                                            rb_st=rb_st, registry=registry)
+    _, base_lambda_week = weekly_base_lambda(df_daily)
+    prop, scaler, xgb, feat_cols, meta = model_registry.fit_or_load(
+        df_daily, key, radius_m, version,
+        lambda d: fit_models_daily(d, n_jobs=n_jobs, seasonal=seasonal), refit=refit, seasonal=seasonal
+    )
+    wk, _ = forecast_28d_daily_and_aggregate_weekly(
+        df_daily, prop, scaler, xgb, feat_cols,
+        base_lambda_week=base_lambda_week, alpha=alpha
+    )
+    return _station_result(rb, co, registry, key, radius_m, wk, rb_st, meta)
+
+def _station_result(rb, co, registry, key, radius_m, wk, rb_st, meta):
+    pred_enriched, (dow_df, hour_df, hour2_df, tipo_top_df) = enrich_with_calendar(
+        wk, rb, co, key, radius_m=radius_m, rb_st=rb_st
+    )
+
+    lat, lon = registry.coords[key]
+    forecast = pd.DataFrame({
+        "key": key,
+        "nombre": registry.names[key],
+        "lat": lat,
+        "lon": lon,
+        "radius_m": int(radius_m),
+        "ds": wk["ds"].values,
+        "robos_pred": wk["robos_pred_xgb_shrunk"].values,
+        "prob_semana": wk["prob_semana_%"].values,
+        "riesgo": wk["riesgo"].values,
+    })
+    return {
+        "station_key": key,
+        "radius": int(radius_m),
+        "forecast": forecast,
+        "pred_enriched": pred_enriched,
+        "prob_dow": dow_df,
+        "prob_hour": hour_df,
+        "prob_hour_2h": hour2_df,
+        "prob_tipo": tipo_top_df,
+        "model_meta": meta,
+    }
+
+def station_keys_for(registry, station_keys=None):
+    keys_list = registry.keys
+    if station_keys is not None:
+        keys_list = [k for k in keys_list if k in set(map(canon_key_ascii, station_keys))]
+    if not keys_list:
+        raise ValueError("No hay estaciones que tengan *tanto* coordenadas como datos de afluencia.")
+    return keys_list
+
+def forecast_all_stations(radius_m: int = 150, station_keys=None, alpha=0.70, refit=False, pooled=False,
+                          seasonal="prophet"):
+    version = dataset_cache.data_version()
+    af, co, rb = load_and_normalize(version=version)
+    print(f"Datos cargados: af={af.shape}, co={co.shape}, rb={rb.shape}")
+
+    registry = get_station_registry(af, co)
+    keys_list = station_keys_for(registry, station_keys)
+    near = crimes_near_stations(rb, registry, keys_list, radius_m)
+
+    parts, failed = [], []
+    if pooled and (refit or seasonal != "prophet"):
+        raise ValueError("El modelo conjunto siempre se entrena de nuevo y no usa componente estacional.")
+    if pooled:
+        results, skipped = forecast_stations_pooled(af, co, rb, keys_list, radius_m, registry=registry,
+                                                    near=near, version=version, alpha=alpha)
+        parts = [results[key]["forecast"] for key in keys_list if key in results]
+        failed = list(skipped)
+    else:
+        for i, key in enumerate(keys_list, 1):
+            try:
+                result = forecast_station(af, co, rb, key, radius_m, rb_st=rb.iloc[near[key]],
+                                          registry=registry, version=version, alpha=alpha, refit=refit,
+                                          seasonal=seasonal)
+            except Exception as e:
+                print(f"[{i}/{len(keys_list)}] {key}: error, se omite ({e})")
+                failed.append(key)
+                continue
+            parts.append(result["forecast"])
+            print(f"[{i}/{len(keys_list)}] {key}: ok")
+
+    if failed:
+        print(f"Estaciones sin pronóstico ({len(failed)}): {', '.join(failed)}")
+    if not parts:
+        return pd.DataFrame()
+    return pd.concat(parts, ignore_index=True)
+
+# --------------------------------------------
+# -------------- Pooled Model ----------------
+# --------------------------------------------
+# Per-station constants added to the daily features, so one XGBRegressor
+# can learn from the stacked frames of every station.
+STATION_FEATURES = ["linea", "st_lat", "st_lon", "aflu_nivel", "robos_tasa"]
+
+def station_features(df_tr, key, registry, lines):
+    # Affluence level and robbery rate come from the training rows only
+    lat, lon = registry.coords[key]
+    return {
+        "linea": lines.get(registry.lines[key], -1),
+        "st_lat": lat,
+        "st_lon": lon,
+        "aflu_nivel": float(np.log1p(df_tr["afluencia"].mean())),
+        "robos_tasa": float(df_tr["robos"].mean()),
+    }
+
+def build_station_frames(af, co, rb, station_keys, radius_m, registry=None, near=None):
+    """
+    {key: daily frame} for the stations with enough history to train on,
+    and {key: reason} for the rest.
+    """
+    registry = registry or get_station_registry(af, co)
+    near = near or crimes_near_stations(rb, registry, station_keys, radius_m)
+    daily, skipped = {}, {}
+    for key in station_keys:
+        try:
+            df, _ = build_daily_station_frame(af, co, rb, key, radius_m=radius_m,
+                                              rb_st=rb.iloc[near[key]], registry=registry)
+        except Exception as e:
+            skipped[key] = str(e)
+            continue
+        if len(df) < 60:
+            skipped[key] = f"Datos insuficientes para entrenar (n={len(df)})."
+            continue
+        daily[key] = df
+    return daily, skipped
+
+def fit_pooled_daily(daily, registry, n_jobs=None):
+    """
+    One XGBRegressor on the stacked daily frames of every station, with the
+    same chronological splits per station as fit_models_daily and no
+    Prophet term. Returns the pooled model and {key: (tr, va, te)}.
+    """
+    lines = {l: i for i, l in enumerate(sorted({registry.lines[k] for k in daily}))}
+    stations, splits = {}, {}
+    parts = {"tr": [], "va": [], "te": []}
+    for key, df in daily.items():
+        df_tr, df_va, df_te = split_series_chron(df, test_frac=0.15, val_frac=0.15)
+        stations[key] = station_features(df_tr, key, registry, lines)
+        splits[key] = (df_tr, df_va, df_te)
+        for name, part in zip(parts, (df_tr, df_va, df_te)):
+            if len(part):
+                parts[name].append(part.assign(**stations[key]))
+    if not parts["tr"]:
+        raise ValueError("No hay estaciones con datos suficientes para el modelo conjunto.")
+
+    df_tr = pd.concat(parts["tr"], ignore_index=True)
+    df_va = pd.concat(parts["va"], ignore_index=True) if parts["va"] else pd.DataFrame()
+    feat_cols = ([c for c in df_tr.columns if c not in ["ds","robos"] + TARGET_DERIVED_COLS + STATION_FEATURES]
+                 + STATION_FEATURES)
+    print(f"Panel conjunto ({len(daily)} estaciones) → train:{df_tr.shape}  val:{df_va.shape}")
+
+    df_tr_os = oversample_positives_local(df_tr, col="robos", factor=3)
+    scaler = StandardScaler()
+    X_tr_s = scaler.fit_transform(df_tr_os[feat_cols].values)
+
+    xgb = _xgb_regressor(n_jobs)
+    fit_params = {"verbose": False}
+    if len(df_va) > 0:
+        fit_params["eval_set"] = [(scaler.transform(df_va[feat_cols].values), df_va["robos"].values)]
+    xgb.fit(X_tr_s, df_tr_os["robos"].values, **fit_params)
+
+    pooled = {"scaler": scaler, "xgb": xgb, "feat_cols": feat_cols, "stations": stations}
+    return pooled, splits
+
+def pooled_holdout_metrics(pooled, splits):
+    # Same metrics as model_registry.holdout_metrics, one predict for all stations
+    te = [df_te.assign(key=key, **pooled["stations"][key])
+          for key, (_, _, df_te) in splits.items() if len(df_te)]
+    metrics = {key: {"n_test": 0, "mae": None, "rmse": None} for key in splits}
+    if not te:
+        return metrics
+    te = pd.concat(te, ignore_index=True)
+    pred = np.clip(pooled["xgb"].predict(pooled["scaler"].transform(te[pooled["feat_cols"]].values)), 0, None)
+    err = pd.Series(pred - te["robos"].to_numpy(), index=te["key"])
+    for key, e in err.groupby(level=0):
+        metrics[key] = {"n_test": int(len(e)),
+                        "mae": round(float(e.abs().mean()), 4),
+                        "rmse": round(float(np.sqrt((e ** 2).mean())), 4)}
+    return metrics
+
+def predict_pooled(daily, pooled, alpha=0.70):
+    # 28-day forecasts of every station in one predict call -> {key: weekly frame}
+    keys = [k for k in daily if k in pooled["stations"]]
+    feats = [future_feature_frame(daily[k], pooled["feat_cols"], const=pooled["stations"][k]) for k in keys]
+    if not feats:
+        return {}
+    XF = pooled["scaler"].transform(np.vstack([f.values for f in feats]))
+    yF = np.clip(pooled["xgb"].predict(XF), 0, None).reshape(len(keys), 28)
+    weekly = {}
+    for key, y in zip(keys, yF):
+        _, base_lambda_week = weekly_base_lambda(daily[key])
+        weekly[key], _ = weekly_risk(daily[key], y, base_lambda_week=base_lambda_week, alpha=alpha)
+    return weekly
+
+def forecast_stations_pooled(af, co, rb, station_keys, radius_m, registry=None, near=None,
+                             version=None, alpha=0.70, n_jobs=None):
+    """
+    forecast_station's results for many stations from one pooled fit.
+    Returns ({key: result}, {key: reason skipped}); each model_meta carries
+    the station's holdout metrics and an even share of the fit time.
+    """
+    registry = registry or get_station_registry(af, co)
+    version = version or dataset_cache.data_version()
+    near = near or crimes_near_stations(rb, registry, station_keys, radius_m)
+    daily, skipped = build_station_frames(af, co, rb, station_keys, radius_m, registry=registry, near=near)
+    if not daily:
+        return {}, skipped
+
+    t0 = time.perf_counter()
+    pooled, splits = fit_pooled_daily(daily, registry, n_jobs=n_jobs)
+    fit_seconds = time.perf_counter() - t0
+    print(f"Modelo conjunto entrenado en {fit_seconds:.1f}s.")
+    metrics = pooled_holdout_metrics(pooled, splits)
+    weekly = predict_pooled(daily, pooled, alpha=alpha)
+
+    created_at = pd.Timestamp.now().isoformat(timespec="seconds")
+    results = {}
+    for key, wk in weekly.items():
+        df_tr = splits[key][0]
+        meta = {
+            "station_key": key,
+            "radius_m": int(radius_m),
+            "data_version": version,
+            "model_schema": model_registry.MODEL_SCHEMA,
+            "pooled": True,
+            "seasonal": None,
+            "feat_cols": pooled["feat_cols"],
+            "train_start": str(pd.to_datetime(df_tr["ds"]).min().date()),
+            "train_end": str(pd.to_datetime(df_tr["ds"]).max().date()),
+            "n_train": int(len(df_tr)),
+            "metrics": metrics[key],
+            "fit_seconds": round(fit_seconds / len(daily), 2),
+            "created_at": created_at,
+            "reused": False,
+        }
+        results[key] = _station_result(rb, co, registry, key, radius_m, wk, rb.iloc[near[key]], meta)
+    return results, skipped
@@ -1,7 +1,9 @@
 import streamlit as st
 from assets.css.theme import theme_css
+from utils.crime_cube import get_crime_cube
 from utils.eda_plotting import (
     plot_near_stations,
+    plot_near_metro_significance,
     plot_robbery_pie_chart,
     plot_crime_heatmap,
     plot_hourly_robberies
@@ -56,6 +58,8 @@ st.markdown("""
 
 plot_near_stations()
 
+plot_near_metro_significance()
+
 st.markdown("""
 <div style='text-align: left; padding: 1em;'>
     <p style='font-size: 16px; margin: auto;'>
@@ -64,7 +68,26 @@ st.markdown("""
         Creamos manualmente una base de datos con las coordenadas de las estaciones del Metro, enfocándonos específicamente en las líneas 1 a la 11, utilizando como punto de partida datos GeoJSON incompletos. Esto nos permitió concentrarnos directamente en las estaciones para nuestra hipótesis, garantizando un análisis espacial preciso a pesar de las limitaciones del conjunto de datos original.
 """, unsafe_allow_html=True)
 
-plot_robbery_pie_chart()
+st.markdown("##### Filtros de periodo y alcaldía")
+cube = get_crime_cube()
+col_years, col_months, col_alcaldias = st.columns(3)
+with col_years:
+    years = st.slider(
+        "Años:",
+        min_value=cube.year_range[0],
+        max_value=cube.year_range[1],
+        value=cube.year_range
+    )
+with col_months:
+    months = st.slider("Meses:", min_value=1, max_value=12, value=(1, 12))
+with col_alcaldias:
+    alcaldias = st.multiselect(
+        "Alcaldías:",
+        options=cube.alcaldias,
+        placeholder="Todas"
+    )
+
+plot_robbery_pie_chart(years, months, alcaldias)
 
 st.markdown("""
 ------
@@ -81,7 +104,7 @@ st.markdown("""
 
 """)
 
-plot_crime_heatmap()
+plot_crime_heatmap(years, months, alcaldias)
 
 st.markdown("""
 ------
@@ -94,7 +117,7 @@ st.markdown("""
 
 """)
 
-plot_hourly_robberies()
+plot_hourly_robberies(years, months, alcaldias)
 
 with st.expander("Conclusión", expanded=False):
     st.markdown("""
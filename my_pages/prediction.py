@@ -1,14 +1,21 @@
 import streamlit as st
 import pandas as pd
 import models.xgboost_plus_prophet as model
+from models.nightly_refresh import load_precomputed_prediction
 import plotly.graph_objects as go
 import plotly.express as px
 from assets.css.theme import theme_css
-import time
-from utils.map_visualization import plot_prediction_animated_map
+import streamlit.components.v1 as components
+from utils.database_queries import get_station_risk_forecasts
+from utils.map_visualization import plot_citywide_risk_map, plot_prediction_animated_map
 
 # ===================== Model Prediction Page =====================
 
+def model_label(seasonal, pooled):
+    if pooled:
+        return "XGBoost conjunto"
+    return f"{'Prophet' if seasonal in (None, 'prophet') else 'Fourier'} + XGBoost"
+
 st.markdown(theme_css(), unsafe_allow_html=True)
 
 st.set_page_config(layout="wide", page_title="Predicción de riesgo")
@@ -29,6 +36,23 @@ if stations_df.empty:
              "Revisa la conexión y las tablas 'lines_metro' y 'daily_affluence'.")
     st.stop()
 
+st.header("Riesgo en toda la ciudad")
+
+city_radius = st.select_slider(
+    "Radio de los pronósticos (metros):",
+    options=[100, 150, 250, 500],
+    value=150
+)
+city_forecasts = get_station_risk_forecasts(city_radius)
+if city_forecasts.empty:
+    st.info("Aún no hay pronósticos para todas las estaciones con este radio. "
+            "Se generan cada noche con `python -m models.nightly_refresh`, o con "
+            f"`python -m models.batch_forecast --radius {city_radius}`.")
+else:
+    generated = pd.to_datetime(city_forecasts['generated_at']).max()
+    st.caption(f"{city_forecasts['key'].nunique()} estaciones, generado el {generated:%Y-%m-%d %H:%M}.")
+    components.html(plot_citywide_risk_map(city_forecasts), height=550)
+
 st.header("Configuración de análisis")
 
 stations_df['display_name'] = stations_df['nombre']
@@ -60,10 +84,13 @@ run_button = st.button("Generar predicción", type="primary")
 if run_button:  
     with st.spinner(f"Analizando '{selected_name}' (radio: {radius_m}m)... Esto puede tardar 1-2 minutos."):
         try:
-            results = model.run_full_prediction_pipeline(
-                station_key_or_name=selected_key,
-                radius_m=radius_m
-            )
+            # Standard radii are served from the nightly run when it has the station
+            results = load_precomputed_prediction(selected_key, radius_m)
+            if results is None:
+                results = model.run_full_prediction_pipeline(
+                    station_key_or_name=selected_key,
+                    radius_m=radius_m
+                )
             st.session_state['prediction_results'] = results
             st.session_state['last_run_params'] = (selected_key, radius_m)
             st.success(f"Análisis completado para: {results['station_name']}")
@@ -78,6 +105,20 @@ if 'prediction_results' in st.session_state and st.session_state['prediction_res
     results = st.session_state['prediction_results']
     
     st.header(f"Resultados para: {results['station_name']}")
+    model_meta = results.get('model_meta')
+    run = results.get('run')
+    if run:
+        st.caption(f"Predicción precalculada en la corrida nocturna {run['run_id']} con "
+                   f"{model_label(run.get('seasonal', 'prophet'), run.get('pooled', False))} "
+                   f"(terminada el {pd.Timestamp(run['finished_at']):%Y-%m-%d %H:%M}).")
+    elif model_meta:
+        mae = model_meta['metrics'].get('mae')
+        mae_text = f", MAE de prueba a un día {mae:.2f} robos/día" if mae is not None else ""
+        engine = model_label(model_meta.get('seasonal', 'prophet'), model_meta.get('pooled', False))
+        origin = (f"Modelo {engine} reutilizado del registro" if model_meta['reused']
+                  else f"Modelo {engine} entrenado en esta consulta ({model_meta['fit_seconds']:.0f}s)")
+        st.caption(f"{origin}: datos del {model_meta['train_start']} al {model_meta['train_end']}"
+                   f"{mae_text}, generado el {model_meta['created_at'].replace('T', ' ')}.")
     
     tab1, tab2, tab3 = st.tabs(
         ["Predicción semanal", "Patrones de crimen", "Datos históricos"]
@@ -132,62 +173,15 @@ if 'prediction_results' in st.session_state and st.session_state['prediction_res
         lat = selected_station_row['lat']
         lon = selected_station_row['lon']
 
-        min_global_prob = pred_df['Prob. de evento (%)'].min()
-        max_global_prob = pred_df['Prob. de evento (%)'].max()
-
-        col_map_controls = st.columns([3, 1])
-
-        with col_map_controls[0]:
-            week_index = st.slider(
-                "Línea de tiempo de predicción:",
-                min_value=0,
-                max_value=len(pred_df) - 1,
-                value=0,
-                format="Semana +%d"
-            )
-
-        map_placeholder = st.empty()
-
-        with col_map_controls[1]:
-            if st.button("▶️ Animar", type="primary"):
-                progress_bar = st.progress(0)
-        
-                for i in range(len(pred_df)):
-                    row = pred_df.iloc[i]
-            
-                    deck_map = plot_prediction_animated_map(
-                        station_lat=lat,
-                        station_lon=lon,
-                        station_name=selected_name,
-                        prediction_row=row,
-                        radius_m=radius_m
-                    )
-                    
-                    map_placeholder.pydeck_chart(deck_map, height=500, key=f"anim_{i}")
-                    progress_bar.progress((i + 1) / len(pred_df))
-                    time.sleep(0.5)
-            
-                    map_placeholder.pydeck_chart(deck_map, height=500, key=f"anim_{i}")
-
-                    progress_bar.progress((i + 1) / len(pred_df))
-                    time.sleep(3)
-                
-                progress_bar.empty()
-
-        current_row = pred_df.iloc[week_index]
-
-        deck_map = plot_prediction_animated_map(
+        map_html = plot_prediction_animated_map(
             station_lat=lat,
             station_lon=lon,
             station_name=selected_name,
-            prediction_row=current_row,
+            pred_df=pred_df,
             radius_m=radius_m,
         )
-
-        st.caption(f"Mostrando semana: **{current_row['Semana termina el']}** | Riesgo: **{current_row['Prob. de evento (%)']:.1f}%**")
-        
-        # Render to the SAME placeholder used by the animation
-        map_placeholder.pydeck_chart(deck_map, height=500)        
+        st.caption("Usa ▶ o la línea de tiempo del mapa para recorrer las semanas.")
+        components.html(map_html, height=500)
     with tab2:
         st.subheader(f"Análisis de patrones históricos de crimen (radio de {results['radius']}m)")
         
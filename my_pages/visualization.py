@@ -1,16 +1,24 @@
 import streamlit as st
+import streamlit.components.v1 as components
 from assets.css.theme import theme_css
+from utils.crime_cube import FISICOS, ROBOS
 from utils.database_queries import (
     get_metro_stations,
 )
 from utils.map_visualization import (
     plot_crime_map,
+    plot_crime_timeline,
     show_station_stats,
+    show_zone_stats,
     view_tables
 )
+from utils.vector_tiles import tiles_available
 
 # ===================== Visualization Page =====================
 
+# Radius around a station used by the map and the station stats
+STATION_RADIUS_M = 100
+
 # Make side margins larger
 st.set_page_config(page_title="Visualización", layout="wide")
 
@@ -29,7 +37,39 @@ station_names = sorted(df_stations['nombre'].astype(str).unique())
 
 with col2:
     st.subheader("Filtrar datos")
+    show_timeline = st.checkbox("Modo línea de tiempo (por año)")
+    timeline_categories = None
+    if show_timeline:
+        timeline_type = st.radio(
+            "Tipo de delito en la línea de tiempo:",
+            options=["Todos", "Robos", "Crímenes físicos"],
+            horizontal=True
+        )
+        timeline_categories = {"Todos": None, "Robos": ROBOS, "Crímenes físicos": FISICOS}[timeline_type]
     show_affluence = st.checkbox("Agregar afluencia")
+    show_grid = st.checkbox("Mostrar densidad de crímenes")
+    grid_years, grid_categories = None, None
+    if show_grid:
+        grid_years = st.slider("Años de la densidad:", min_value=2016, max_value=2024, value=(2016, 2024))
+        grid_type = st.radio(
+            "Tipo de delito:",
+            options=["Todos", "Robos", "Crímenes físicos"],
+            horizontal=True
+        )
+        grid_categories = {"Todos": None, "Robos": ROBOS, "Crímenes físicos": FISICOS}[grid_type]
+    show_segments = st.checkbox("Mostrar riesgo por tramo del metro")
+    segment_hours, segment_categories = None, None
+    if show_segments:
+        segment_hours = st.slider("Horas del día:", min_value=0, max_value=23, value=(0, 23))
+        segment_type = st.radio(
+            "Tipo de delito en los tramos:",
+            options=["Todos", "Robos", "Crímenes físicos"],
+            horizontal=True
+        )
+        segment_categories = {"Todos": None, "Robos": ROBOS, "Crímenes físicos": FISICOS}[segment_type]
+    show_tiles = False
+    if tiles_available():
+        show_tiles = st.checkbox("Mostrar crímenes individuales (acercar el mapa)")
     selected_station = st.selectbox(
         "Busca una estación para saber sus estadísticas:",
         options=station_names,
@@ -39,14 +79,35 @@ with col2:
     highlight_row = None
     if selected_station:
         highlight_row = df_stations[df_stations["nombre"] == selected_station].iloc[0]
-        show_station_stats(selected_station, highlight_row["linea"])
+        show_station_stats(selected_station, highlight_row["linea"], STATION_RADIUS_M)
 
 with col1:
-    deck_map = plot_crime_map(
-        highlight_station=highlight_row,
-        show_affluence=show_affluence,
-    )
-    st.pydeck_chart(deck_map, height=700)
+    if show_timeline:
+        st.caption("Usa ▶ o la línea de tiempo del mapa para recorrer los años.")
+        components.html(plot_crime_timeline(categories=timeline_categories), height=700)
+    else:
+        deck_map = plot_crime_map(
+            highlight_station=highlight_row,
+            show_affluence=show_affluence,
+            show_grid=show_grid,
+            grid_years=grid_years,
+            grid_categories=grid_categories,
+            show_tiles=show_tiles,
+            show_segments=show_segments,
+            segment_hours=segment_hours,
+            segment_categories=segment_categories,
+            radius_m=STATION_RADIUS_M,
+        )
+        st.pydeck_chart(deck_map, height=700)
+
+st.divider()
+
+with st.expander("Analizar una zona (GeoJSON)"):
+    st.markdown("Pega un polígono en formato GeoJSON (geometría, Feature o FeatureCollection) "
+                "para obtener sus estadísticas, por ejemplo uno dibujado en geojson.io.")
+    zone_text = st.text_area("GeoJSON de la zona:", height=150)
+    if st.button("Analizar zona") and zone_text.strip():
+        show_zone_stats(zone_text)
 
 st.divider()
 
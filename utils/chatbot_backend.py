@@ -4,6 +4,8 @@ import duckdb
 from google import genai
 import streamlit as st
 
+from utils.database_queries import MAX_STATION_RADIUS_M
+
 try:
     os.environ["GEMINI_API_KEY"] = st.secrets["GEMINI_API_KEY"]
 except KeyError:
@@ -29,13 +31,14 @@ Responde ÚNICAMENTE con un objeto JSON con dos claves:
 2. "response": Si es "PROCEED", deja esto como una cadena vacía. Si es "CLARIFY", escribe una pregunta amigable para pedir los detalles que faltan (ej. '¡Claro! ¿Sobre qué tipo de delito o en qué alcaldía te gustaría saber?').
 """
 
-SQL_EXPERT_PROMPT = """
+SQL_EXPERT_PROMPT = f"""
 Eres un experto de SQL. Necesitas generar una sola consulta en DuckDB basada en la pregunta del usuario. La consulta puede usar datos de las tablas:
-1. 'crimes_clean': tiene datos de carpetas de investigación de 2016 a 2024. Columnas: 'anio_hecho', 'mes_hecho', 'fecha_hecho', 'hora_hecho', 'delito', 'colonia_hecho', 'alcaldia_hecho', 'longitud', 'latitud'.
+1. 'crimes_clean': tiene datos de carpetas de investigación de 2016 a 2024. Columnas: 'crime_id', 'anio_hecho', 'mes_hecho', 'fecha_hecho', 'hora_hecho', 'delito', 'colonia_hecho', 'alcaldia_hecho', 'longitud', 'latitud', 'nearest_station' (igual a 'num' de la estación más cercana), 'nearest_dist_m' (distancia en metros a esa estación).
 2. 'lines_metro': tiene estaciones del metro. Columnas: 'num' (ID único), 'linea', 'nombre' (estación), 'lat', 'lon'.
 3. 'daily_affluence': tiene afluencia diaria del metro. Columnas: 'key' (ID único, igual a 'num'), 'fecha', 'afluencia'.
+4. 'crime_station_knn': todas las estaciones a {MAX_STATION_RADIUS_M} metros o menos de cada crimen. Columnas: 'crime_id', 'rank', 'station_num' (igual a 'num'), 'dist_m' (metros).
 
-Si el usuario quiere relacionar crímenes con estaciones del metro, usa ST_Distance_Sphere(ST_Point(lon1, lat1), ST_Point(lon2, lat2)) <= radio_en_metros.
+Si el usuario quiere relacionar crímenes con estaciones del metro, une 'crime_station_knn' con 'crimes_clean' por 'crime_id' y con 'lines_metro' por 'station_num' = 'num', filtrando dist_m <= radio_en_metros. Solo usa ST_Distance_Sphere(ST_Point(lon1, lat1), ST_Point(lon2, lat2)) si el radio es mayor a {MAX_STATION_RADIUS_M} metros.
 NO incluyas explicaciones, markdown o cualquier otro texto extra; SOLO contesta con la consulta SQL.
 """
 
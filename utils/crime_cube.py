@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.database_queries import CUBE_CATEGORIES, NO_HOUR, get_daily_crime_counts
+
+# Category groups as the EDA charts read them
+ROBO_VIOLENTO = ("robo_violento",)
+ROBOS = ("robo_violento", "robo")
+FISICOS = ("robo_violento", "lesion_homicidio")
+
+
+class CrimeCube:
+    """
+    Dense day x hour x alcaldía x category count array.
+
+    Every EDA chart is a sum over some slice of this cube, so filters by
+    year, month range and alcaldía never touch the raw crime rows. Crimes
+    without an hour sit in the extra NO_HOUR slot: they count towards the
+    totals but not towards the hourly views.
+    """
+
+    def __init__(self, start, counts, alcaldias):
+        self.counts = counts
+        self.alcaldias = list(alcaldias)
+        self.dates = pd.date_range(start, periods=counts.shape[0], freq="D")
+        self.years = self.dates.year.to_numpy()
+        self.months = self.dates.month.to_numpy()
+        self.dow = self.dates.weekday.to_numpy()  # 0 = lunes
+
+    @classmethod
+    def from_counts(cls, df):
+        fecha = pd.to_datetime(df["fecha"])
+        start = fecha.min()
+        day = (fecha - start).dt.days.to_numpy()
+        alc_codes, alcaldias = pd.factorize(df["alcaldia"], sort=True)
+
+        counts = np.zeros((day.max() + 1, NO_HOUR + 1, len(alcaldias), len(CUBE_CATEGORIES)), dtype=np.int32)
+        counts[day, df["hour"].to_numpy(), alc_codes, df["category"].to_numpy()] = df["n"].to_numpy()
+        return cls(start, counts, alcaldias)
+
+    @property
+    def year_range(self):
+        return int(self.years.min()), int(self.years.max())
+
+    def _day_mask(self, years=None, months=None):
+        mask = np.ones(len(self.dates), dtype=bool)
+        if years is not None:
+            mask &= (self.years >= years[0]) & (self.years <= years[1])
+        if months is not None:
+            mask &= (self.months >= months[0]) & (self.months <= months[1])
+        return mask
+
+    def day_hour(self, categories, years=None, months=None, alcaldias=None):
+        """Returns (day_mask, counts per selected day and hour)."""
+        mask = self._day_mask(years, months)
+        cats = [CUBE_CATEGORIES.index(c) for c in categories]
+        sub = self.counts[mask][:, :NO_HOUR][..., cats].sum(axis=3)
+        if alcaldias:
+            alc = [self.alcaldias.index(a) for a in alcaldias if a in self.alcaldias]
+            sub = sub[:, :, alc]
+        return mask, sub.sum(axis=2)
+
+    def dow_hour(self, categories, **filters):
+        mask, per_day = self.day_hour(categories, **filters)
+        out = np.zeros((7, 24), dtype=np.int64)
+        np.add.at(out, self.dow[mask], per_day)
+        return out
+
+    def by_alcaldia(self, categories, years=None, months=None):
+        mask = self._day_mask(years, months)
+        cats = [CUBE_CATEGORIES.index(c) for c in categories]
+        totals = self.counts[mask][..., cats].sum(axis=(0, 1, 3))
+        return pd.Series(totals, index=self.alcaldias)
+
+
+@st.cache_resource
+def get_crime_cube():
+    return CrimeCube.from_counts(get_daily_crime_counts())
@@ -1,3 +1,6 @@
+import math
+import time
+
 import duckdb
 import pandas as pd
 import streamlit as st
@@ -7,6 +10,19 @@ DB_PATH = "data/crimes_FGJ.db"
 def get_connection():
     return duckdb.connect(DB_PATH)
 
+def get_write_connection(attempts=8, wait_s=0.5, max_wait_s=30.0):
+    # Batch jobs write to the file the app opens for every query; DuckDB
+    # refuses the lock while another process holds it, so back off and retry
+    for attempt in range(attempts):
+        try:
+            return get_connection()
+        except duckdb.IOException as e:
+            if attempt == attempts - 1:
+                raise
+            delay = min(wait_s * 2 ** attempt, max_wait_s)
+            print(f"Base de datos ocupada ({e}); reintento en {delay:.1f}s")
+            time.sleep(delay)
+
 def run_query(query: str) -> pd.DataFrame:
     con = get_connection()
     con.execute("LOAD spatial;")
@@ -16,6 +32,34 @@ def run_query(query: str) -> pd.DataFrame:
     finally:
         con.close()
 
+# crime_station_knn (see presetup/db_loading.py) holds every station within
+# MAX_STATION_RADIUS_M of each crime, so radius filters on it are exact up
+# to there. Must match MAX_STATION_RADIUS_M in db_loading.py.
+MAX_STATION_RADIUS_M = 1000
+EARTH_RADIUS_M = 6371000.0
+
+def _station_pairs_sql(radius_m):
+    # (crime_id, station_num, dist_m) for every crime/station pair within
+    # radius_m; wider radii than the table holds fall back to an exact
+    # great-circle join over a bounding box around each station
+    if radius_m <= MAX_STATION_RADIUS_M:
+        return f"(SELECT crime_id, station_num, dist_m FROM crime_station_knn WHERE dist_m <= {radius_m})"
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M) * 1.01
+    return f"""(
+        SELECT crime_id, station_num, dist_m FROM (
+            SELECT c.crime_id, s.num AS station_num,
+                2 * {EARTH_RADIUS_M} * ASIN(SQRT(
+                    POWER(SIN(RADIANS(c.latitud - s.lat) / 2), 2)
+                    + COS(RADIANS(c.latitud)) * COS(RADIANS(s.lat)) * POWER(SIN(RADIANS(c.longitud - s.lon) / 2), 2)
+                )) AS dist_m
+            FROM crimes_clean c
+            JOIN lines_metro s
+                ON c.latitud BETWEEN s.lat - {dlat} AND s.lat + {dlat}
+                AND c.longitud BETWEEN s.lon - {dlat} / COS(RADIANS(s.lat)) AND s.lon + {dlat} / COS(RADIANS(s.lat))
+        )
+        WHERE dist_m <= {radius_m}
+    )"""
+
 # ----------------------------
 # ---------- EDA -------------
 # ----------------------------
@@ -37,26 +81,7 @@ def get_metro_stations():
     """
     return run_query(query)
 
-@st.cache_data
-def get_robbery_counts_by_borough():
-    query = """
-    SELECT alcaldia_hecho, COUNT(*) as robbery_count
-    FROM crimes_clean
-    WHERE delito LIKE '%ROBO%'
-    AND alcaldia_hecho IS NOT NULL
-    GROUP BY alcaldia_hecho
-    ORDER BY robbery_count DESC
-    """
-    return run_query(query)
-
-@st.cache_data
-def get_physical_crimes():
-    query = """
-    SELECT
-    EXTRACT(hour FROM hora_hecho::TIME) AS hour,
-    strftime(fecha_hecho, '%A') AS day_of_week
-    FROM crimes_clean
-    WHERE delito IN (
+VIOLENT_ROBBERY_DELITOS = (
     'ROBO A PASAJERO A BORDO DE TAXI CON VIOLENCIA',
     'ROBO A TRANSEUNTE EN VIA PUBLICA CON VIOLENCIA',
     'ROBO DE VEHICULO DE SERVICIO PARTICULAR CON VIOLENCIA',
@@ -65,7 +90,11 @@ def get_physical_crimes():
     'ROBO A REPARTIDOR CON VIOLENCIA',
     'ROBO A PASAJERO A BORDO DE MICROBUS CON VIOLENCIA',
     'ROBO A PASAJERO A BORDO DEL METRO CON VIOLENCIA',
-    'ROBO A TRANSPORTISTA CON VIOLENCIA',
+    'ROBO A TRANSPORTISTA CON VIOLENCIA'
+)
+
+# Physical crimes are the violent robberies plus these
+BODILY_HARM_DELITOS = (
     'LESIONES INTENCIONALES',
     'LESIONES INTENCIONALES POR GOLPES',
     'LESIONES INTENCIONALES POR ARMA BLANCA',
@@ -80,32 +109,38 @@ def get_physical_crimes():
     'FEMINICIDIO',
     'FEMINICIDIO POR GOLPES',
     'FEMINICIDIO POR ARMA DE FUEGO'
-    )
-    AND hora_hecho IS NOT NULL
-    AND fecha_hecho IS NOT NULL
-    """
-    return run_query(query)
+)
 
-@st.cache_data
-def get_hourly_robberies():
-    query = """
+# Disjoint categories used by the EDA cube, in CASE order
+CUBE_CATEGORIES = ("robo_violento", "robo", "lesion_homicidio", "otro")
+
+def _sql_list(values):
+    return ", ".join(f"'{v}'" for v in values)
+
+CATEGORY_CASE_SQL = f"""
+    CASE
+        WHEN delito IN ({_sql_list(VIOLENT_ROBBERY_DELITOS)}) THEN 0
+        WHEN delito LIKE '%ROBO%' THEN 1
+        WHEN delito IN ({_sql_list(BODILY_HARM_DELITOS)}) THEN 2
+        ELSE 3
+    END
+"""
+
+# Hour bucket for crimes recorded without an hour
+NO_HOUR = 24
+
+def get_daily_crime_counts():
+    query = f"""
     SELECT
-    EXTRACT(hour FROM hora_hecho::TIME) AS hour,
-    EXTRACT(dow FROM fecha_hecho::DATE) AS weekday
+        CAST(fecha_hecho AS DATE) AS fecha,
+        COALESCE(CAST(EXTRACT(hour FROM hora_hecho::TIME) AS INT), {NO_HOUR}) AS hour,
+        alcaldia_hecho AS alcaldia,
+        {CATEGORY_CASE_SQL} AS category,
+        COUNT(*) AS n
     FROM crimes_clean
-    WHERE delito IN (
-    'ROBO A PASAJERO A BORDO DE TAXI CON VIOLENCIA',
-    'ROBO A TRANSEUNTE EN VIA PUBLICA CON VIOLENCIA',
-    'ROBO DE VEHICULO DE SERVICIO PARTICULAR CON VIOLENCIA',
-    'ROBO A NEGOCIO CON VIOLENCIA',
-    'ROBO A CASA HABITACION CON VIOLENCIA',
-    'ROBO A REPARTIDOR CON VIOLENCIA',
-    'ROBO A PASAJERO A BORDO DE MICROBUS CON VIOLENCIA',
-    'ROBO A PASAJERO A BORDO DEL METRO CON VIOLENCIA',
-    'ROBO A TRANSPORTISTA CON VIOLENCIA'
-    )
-    AND hora_hecho IS NOT NULL
-    AND fecha_hecho IS NOT NULL
+    WHERE fecha_hecho IS NOT NULL
+    AND alcaldia_hecho IS NOT NULL
+    GROUP BY ALL
     """
     return run_query(query)
 
@@ -125,13 +160,22 @@ def get_alcaldia_boundaries():
     return run_query(query)
 
 @st.cache_data
-def get_crimes_by_year(radius_m=100, year=None):
-    year_filter = f"AND CAST(anio_hecho AS INT) = {year}" if year else ""
+def get_station_counts_by_year(radius_m=100):
     query = f"""
-    SELECT latitud, longitud, delito, fecha_hecho, hora_hecho, mes_hecho
-    FROM crimes_clean
-    WHERE latitud IS NOT NULL AND longitud IS NOT NULL
-    {year_filter}
+    SELECT
+        s.num,
+        s.nombre,
+        s.linea,
+        s.lat,
+        s.lon,
+        CAST(c.anio_hecho AS INT) AS year,
+        {CATEGORY_CASE_SQL} AS category,
+        COUNT(*) AS crime_count
+    FROM lines_metro s
+    JOIN {_station_pairs_sql(radius_m)} k
+        ON k.station_num = s.num
+    JOIN crimes_clean c ON c.crime_id = k.crime_id
+    GROUP BY ALL
     """
     return run_query(query)
 
@@ -153,36 +197,29 @@ def get_affluence_density():
     return run_query(query)
 
 @st.cache_data
-def get_top_crime_stations(n=5):
-    query = """
-    SELECT s.nombre AS estacion, COUNT(*) AS crime_count
-    FROM crimes_clean c
-    JOIN lines_metro s ON ST_Distance(
-        ST_Point(c.longitud, c.latitud),
-        ST_Point(s.lon, s.lat)
-    ) <= 100
-    WHERE c.latitud IS NOT NULL AND c.longitud IS NOT NULL
+def get_top_crime_stations(n=5, radius_m=100):
+    query = f"""
+    SELECT s.nombre AS estacion, COUNT(DISTINCT k.crime_id) AS crime_count
+    FROM {_station_pairs_sql(radius_m)} k
+    JOIN lines_metro s ON s.num = k.station_num
     GROUP BY s.nombre
     ORDER BY crime_count DESC
-    LIMIT {}
-    """.format(n)
+    LIMIT {n}
+    """
     return run_query(query)
 
 @st.cache_data
-def get_top_robo_stations(n=5):
-    query = """
-    SELECT s.nombre AS estacion, COUNT(*) AS robo_count
-    FROM crimes_clean c
-    JOIN lines_metro s ON ST_Distance(
-        ST_Point(c.longitud, c.latitud),
-        ST_Point(s.lon, s.lat)
-    ) <= 100
-    WHERE c.latitud IS NOT NULL AND c.longitud IS NOT NULL
-    AND c.delito ILIKE '%ROBO%'
+def get_top_robo_stations(n=5, radius_m=100):
+    query = f"""
+    SELECT s.nombre AS estacion, COUNT(DISTINCT k.crime_id) AS robo_count
+    FROM {_station_pairs_sql(radius_m)} k
+    JOIN lines_metro s ON s.num = k.station_num
+    JOIN crimes_clean c ON c.crime_id = k.crime_id
+    WHERE c.delito ILIKE '%ROBO%'
     GROUP BY s.nombre
     ORDER BY robo_count DESC
-    LIMIT {}
-    """.format(n)
+    LIMIT {n}
+    """
     return run_query(query)
 
 @st.cache_data
@@ -207,48 +244,38 @@ def get_station_coords(nombre):
     """
     return run_query(query).iloc[0]
 
+# Crimes within radius_m of a station
+def _station_crimes_sql(nombre, radius_m):
+    return f"""
+    crimes_clean c
+    JOIN {_station_pairs_sql(radius_m)} k ON k.crime_id = c.crime_id
+    WHERE k.station_num = (SELECT num FROM lines_metro WHERE nombre = '{nombre}' ORDER BY num LIMIT 1)
+    """
+
 @st.cache_data
 def get_total_crimes_station(nombre, radius_m=100):
-    coords = get_station_coords(nombre)
     query = f"""
     SELECT COUNT(*) AS total_crimes
-    FROM crimes_clean
-    WHERE latitud IS NOT NULL AND longitud IS NOT NULL
-    AND ST_Distance_Sphere( -- FIXED: Spherical distance in meters
-        ST_Point(longitud, latitud),
-        ST_Point({coords['lon']}, {coords['lat']})
-    ) <= {radius_m}
+    FROM {_station_crimes_sql(nombre, radius_m)}
     """
     return run_query(query).iloc[0]["total_crimes"]
 
 @st.cache_data
 def get_total_robos_station(nombre, radius_m=100):
-    coords = get_station_coords(nombre)
     query = f"""
     SELECT COUNT(*) AS total_robos
-    FROM crimes_clean
-    WHERE latitud IS NOT NULL AND longitud IS NOT NULL
-    AND delito ILIKE '%robo%'
-    AND ST_Distance_Sphere( -- FIXED: Spherical distance in meters
-        ST_Point(longitud, latitud),
-        ST_Point({coords['lon']}, {coords['lat']})
-    ) <= {radius_m}
+    FROM {_station_crimes_sql(nombre, radius_m)}
+    AND c.delito ILIKE '%robo%'
     """
     return run_query(query).iloc[0]["total_robos"]
 
 @st.cache_data
 def get_most_common_robo_station(nombre, radius_m=100):
-    coords = get_station_coords(nombre)
     query = f"""
-    SELECT delito, COUNT(*) AS count
-    FROM crimes_clean
-    WHERE latitud IS NOT NULL AND longitud IS NOT NULL
-    AND delito ILIKE '%robo%'
-    AND ST_Distance_Sphere( -- FIXED: Spherical distance in meters
-        ST_Point(longitud, latitud),
-        ST_Point({coords['lon']}, {coords['lat']})
-    ) <= {radius_m}
-    GROUP BY delito
+    SELECT c.delito, COUNT(*) AS count
+    FROM {_station_crimes_sql(nombre, radius_m)}
+    AND c.delito ILIKE '%robo%'
+    GROUP BY c.delito
     ORDER BY count DESC
     LIMIT 1
     """
@@ -256,16 +283,10 @@ def get_most_common_robo_station(nombre, radius_m=100):
 
 @st.cache_data
 def get_top_3_delitos_station(nombre, radius_m=100):
-    coords = get_station_coords(nombre)
     query = f"""
-    SELECT delito, COUNT(*) AS count
-    FROM crimes_clean
-    WHERE latitud IS NOT NULL AND longitud IS NOT NULL
-    AND ST_Distance_Sphere(
-        ST_Point(longitud, latitud),
-        ST_Point({coords['lon']}, {coords['lat']})
-    ) <= {radius_m}
-    GROUP BY delito
+    SELECT c.delito, COUNT(*) AS count
+    FROM {_station_crimes_sql(nombre, radius_m)}
+    GROUP BY c.delito
     ORDER BY count DESC
     LIMIT 3
     """
@@ -273,33 +294,10 @@ def get_top_3_delitos_station(nombre, radius_m=100):
 
 @st.cache_data
 def get_average_time_station(nombre, radius_m=100):
-    coords = get_station_coords(nombre)
     query = f"""
-    SELECT AVG(EXTRACT(HOUR FROM hora_hecho::TIME)) AS avg_hour,
-            AVG(EXTRACT(MINUTE FROM hora_hecho::TIME)) AS avg_minute
-    FROM crimes_clean
-    WHERE latitud IS NOT NULL AND longitud IS NOT NULL
-    AND ST_Distance_Sphere( -- FIXED: Spherical distance in meters
-        ST_Point(longitud, latitud),
-        ST_Point({coords['lon']}, {coords['lat']})
-    ) <= {radius_m}
-    """
-    return run_query(query).iloc[0]
-
-@st.cache_data
-def get_hotspot_coords_station(nombre, radius_m=100):
-    coords = get_station_coords(nombre)
-    query = f"""
-    SELECT longitud, latitud, COUNT(*) AS count
-    FROM crimes_clean
-    WHERE latitud IS NOT NULL AND longitud IS NOT NULL
-    AND ST_Distance_Sphere( -- FIXED: Spherical distance in meters
-        ST_Point(longitud, latitud),
-        ST_Point({coords['lon']}, {coords['lat']})
-    ) <= {radius_m}
-    GROUP BY longitud, latitud
-    ORDER BY count DESC
-    LIMIT 1
+    SELECT AVG(EXTRACT(HOUR FROM c.hora_hecho::TIME)) AS avg_hour,
+            AVG(EXTRACT(MINUTE FROM c.hora_hecho::TIME)) AS avg_minute
+    FROM {_station_crimes_sql(nombre, radius_m)}
     """
     return run_query(query).iloc[0]
 
@@ -312,18 +310,152 @@ def get_crime_counts_per_station(radius_m=100):
         s.nombre,
         s.lat,
         s.lon,
-        COUNT(c.*) AS crime_count
+        COUNT(*) AS crime_count
     FROM lines_metro s
-    JOIN crimes_clean c
-        ON c.latitud IS NOT NULL AND c.longitud IS NOT NULL
-        AND ST_Distance_Sphere( -- Forces spherical distance calculation in meters
-            ST_Point(c.longitud, c.latitud), -- Simplest point creation (lon, lat)
-            ST_Point(s.lon, s.lat)          -- Simplest point creation (lon, lat)
-        ) <= {radius_m} -- Distance is guaranteed to be in meters
+    JOIN {_station_pairs_sql(radius_m)} k
+        ON k.station_num = s.num
     GROUP BY s.num, s.linea, s.nombre, s.lat, s.lon;
     """
     return run_query(query)
 
+@st.cache_data
+def get_crime_line_distances(max_radius_m=250):
+    # Distance from each crime to the closest station of every line
+    # within max_radius_m
+    query = f"""
+    SELECT k.crime_id, s.linea, MIN(k.dist_m) AS dist_m
+    FROM {_station_pairs_sql(max_radius_m)} k
+    JOIN lines_metro s ON s.num = k.station_num
+    GROUP BY k.crime_id, s.linea
+    """
+    return run_query(query)
+
+@st.cache_data
+def get_total_crime_count():
+    query = """
+    SELECT COUNT(*) AS total
+    FROM crimes_clean
+    WHERE latitud IS NOT NULL AND longitud IS NOT NULL
+    """
+    return int(run_query(query).iloc[0]["total"])
+
+def get_crime_coords(delito_like=None, year=None):
+    delito_filter = f"AND delito ILIKE '{delito_like}'" if delito_like else ""
+    year_filter = f"AND CAST(anio_hecho AS INT) = {year}" if year else ""
+    query = f"""
+    SELECT latitud, longitud
+    FROM crimes_clean
+    WHERE latitud IS NOT NULL AND longitud IS NOT NULL
+    {delito_filter}
+    {year_filter}
+    """
+    return run_query(query)
+
+def get_crime_points():
+    # Compact per-crime columns for in-memory spatial queries
+    query = """
+    SELECT
+        latitud,
+        longitud,
+        delito,
+        CAST(CAST(fecha_hecho AS DATE) - DATE '1970-01-01' AS INT) AS day,
+        TRY_CAST(split_part(hora_hecho, ':', 1) AS INT) AS hora
+    FROM crimes_clean
+    WHERE latitud IS NOT NULL AND longitud IS NOT NULL
+    AND fecha_hecho IS NOT NULL
+    """
+    return run_query(query)
+
+def get_crime_hour_categories():
+    query = f"""
+    SELECT
+        latitud,
+        longitud,
+        TRY_CAST(split_part(hora_hecho, ':', 1) AS INT) AS hora,
+        {CATEGORY_CASE_SQL} AS category
+    FROM crimes_clean
+    WHERE latitud IS NOT NULL AND longitud IS NOT NULL
+    AND hora_hecho IS NOT NULL
+    """
+    return run_query(query)
+
+def table_exists(name):
+    return bool(run_query(
+        f"SELECT COUNT(*) AS n FROM information_schema.tables WHERE table_name = '{name}'"
+    ).iloc[0]["n"])
+
+def get_segment_crime_totals(hour_range=None, categories=None):
+    # The existence check stays outside the cache, so the tables are
+    # picked up as soon as utils/metro_segments.py writes them
+    if not table_exists("segment_crime_counts"):
+        return pd.DataFrame()
+    return _segment_crime_totals(hour_range, categories)
+
+@st.cache_data(ttl=3600)
+def _segment_crime_totals(hour_range=None, categories=None):
+    hour_filter = f"AND c.hora BETWEEN {int(hour_range[0])} AND {int(hour_range[1])}" if hour_range else ""
+    category_filter = (f"AND c.category IN ({', '.join(str(CUBE_CATEGORIES.index(x)) for x in categories)})"
+                       if categories else "")
+    query = f"""
+    SELECT
+        s.segment_id, s.linea, s.from_nombre, s.to_nombre,
+        s.lat0, s.lon0, s.lat1, s.lon1, s.length_m, s.corridor_m,
+        CAST(COALESCE(SUM(c.n), 0) AS BIGINT) AS n
+    FROM metro_segments s
+    LEFT JOIN segment_crime_counts c
+        ON c.segment_id = s.segment_id
+        {hour_filter}
+        {category_filter}
+    GROUP BY ALL
+    ORDER BY s.segment_id
+    """
+    return run_query(query)
+
+def get_colonia_centroids(min_crimes=5):
+    # Median is robust to the mis-geocoded points some colonias carry
+    query = f"""
+    SELECT
+        colonia_hecho AS colonia,
+        alcaldia_hecho AS alcaldia,
+        median(latitud) AS lat,
+        median(longitud) AS lon,
+        COUNT(*) AS n
+    FROM crimes_clean
+    WHERE latitud IS NOT NULL AND longitud IS NOT NULL
+    AND colonia_hecho IS NOT NULL AND alcaldia_hecho IS NOT NULL
+    GROUP BY colonia_hecho, alcaldia_hecho
+    HAVING COUNT(*) >= {min_crimes}
+    """
+    return run_query(query)
+
+@st.cache_data
+def get_crime_clusters(month=None):
+    month_filter = f"WHERE month = DATE '{month}'" if month else ""
+    query = f"""
+    SELECT c.*, s.nombre AS station_name, s.linea
+    FROM crime_clusters c
+    LEFT JOIN lines_metro s ON c.nearest_station = s.num
+    {month_filter}
+    ORDER BY c.month, c.n_crimes DESC
+    """
+    return run_query(query)
+
+def get_grid_counts(cell_sizes_m, lat0, lon0, m_per_deg_lat, m_per_deg_lon):
+    # One scan, every pyramid level: crimes per grid cell, year and category
+    query = f"""
+    SELECT
+        l.cell_m,
+        CAST(floor((c.longitud - {lon0}) * {m_per_deg_lon} / l.cell_m) AS INT) AS ix,
+        CAST(floor((c.latitud - {lat0}) * {m_per_deg_lat} / l.cell_m) AS INT) AS iy,
+        CAST(c.anio_hecho AS INT) AS year,
+        {CATEGORY_CASE_SQL} AS category,
+        COUNT(*) AS n
+    FROM crimes_clean c, (SELECT UNNEST({list(cell_sizes_m)}) AS cell_m) l
+    WHERE c.latitud IS NOT NULL AND c.longitud IS NOT NULL
+    GROUP BY ALL
+    """
+    return run_query(query)
+
 # Model
 def get_metro_coords():
     query = """
@@ -350,6 +482,80 @@ def get_all_crimes():
     """
     return run_query(query)
 
+def get_model_data_fingerprint():
+    # Cheap summary of the model's source tables; changes whenever their
+    # rows do, but not when derived tables are written to the same file.
+    query = """
+    SELECT
+        (SELECT COUNT(*) FROM crimes_clean) AS crimes_n,
+        (SELECT CAST(MAX(fecha_hecho) AS VARCHAR) FROM crimes_clean) AS crimes_max,
+        (SELECT SUM(latitud) + SUM(longitud) FROM crimes_clean) AS crimes_sum,
+        (SELECT COUNT(*) FROM daily_affluence) AS aflu_n,
+        (SELECT SUM(afluencia) FROM daily_affluence) AS aflu_sum,
+        (SELECT COUNT(*) FROM lines_metro) AS metro_n,
+        (SELECT SUM(lat) + SUM(lon) FROM lines_metro) AS metro_sum
+    """
+    return run_query(query).iloc[0].to_dict()
+
+def get_station_risk_forecasts(radius_m=150):
+    exists = run_query(
+        "SELECT COUNT(*) AS n FROM information_schema.tables WHERE table_name = 'station_risk_forecasts'"
+    ).iloc[0]["n"]
+    if not exists:
+        return pd.DataFrame()
+    query = f"""
+    SELECT key, nombre, lat, lon, ds, prob_semana, riesgo, generated_at
+    FROM station_risk_forecasts
+    WHERE radius_m = {int(radius_m)}
+    ORDER BY ds, key
+    """
+    return run_query(query)
+
+PREDICTION_TABLES = {
+    "pred_enriched": "station_pred_enriched",
+    "prob_dow": "station_prob_dow",
+    "prob_hour": "station_prob_hour",
+    "prob_hour_2h": "station_prob_hour_2h",
+    "prob_tipo": "station_prob_tipo",
+}
+
+def get_station_prediction(station_key, radius_m, data_version, started_since):
+    # Latest run built from this data version, started at or after
+    # started_since, that has the station; looked up on every call so a new
+    # run or a data reload is seen right away
+    if not (table_exists("prediction_runs") and table_exists(PREDICTION_TABLES["pred_enriched"])):
+        return {}
+    run = run_query(f"""
+    SELECT r.*
+    FROM prediction_runs r
+    JOIN {PREDICTION_TABLES['pred_enriched']} p USING (run_id)
+    WHERE p.key = '{station_key}' AND p.radius_m = {int(radius_m)}
+    AND r.data_version = '{data_version}'
+    AND r.started_at >= TIMESTAMP '{pd.Timestamp(started_since)}'
+    ORDER BY r.run_id DESC
+    LIMIT 1
+    """)
+    if run.empty:
+        return {}
+    out = _station_prediction_frames(station_key, int(radius_m), run.iloc[0]["run_id"])
+    return dict(out, run=run.iloc[0].to_dict())
+
+# A stored run never changes, so its frames are cached by run_id
+@st.cache_data
+def _station_prediction_frames(station_key, radius_m, run_id):
+    out = {}
+    for name, table in PREDICTION_TABLES.items():
+        if not table_exists(table):
+            out[name] = pd.DataFrame()
+            continue
+        out[name] = run_query(f"""
+        SELECT * EXCLUDE (run_id, key, radius_m, row_n)
+        FROM {table}
+        WHERE run_id = '{run_id}' AND key = '{station_key}' AND radius_m = {int(radius_m)}
+        ORDER BY row_n
+        """)
+    return out
+
 def get_daily_affluence():
     query = """
     SELECT 
@@ -0,0 +1,131 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+# Player injected into pydeck's standalone page. `jsonInput`, `deckInstance`
+# and `updateDeck` are globals defined by pydeck's template and bundle; each
+# frame only swaps the `data` of the animated layers, so deck.gl keeps the
+# view and interpolates the attributes that declare transitions.
+_PLAYER = """
+<div id="anim-controls" style="position:absolute;left:12px;right:12px;bottom:12px;z-index:10;
+     display:flex;align-items:center;gap:10px;padding:6px 10px;border-radius:6px;
+     background:rgba(0,0,0,0.65);color:#fff;font:13px sans-serif;">
+  <button id="anim-play" style="width:34px;cursor:pointer;">&#9654;</button>
+  <input id="anim-slider" type="range" min="0" max="__LAST__" value="0" style="flex:1;">
+  <span id="anim-label" style="min-width:200px;text-align:right;"></span>
+</div>
+<script>
+(function() {
+  const frames = __FRAMES__;
+  const labels = __LABELS__;
+  const interval = __INTERVAL__;
+  const slider = document.getElementById('anim-slider');
+  const label = document.getElementById('anim-label');
+  const play = document.getElementById('anim-play');
+  let current = 0, timer = null;
+
+  // Columnar frames: rows are rebuilt from shared columns plus the
+  // per-frame values, skipping rows whose `skip_zero` value is 0.
+  function frameData(spec, k) {
+    if (Array.isArray(spec)) return spec[k];
+    const cols = Object.keys(spec.columns), fcols = Object.keys(spec.frames);
+    const n = spec.columns[cols[0]].length, rows = [];
+    for (let i = 0; i < n; i++) {
+      if (spec.skip_zero && !spec.frames[spec.skip_zero][k][i]) continue;
+      const row = {};
+      for (const c of cols) row[c] = spec.columns[c][i];
+      for (const c of fcols) row[c] = spec.frames[c][k][i];
+      rows.push(row);
+    }
+    return rows;
+  }
+
+  function show(k) {
+    current = k;
+    const layers = jsonInput.layers.map(l => (l.id in frames) ? Object.assign({}, l, {data: frameData(frames[l.id], k)}) : l);
+    updateDeck({layers: layers}, deckInstance);
+    slider.value = k;
+    label.textContent = labels[k];
+  }
+  function stop() {
+    clearInterval(timer);
+    timer = null;
+    play.innerHTML = '&#9654;';
+  }
+  play.onclick = function() {
+    if (timer) { stop(); return; }
+    play.innerHTML = '&#10074;&#10074;';
+    if (current === labels.length - 1) show(0);
+    timer = setInterval(function() {
+      if (current >= labels.length - 1) { stop(); return; }
+      show(current + 1);
+    }, interval);
+  };
+  slider.oninput = function() { stop(); show(parseInt(slider.value)); };
+  show(0);
+})();
+</script>
+"""
+
+
+def _records(data):
+    if isinstance(data, pd.DataFrame):
+        return json.loads(data.to_json(orient="records", double_precision=6))
+    return data
+
+class ColumnarFrames:
+    """
+    Frames that share their rows: `columns` holds the values that never
+    change (positions, names) and `frames` one array per frame for each
+    column that does, shape (n_frames, n_rows). Sent once as arrays
+    instead of one record list per frame.
+    """
+
+    def __init__(self, columns, frames, skip_zero=None):
+        self.columns = {c: np.asarray(v).tolist() for c, v in columns.items()}
+        self.frames = {c: np.asarray(v).tolist() for c, v in frames.items()}
+        self.skip_zero = skip_zero
+
+    def __len__(self):
+        return len(next(iter(self.frames.values())))
+
+    def frame(self, k):
+        rows = pd.DataFrame(self.columns)
+        for c, values in self.frames.items():
+            rows[c] = values[k]
+        if self.skip_zero:
+            rows = rows[rows[self.skip_zero] != 0]
+        return rows.reset_index(drop=True)
+
+    def to_payload(self):
+        return {"columns": self.columns, "frames": self.frames, "skip_zero": self.skip_zero}
+
+def _payload(data):
+    if isinstance(data, ColumnarFrames):
+        return data.to_payload()
+    return [_records(d) for d in data]
+
+def animated_deck_html(deck, frames, labels, interval_ms=1500):
+    """
+    Standalone HTML for `deck` with a play button and a slider that step
+    through `frames`, entirely in the browser.
+
+    frames: {layer_id: [data for frame 0, data for frame 1, ...]} or
+    {layer_id: ColumnarFrames}, one entry per animated layer; the deck's
+    own data for those layers is frame 0.
+    labels: one caption per frame.
+    """
+    n = len(labels)
+    if any(len(data) != n for data in frames.values()):
+        raise ValueError("Every animated layer needs one data entry per label")
+    payload = {layer_id: _payload(data) for layer_id, data in frames.items()}
+
+    player = (_PLAYER
+              .replace("__FRAMES__", json.dumps(payload, separators=(",", ":")))
+              .replace("__LABELS__", json.dumps([str(l) for l in labels], ensure_ascii=False))
+              .replace("__INTERVAL__", str(int(interval_ms)))
+              .replace("__LAST__", str(max(n - 1, 0))))
+
+    html = deck.to_html(as_string=True, notebook_display=False)
+    return html.replace("</html>", player + "</html>")
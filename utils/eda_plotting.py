@@ -2,47 +2,36 @@
 import numpy as np
 import pandas as pd
 import geopandas as gpd
-from sklearn.neighbors import BallTree
 import streamlit as st
 import plotly.express as px
 
 from utils.database_queries import (
-    get_crimes,
-    get_metro_stations,
-    get_robbery_counts_by_borough,
-    get_physical_crimes,
-    get_hourly_robberies
+    get_crime_line_distances,
+    get_metro_stations
+)
+from utils.crime_cube import (
+    FISICOS,
+    ROBO_VIOLENTO,
+    ROBOS,
+    get_crime_cube
+)
+from utils.eda_statistics import (
+    compute_near_metro_significance,
+    line_correlations
 )
 
 @st.cache_data
 def compute_line_crime_stats(radius_m=50):
-    df_crimes = get_crimes()
+    df_cr_line = get_crime_line_distances(radius_m)
     df_metro = get_metro_stations()
-    
-    gdf_crimes = gpd.GeoDataFrame(df_crimes, geometry=gpd.points_from_xy(df_crimes['longitud'], df_crimes['latitud']), crs="EPSG:4326")
+
     gdf_metro = gpd.GeoDataFrame(df_metro, geometry=gpd.points_from_xy(df_metro['lon'], df_metro['lat']), crs="EPSG:4326")
 
-    A = np.radians(df_crimes[['latitud','longitud']].values)
-    B = np.radians(df_metro[['lat','lon']].values)
-    tree = BallTree(B, metric='haversine')
-    
-    r = radius_m / 6371000.0  
-    idxs = tree.query_radius(A, r=r)
-
-    station_to_line = df_metro.reset_index().set_index('index')['linea'].to_dict()
-    rows = []
-    for crime_i, ix_list in enumerate(idxs):
-        lines_for_this_crime = {station_to_line[int(i)] for i in ix_list}
-        for L in lines_for_this_crime:
-            rows.append((crime_i, L))
-            
-    if not rows:
+    if df_cr_line.empty:
         st.warning("No crimes found within the specified radius.")
         return pd.DataFrame()
 
-    df_cr_line = pd.DataFrame(rows, columns=['crime_idx','linea'])
-    
-    line_crimes = df_cr_line.groupby('linea')['crime_idx'].nunique().reset_index(name='crimes_near_line')
+    line_crimes = df_cr_line.groupby('linea')['crime_id'].nunique().reset_index(name='crimes_near_line')
     line_st = df_metro.groupby('linea').size().reset_index(name='stations')
     
     gdf_metro_m = gdf_metro.to_crs("EPSG:32614")
@@ -129,13 +118,85 @@ def plot_near_stations():
 
         st.plotly_chart(fig2, use_container_width=True)
 
-def plot_robbery_pie_chart():
+def plot_near_metro_significance():
+    res = compute_near_metro_significance()
+    if res.empty:
+        st.info("Not enough data.")
+        return
+
+    st.markdown("##### Pruebas de significancia: cerca del metro vs. resto de la ciudad")
+
+    radius = st.radio(
+        "Radio del buffer (m):",
+        options=sorted(res['radius_m'].unique()),
+        horizontal=True,
+        key="significance_radius"
+    )
+
+    table = res[res['radius_m'] == radius].copy()
+    table['IRR (IC 95%)'] = table.apply(
+        lambda r: f"{r['irr']:.2f} ({r['irr_ci_low']:.2f}-{r['irr_ci_high']:.2f})", axis=1
+    )
+    table['IRR bootstrap (IC 95%)'] = table.apply(
+        lambda r: f"{r['boot_ci_low']:.2f}-{r['boot_ci_high']:.2f}", axis=1
+    )
+    table = table.rename(columns={
+        'linea': 'Línea',
+        'crimes_near': 'Delitos en buffer',
+        'share_area': '% del área',
+        'share_crimes': '% de delitos',
+        'binom_p': 'p binomial',
+        'perm_p': 'p permutación',
+        'boot_p': 'p bootstrap'
+    })
+    table['% del área'] *= 100
+    table['% de delitos'] *= 100
+
+    st.dataframe(
+        table[['Línea', 'Delitos en buffer', '% del área', '% de delitos',
+               'IRR (IC 95%)', 'IRR bootstrap (IC 95%)',
+               'p binomial', 'p permutación', 'p bootstrap']],
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            '% del área': st.column_config.NumberColumn(format="%.3f"),
+            '% de delitos': st.column_config.NumberColumn(format="%.2f"),
+            'p binomial': st.column_config.NumberColumn(format="%.2e"),
+            'p permutación': st.column_config.NumberColumn(format="%.2e"),
+            'p bootstrap': st.column_config.NumberColumn(format="%.2e"),
+        }
+    )
+
+    corr = line_correlations(compute_line_crime_stats(radius_m=50))
+    if not corr.empty:
+        st.markdown("##### Correlaciones por línea (buffers de 50 m)")
+        st.dataframe(
+            corr.rename(columns={
+                'x': 'Variable X', 'y': 'Variable Y',
+                'pearson_r': 'Pearson r', 'pearson_p': 'p Pearson',
+                'spearman_rho': 'Spearman ρ', 'spearman_p': 'p Spearman'
+            }),
+            hide_index=True,
+            use_container_width=True
+        )
+
+def _period_label(years=None, months=None):
+    label = f"{years[0]}-{years[1]}" if years else "{}-{}".format(*get_crime_cube().year_range)
+    if months and tuple(months) != (1, 12):
+        label += f", meses {months[0]}-{months[1]}"
+    return label
+
+def plot_robbery_pie_chart(years=None, months=None, alcaldias=None):
     try:
-        df = get_robbery_counts_by_borough()
+        totals = get_crime_cube().by_alcaldia(ROBOS, years=years, months=months)
     except NameError:
-        st.error("Error: La función 'get_robbery_counts_by_borough' no está definida.")
+        st.error("Error: La función 'get_crime_cube' no está definida.")
         return
 
+    if alcaldias:
+        totals = totals[totals.index.isin(alcaldias)]
+    df = totals[totals > 0].rename_axis('alcaldia_hecho').reset_index(name='robbery_count')
+
     if df.empty:
         st.warning("No se encontraron datos de robos.")
         return
@@ -152,7 +213,7 @@ def plot_robbery_pie_chart():
         top_5_boroughs,
         values='robbery_count',
         names='alcaldia_hecho',
-        title=f'Total de robos en las alcaldías con más incidencias<br>Top: {top_borough} ({top_value:,} robos)',
+        title=f'Total de robos en las alcaldías con más incidencias ({_period_label(years, months)})<br>Top: {top_borough} ({top_value:,} robos)',
         color_discrete_sequence=plotly_colors,
         height=600
     )
@@ -173,47 +234,27 @@ def plot_robbery_pie_chart():
     
     st.plotly_chart(fig, use_container_width=True)
 
-@st.cache_data
-def compute_heatmap_data():
-    df_physical = get_physical_crimes()
-    
-    if df_physical.empty:
-        return pd.DataFrame(), 0.0
+def compute_heatmap_data(years=None, months=None, alcaldias=None):
+    counts = get_crime_cube().dow_hour(FISICOS, years=years, months=months, alcaldias=alcaldias)
 
-    evening_hours = df_physical[df_physical['hour'].isin([19, 20, 21])]
-    
-    avg_evening_crimes = 0.0
-    if not evening_hours.empty:
-        if 'hour' in evening_hours.columns:
-            avg_evening_crimes = (
-                evening_hours.groupby('hour')
-                             .size()
-                             .mean()
-            )
-        
-    heatmap_data = (
-        df_physical.groupby(['day_of_week', 'hour'])
-                   .size()
-                   .unstack(fill_value=0)
-    )
+    if counts.sum() == 0:
+        return pd.DataFrame(), 0.0
 
-    all_hours = list(range(24))
-    for hour in all_hours:
-        if hour not in heatmap_data.columns:
-            heatmap_data[hour] = 0
-    heatmap_data = heatmap_data[all_hours]
+    evening = counts[:, [19, 20, 21]].sum(axis=0)
+    evening = evening[evening > 0]
+    avg_evening_crimes = float(evening.mean()) if len(evening) else 0.0
 
     day_order = [
         'Monday', 'Tuesday', 'Wednesday', 'Thursday',
         'Friday', 'Saturday', 'Sunday'
     ]
-    heatmap_data = heatmap_data.reindex(day_order, fill_value=0)
-    
+    heatmap_data = pd.DataFrame(counts, index=day_order, columns=list(range(24)))
+
     return heatmap_data, avg_evening_crimes
 
-def plot_crime_heatmap():
+def plot_crime_heatmap(years=None, months=None, alcaldias=None):
     try:
-        heatmap_data, avg_evening_crimes = compute_heatmap_data()
+        heatmap_data, avg_evening_crimes = compute_heatmap_data(years, months, alcaldias)
     except NameError:
         st.error("Error: Undefined 'compute_heatmap_data'.")
         return
@@ -227,7 +268,7 @@ def plot_crime_heatmap():
         value=f"{avg_evening_crimes:.2f}"
     )
 
-    st.markdown("##### Mapa de calor de crímenes con aspecto físico (2016-2024)")
+    st.markdown(f"##### Mapa de calor de crímenes con aspecto físico ({_period_label(years, months)})")
     fig = px.imshow(
         heatmap_data,
         color_continuous_scale="Reds",
@@ -253,24 +294,20 @@ def plot_crime_heatmap():
 
 import plotly.graph_objects as go
 
-def plot_hourly_robberies():
-    df = get_hourly_robberies()
+def plot_hourly_robberies(years=None, months=None, alcaldias=None):
+    counts = get_crime_cube().dow_hour(ROBO_VIOLENTO, years=years, months=months, alcaldias=alcaldias)
     WEEKDAYS_SHORT = ["Dom", "Lun", "Mar", "Mié", "Jue", "Vie", "Sáb"]
     colors = ['#9F2241', '#E7BB67', '#BD93BD', "#EC5656", '#0C7C59','#BCE784','#30C5FF']
 
     fig = go.Figure()
 
+    # Cube rows start on Monday; the chart starts on Sunday
     for wd, col in zip(range(7), colors):
-        hourly_counts = (
-            df[df['weekday'] == wd]['hour']
-            .value_counts()
-            .reindex(range(24), fill_value=0)
-            .sort_index()
-        )
+        hourly_counts = counts[(wd - 1) % 7]
 
         fig.add_trace(go.Scatter(
-            x=hourly_counts.index,
-            y=hourly_counts.values,
+            x=list(range(24)),
+            y=hourly_counts,
             mode='lines+markers',
             name=WEEKDAYS_SHORT[wd],
             line=dict(color=col, width=2),
@@ -278,7 +315,7 @@ def plot_hourly_robberies():
         ))
 
     fig.update_layout(
-        title="Robos cada hora por día de la seman",
+        title=f"Robos cada hora por día de la semana ({_period_label(years, months)})",
         xaxis_title="Hora del día (00-23)",
         yaxis_title="Número de robos",
         xaxis=dict(dtick=1),
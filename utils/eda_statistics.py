@@ -0,0 +1,185 @@
+import json
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from scipy import stats
+from shapely.geometry import Polygon
+from sklearn.neighbors import BallTree
+import streamlit as st
+
+from utils.database_queries import (
+    EARTH_RADIUS_M,
+    get_alcaldia_boundaries,
+    get_crime_coords,
+    get_metro_stations
+)
+
+METRIC_CRS = "EPSG:32614"
+ALL_LINES = "Todas"
+
+DEFAULT_RADII = (50, 100, 250)
+N_RESAMPLES = 10000
+CONFIDENCE = 0.95
+
+# ----------------------------
+# --------- Geometry ---------
+# ----------------------------
+def _city_polygon_m():
+    df_bounds = get_alcaldia_boundaries()
+
+    polygons = []
+    for coords, geom_type in zip(df_bounds['coordinates'], df_bounds['geom_type']):
+        coords = json.loads(coords) if isinstance(coords, str) else coords
+        if isinstance(coords, np.ndarray):
+            coords = coords.tolist()
+        parts = [coords] if geom_type == 'Polygon' else coords
+        for rings in parts:
+            polygons.append(Polygon(rings[0], rings[1:]))
+
+    city = gpd.GeoSeries(polygons, crs="EPSG:4326").to_crs(METRIC_CRS)
+    return city.union_all()
+
+def _near_areas_m2(df_metro, radii, city):
+    gdf_metro = gpd.GeoDataFrame(
+        {'linea': df_metro['linea'].values},
+        geometry=gpd.points_from_xy(df_metro['lon'], df_metro['lat']),
+        crs="EPSG:4326"
+    ).to_crs(METRIC_CRS)
+
+    areas = {}
+    for r in radii:
+        buffers = gdf_metro.buffer(r)
+        for linea, buf in buffers.groupby(gdf_metro['linea']):
+            areas[(r, linea)] = buf.union_all().intersection(city).area
+        areas[(r, ALL_LINES)] = buffers.union_all().intersection(city).area
+    return areas
+
+def _crime_line_distances(df_crimes, df_metro, max_radius_m):
+    # Great-circle distance from each crime to the closest station of every
+    # line, one nearest-neighbour query per line; rows beyond max_radius_m
+    # are dropped
+    X = np.radians(df_crimes[['latitud', 'longitud']].to_numpy())
+    frames = []
+    for linea, stations in df_metro.groupby('linea'):
+        tree = BallTree(np.radians(stations[['lat', 'lon']].to_numpy()), metric='haversine')
+        dist = tree.query(X, k=1)[0][:, 0] * EARTH_RADIUS_M
+        near = np.flatnonzero(dist <= max_radius_m)
+        frames.append(pd.DataFrame({'crime_id': near, 'linea': linea, 'dist_m': dist[near]}))
+    return pd.concat(frames, ignore_index=True)
+
+# ----------------------------
+# -------- Resampling --------
+# ----------------------------
+def _resample_counts(n_total, p_null, p_obs, n_resamples, seed):
+    # One binomial draw per (test, resample) pair
+    rng = np.random.default_rng(seed)
+    null_counts = rng.binomial(n_total, p_null[:, None], size=(len(p_null), n_resamples))
+    boot_counts = rng.binomial(n_total, p_obs[:, None], size=(len(p_obs), n_resamples))
+    return null_counts, boot_counts
+
+def _irr(n_near, n_total, area_near, area_city):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate_near = n_near / area_near
+        rate_rest = (n_total - n_near) / (area_city - area_near)
+        return rate_near / rate_rest
+
+# ----------------------------
+# ------ Significance --------
+# ----------------------------
+def near_metro_significance(line_dists, n_total, df_metro, city, radii=DEFAULT_RADII,
+                            n_resamples=N_RESAMPLES, seed=42):
+    """
+    Near-metro vs rest-of-city tests per line and radius.
+
+    line_dists holds one row per (crime_id, linea) with the distance to
+    that line's closest station, as returned by _crime_line_distances.
+
+    Under the null every crime lands uniformly over the city, so the count
+    inside a buffer is Binomial(N, area share). Resampling crimes with
+    replacement is Binomial(N, observed share), so both the permutation null
+    and the bootstrap reduce to vectorized binomial draws.
+    """
+    radii = tuple(sorted(radii))
+    lines = sorted(df_metro['linea'].unique())
+    dist_all = line_dists.groupby('crime_id')['dist_m'].min()
+    areas = _near_areas_m2(df_metro, radii, city)
+    area_city = city.area
+
+    rows = []
+    for r in radii:
+        near = line_dists[line_dists['dist_m'] <= r]['linea'].value_counts()
+        for linea in lines + [ALL_LINES]:
+            n_near = (dist_all <= r).sum() if linea == ALL_LINES else near.get(linea, 0)
+            rows.append({
+                'radius_m': r,
+                'linea': linea,
+                'crimes_near': int(n_near),
+                'area_near_km2': areas[(r, linea)] / 1e6,
+            })
+    res = pd.DataFrame(rows)
+
+    n_near = res['crimes_near'].to_numpy()
+    area_near = res['area_near_km2'].to_numpy() * 1e6
+    p_null = area_near / area_city
+    p_obs = n_near / n_total
+
+    res['share_area'] = p_null
+    res['share_crimes'] = p_obs
+    irr = _irr(n_near, n_total, area_near, area_city)
+    res['irr'] = irr
+
+    z = stats.norm.ppf(0.5 + CONFIDENCE / 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        se = np.sqrt(1.0 / n_near + 1.0 / (n_total - n_near))
+        res['irr_ci_low'] = np.exp(np.log(irr) - z * se)
+        res['irr_ci_high'] = np.exp(np.log(irr) + z * se)
+
+    res['binom_p'] = [
+        stats.binomtest(int(k), n_total, float(p), alternative='greater').pvalue
+        for k, p in zip(n_near, p_null)
+    ]
+
+    null_counts, boot_counts = _resample_counts(n_total, p_null, p_obs, n_resamples, seed)
+    res['perm_p'] = (1 + (null_counts >= n_near[:, None]).sum(axis=1)) / (n_resamples + 1)
+
+    boot_irr = _irr(boot_counts, n_total, area_near[:, None], area_city)
+    tail = (1 - CONFIDENCE) / 2 * 100
+    res['boot_ci_low'] = np.nanpercentile(boot_irr, tail, axis=1)
+    res['boot_ci_high'] = np.nanpercentile(boot_irr, 100 - tail, axis=1)
+    res['boot_p'] = (1 + (boot_irr <= 1.0).sum(axis=1)) / (n_resamples + 1)
+
+    return res
+
+def line_correlations(line_stats):
+    pairs = [
+        ('stations', 'crimes_near_line'),
+        ('area_km2', 'crimes_near_line'),
+        ('stations', 'crimes_per_km2'),
+    ]
+    rows = []
+    for x, y in pairs:
+        df = line_stats[[x, y]].dropna()
+        if len(df) < 3:
+            continue
+        pearson = stats.pearsonr(df[x], df[y])
+        spearman = stats.spearmanr(df[x], df[y])
+        rows.append({
+            'x': x, 'y': y,
+            'pearson_r': pearson.statistic, 'pearson_p': pearson.pvalue,
+            'spearman_rho': spearman.statistic, 'spearman_p': spearman.pvalue,
+        })
+    return pd.DataFrame(rows)
+
+@st.cache_data
+def compute_near_metro_significance(radii=DEFAULT_RADII, n_resamples=N_RESAMPLES, seed=42):
+    df_crimes = get_crime_coords()
+    df_metro = get_metro_stations()
+    if df_crimes.empty or df_metro.empty:
+        return pd.DataFrame()
+
+    line_dists = _crime_line_distances(df_crimes, df_metro, max(radii))
+    return near_metro_significance(
+        line_dists, len(df_crimes), df_metro, _city_polygon_m(),
+        radii=radii, n_resamples=n_resamples, seed=seed
+    )
@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+from functools import lru_cache
+
+import numpy as np
+import requests
+import streamlit as st
+from scipy.spatial import cKDTree
+
+from utils.database_queries import get_colonia_centroids
+from utils.hotspot_kde import LAT0, LON0, M_PER_DEG_LAT, M_PER_DEG_LON
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CACHE_PATH = os.path.join(BASE_DIR, "data", "geocode_cache.json")
+
+# Beyond this distance to the nearest colonia centroid the offline answer
+# is not trusted and the remote fallback is tried, if enabled.
+MAX_CENTROID_DIST_M = 1500
+# Off by default: Nominatim is rate-limited to one request per second
+REMOTE_FALLBACK = os.environ.get("GEOCODER_REMOTE", "0") == "1"
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/reverse"
+USER_AGENT = "CrimesFGJApp/1.0 (paolasollano@gmail.com)"
+
+_remote_slots = threading.BoundedSemaphore(1)
+_cache_lock = threading.Lock()
+
+
+def _project(lat, lon):
+    x = (np.asarray(lon, dtype=float) - LON0) * M_PER_DEG_LON
+    y = (np.asarray(lat, dtype=float) - LAT0) * M_PER_DEG_LAT
+    return np.column_stack([x, y])
+
+def _label(colonia, alcaldia):
+    return f"Col. {colonia.title()}, {alcaldia.title()}, Ciudad de México"
+
+# ----------------------------
+# ------ Offline lookup ------
+# ----------------------------
+@st.cache_resource
+def get_colonia_index():
+    df = get_colonia_centroids()
+    tree = cKDTree(_project(df['lat'], df['lon']))
+    labels = [_label(c, a) for c, a in zip(df['colonia'], df['alcaldia'])]
+    return tree, labels
+
+@lru_cache(maxsize=4096)
+def _nearest_colonia(lat, lon):
+    tree, labels = get_colonia_index()
+    dist, i = tree.query(_project([lat], [lon])[0])
+    return labels[i], float(dist)
+
+def nearest_colonia(lat, lon):
+    # ~1 m rounding so repeated clicks on the same spot hit the cache
+    return _nearest_colonia(round(float(lat), 5), round(float(lon), 5))
+
+# ----------------------------
+# ----- Remote fallback ------
+# ----------------------------
+@lru_cache(maxsize=1)
+def _load_disk_cache():
+    try:
+        with open(CACHE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_disk_cache(cache):
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    tmp = CACHE_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp, CACHE_PATH)
+
+def nominatim_reverse(lat, lon):
+    key = f"{lat:.5f},{lon:.5f}"
+    cache = _load_disk_cache()
+    if key in cache:
+        return cache[key]
+
+    params = {"lat": lat, "lon": lon, "format": "json", "addressdetails": 1, "zoom": 18}
+    with _remote_slots:
+        response = requests.get(NOMINATIM_URL, params=params,
+                                headers={"User-Agent": USER_AGENT}, timeout=10)
+    response.raise_for_status()
+    address = response.json().get("display_name")
+
+    if address:
+        with _cache_lock:
+            cache[key] = address
+            _save_disk_cache(cache)
+    return address
+
+def reverse_geocode(lat, lon, remote=REMOTE_FALLBACK):
+    label, dist = nearest_colonia(lat, lon)
+    if dist <= MAX_CENTROID_DIST_M or not remote:
+        return label
+
+    try:
+        return nominatim_reverse(round(float(lat), 5), round(float(lon), 5)) or label
+    except Exception as e:
+        print(f"Error en geocodificación inversa: {e}")
+        return label
@@ -0,0 +1,126 @@
+import json
+
+import numpy as np
+import pandas as pd
+import shapely
+import streamlit as st
+from shapely.geometry import shape
+
+from utils.database_queries import get_crime_points
+from utils.hotspot_kde import LAT0, LAT1, LON0, LON1, M_PER_DEG_LAT, M_PER_DEG_LON
+
+# Index cell: small enough that a zone's bounding box cells hold few
+# points outside the zone, large enough to keep the cell list short
+CELL_M = 250.0
+NX = int(np.ceil((LON1 - LON0) * M_PER_DEG_LON / CELL_M))
+NY = int(np.ceil((LAT1 - LAT0) * M_PER_DEG_LAT / CELL_M))
+
+DIAS = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+
+
+class CrimePoints:
+    """
+    Every crime as flat arrays sorted by CELL_M grid cell (row-major), so
+    the crimes in a bounding box are one contiguous slice per grid row.
+    """
+
+    def __init__(self, df):
+        row = np.clip(((df['latitud'].to_numpy() - LAT0) * M_PER_DEG_LAT // CELL_M).astype(np.int64), 0, NY - 1)
+        col = np.clip(((df['longitud'].to_numpy() - LON0) * M_PER_DEG_LON // CELL_M).astype(np.int64), 0, NX - 1)
+        cell = row * NX + col
+        order = np.argsort(cell, kind="stable")
+
+        self.cell_ids = cell[order]
+        self.lat = df['latitud'].to_numpy()[order]
+        self.lon = df['longitud'].to_numpy()[order]
+        codes, self.delitos = pd.factorize(df['delito'].to_numpy()[order])
+        self.delito = codes.astype(np.int32)
+        self.day = df['day'].to_numpy()[order].astype(np.int32)
+        self.hora = df['hora'].fillna(-1).to_numpy()[order].astype(np.int8)
+
+    def candidates(self, west, south, east, north):
+        r0, r1 = (np.clip(int((v - LAT0) * M_PER_DEG_LAT // CELL_M), 0, NY - 1) for v in (south, north))
+        c0, c1 = (np.clip(int((v - LON0) * M_PER_DEG_LON // CELL_M), 0, NX - 1) for v in (west, east))
+        rows = np.arange(r0, r1 + 1)
+        lo = np.searchsorted(self.cell_ids, rows * NX + c0)
+        hi = np.searchsorted(self.cell_ids, rows * NX + c1 + 1)
+        if not len(rows):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(a, b) for a, b in zip(lo, hi)])
+
+    def inside(self, polygon):
+        idx = self.candidates(*polygon.bounds)
+        return idx[shapely.contains_xy(polygon, self.lon[idx], self.lat[idx])]
+
+
+@st.cache_resource
+def get_crime_points_index():
+    return CrimePoints(get_crime_points())
+
+def parse_zone(geojson):
+    """
+    Polygon from a GeoJSON geometry, Feature or FeatureCollection
+    (as a dict or a JSON string). Multiple features are merged.
+    """
+    try:
+        obj = json.loads(geojson) if isinstance(geojson, str) else geojson
+        if obj.get("type") == "FeatureCollection":
+            geoms = [shape(f["geometry"]) for f in obj["features"]]
+        elif obj.get("type") == "Feature":
+            geoms = [shape(obj["geometry"])]
+        else:
+            geoms = [shape(obj)]
+    except Exception as e:
+        raise ValueError(f"GeoJSON inválido: {e}")
+
+    zone = shapely.union_all(geoms)
+    if zone.is_empty or zone.geom_type not in ("Polygon", "MultiPolygon"):
+        raise ValueError("El GeoJSON debe contener al menos un polígono.")
+    if not zone.is_valid:
+        zone = shapely.make_valid(zone)
+    shapely.prepare(zone)
+    return zone
+
+def zone_area_km2(zone):
+    # Local equirectangular projection, same scale as the crime grids
+    projected = shapely.transform(
+        zone, lambda xy: np.column_stack([(xy[:, 0] - LON0) * M_PER_DEG_LON, (xy[:, 1] - LAT0) * M_PER_DEG_LAT])
+    )
+    return projected.area / 1e6
+
+def geofence_stats(zone, top_n=5):
+    """
+    Same stats show_station_stats gives for a station radius, for any
+    polygon: totals, top delitos, hour and weekday distributions and the
+    daily series.
+    """
+    if not isinstance(zone, shapely.Geometry):
+        zone = parse_zone(zone)
+    points = get_crime_points_index()
+    sel = points.inside(zone)
+
+    delito_counts = np.bincount(points.delito[sel], minlength=len(points.delitos))
+    top = np.argsort(delito_counts)[::-1][:top_n]
+    top = top[delito_counts[top] > 0]
+    top_delitos = pd.DataFrame({"delito": points.delitos[top], "count": delito_counts[top]})
+
+    hora = points.hora[sel]
+    by_hour = pd.DataFrame({"hora": range(24), "count": np.bincount(hora[hora >= 0], minlength=24)})
+
+    day = points.day[sel]
+    dow = (day + 3) % 7  # 1970-01-01 was a Thursday; Monday = 0
+    by_dow = pd.DataFrame({"dow": range(7), "dia": DIAS, "count": np.bincount(dow, minlength=7)})
+
+    days, counts = np.unique(day, return_counts=True)
+    daily = pd.DataFrame({"fecha": pd.to_datetime(days, unit="D"), "count": counts})
+
+    area_km2 = zone_area_km2(zone)
+    return {
+        "total": int(len(sel)),
+        "area_km2": area_km2,
+        "density_km2": len(sel) / area_km2 if area_km2 > 0 else np.nan,
+        "top_delitos": top_delitos,
+        "by_hour": by_hour,
+        "by_dow": by_dow,
+        "daily": daily,
+    }
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.database_queries import CUBE_CATEGORIES, get_grid_counts
+from utils.hotspot_kde import LAT0, LON0, M_PER_DEG_LAT, M_PER_DEG_LON
+
+# Pyramid levels, coarse to fine
+CELL_SIZES_M = (4000, 2000, 1000, 500, 250, 125)
+
+# A cell should cover about this many screen pixels
+CELL_PX = 12
+# Hard cap on cells sent to the browser, whatever the dataset size
+MAX_CELLS = 15000
+# Viewport assumed when clipping to the view, with some margin for panning
+VIEW_PX = (1600, 1000)
+
+
+@st.cache_resource
+def get_grid_pyramid():
+    df = get_grid_counts(CELL_SIZES_M, LAT0, LON0, M_PER_DEG_LAT, M_PER_DEG_LON)
+    return df.astype({"cell_m": np.int32, "ix": np.int32, "iy": np.int32,
+                      "year": np.int16, "category": np.int8, "n": np.int32})
+
+def meters_per_pixel(zoom, lat=(LAT0 + 0.3)):
+    return 156543.03392 * np.cos(np.radians(lat)) / 2 ** zoom
+
+def level_for_zoom(zoom):
+    target = CELL_PX * meters_per_pixel(zoom)
+    return min(CELL_SIZES_M, key=lambda c: abs(np.log(c / target)))
+
+def view_cell_ranges(cell_m, lat, lon, zoom):
+    half_w, half_h = (px / 2 * meters_per_pixel(zoom, lat) for px in VIEW_PX)
+    x = (lon - LON0) * M_PER_DEG_LON
+    y = (lat - LAT0) * M_PER_DEG_LAT
+    return (int((x - half_w) // cell_m), int((x + half_w) // cell_m),
+            int((y - half_h) // cell_m), int((y + half_h) // cell_m))
+
+def grid_cells(zoom, lat=None, lon=None, years=None, categories=None, max_cells=MAX_CELLS):
+    """
+    Crime counts per grid cell for a map at `zoom`, clipped to the view
+    around (lat, lon) when given. Starts at the level matching the zoom
+    and steps to coarser levels until the result fits max_cells; the
+    coarsest level is truncated to its densest cells. Positions are the
+    south-west corner of each cell.
+    """
+    pyramid = get_grid_pyramid()
+    mask = np.ones(len(pyramid), dtype=bool)
+    if years is not None:
+        mask &= pyramid["year"].between(years[0], years[1]).to_numpy()
+    if categories is not None:
+        mask &= pyramid["category"].isin([CUBE_CATEGORIES.index(c) for c in categories]).to_numpy()
+    pyramid = pyramid[mask]
+
+    levels = [c for c in CELL_SIZES_M if c >= level_for_zoom(zoom)][::-1]
+    for cell_m in levels:
+        level = pyramid[pyramid["cell_m"] == cell_m]
+        if lat is not None:
+            x0, x1, y0, y1 = view_cell_ranges(cell_m, lat, lon, zoom)
+            level = level[level["ix"].between(x0, x1) & level["iy"].between(y0, y1)]
+        cells = level.groupby(["ix", "iy"], as_index=False)["n"].sum()
+        if len(cells) <= max_cells:
+            break
+    cells = cells.nlargest(max_cells, "n")
+
+    cells["lon"] = LON0 + cells["ix"] * cell_m / M_PER_DEG_LON
+    cells["lat"] = LAT0 + cells["iy"] * cell_m / M_PER_DEG_LAT
+    cells["cell_m"] = cell_m
+    return cells[["lon", "lat", "n", "cell_m"]].reset_index(drop=True)
+
+def grid_frames_by_year(cell_m, categories=None):
+    """
+    Counts for one pyramid level as a (years x cells) matrix over the
+    union of cells seen in any year, for the timeline map.
+    """
+    pyramid = get_grid_pyramid()
+    level = pyramid[pyramid["cell_m"] == cell_m]
+    if categories is not None:
+        level = level[level["category"].isin([CUBE_CATEGORIES.index(c) for c in categories])]
+
+    counts = level.pivot_table(index="year", columns=["ix", "iy"], values="n",
+                               aggfunc="sum", fill_value=0)
+    ix = counts.columns.get_level_values("ix").to_numpy()
+    iy = counts.columns.get_level_values("iy").to_numpy()
+    cells = pd.DataFrame({
+        "lon": LON0 + ix * cell_m / M_PER_DEG_LON,
+        "lat": LAT0 + iy * cell_m / M_PER_DEG_LAT,
+    })
+    return cells, counts.index.to_numpy(), counts.to_numpy()
+
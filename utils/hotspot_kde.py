@@ -0,0 +1,103 @@
+import numpy as np
+from scipy.signal import fftconvolve
+import streamlit as st
+
+from utils.database_queries import get_crime_coords
+
+# Fixed grid over the bounding box kept by db_loading.clean_data
+LAT0, LAT1 = 19.0, 19.6
+LON0, LON1 = -99.4, -98.9
+M_PER_DEG_LAT = 111_320.0
+M_PER_DEG_LON = M_PER_DEG_LAT * np.cos(np.radians((LAT0 + LAT1) / 2))
+
+CELL_M = 10.0
+BANDWIDTH_M = 40.0
+
+NX = int(np.ceil((LON1 - LON0) * M_PER_DEG_LON / CELL_M))
+NY = int(np.ceil((LAT1 - LAT0) * M_PER_DEG_LAT / CELL_M))
+
+
+def _to_cells(lat, lon):
+    row = np.floor((np.asarray(lat) - LAT0) * M_PER_DEG_LAT / CELL_M).astype(np.int64)
+    col = np.floor((np.asarray(lon) - LON0) * M_PER_DEG_LON / CELL_M).astype(np.int64)
+    return row, col
+
+def _cell_center(row, col):
+    lat = LAT0 + (row + 0.5) * CELL_M / M_PER_DEG_LAT
+    lon = LON0 + (col + 0.5) * CELL_M / M_PER_DEG_LON
+    return float(lat), float(lon)
+
+def _gaussian_kernel(bandwidth_m):
+    sigma = bandwidth_m / CELL_M
+    half = int(np.ceil(3 * sigma))
+    ax = np.arange(-half, half + 1)
+    k = np.exp(-(ax[:, None] ** 2 + ax[None, :] ** 2) / (2 * sigma ** 2))
+    return k / k.sum()
+
+
+class BinnedCrimes:
+    """
+    Crimes binned on the fixed CELL_M grid, stored sparse as sorted
+    row-major cell ids with counts. A window of rows is a contiguous
+    id range, so any station window is found with two binary searches.
+    """
+
+    def __init__(self, lat, lon):
+        row, col = _to_cells(lat, lon)
+        keep = (row >= 0) & (row < NY) & (col >= 0) & (col < NX)
+        self.cell_ids, self.counts = np.unique(row[keep] * NX + col[keep], return_counts=True)
+
+    def window(self, r0, r1, c0, c1):
+        lo, hi = np.searchsorted(self.cell_ids, [r0 * NX + c0, r1 * NX + c1 + 1])
+        ids, counts = self.cell_ids[lo:hi], self.counts[lo:hi]
+        rows, cols = np.divmod(ids, NX)
+        keep = (cols >= c0) & (cols <= c1)
+
+        hist = np.zeros((r1 - r0 + 1, c1 - c0 + 1), dtype=np.float32)
+        hist[rows[keep] - r0, cols[keep] - c0] = counts[keep]
+        return hist
+
+
+@st.cache_resource
+def get_binned_crimes(delito_like=None, year=None):
+    df = get_crime_coords(delito_like=delito_like, year=year)
+    return BinnedCrimes(df['latitud'].to_numpy(), df['longitud'].to_numpy())
+
+def station_hotspot(lat, lon, radius_m=100, bandwidth_m=BANDWIDTH_M, delito_like=None, year=None):
+    """
+    KDE surface around a point and its peak inside the radius.
+
+    Density is in crimes per km². The raster covers the radius plus the
+    kernel support; rows run south to north and `bounds` is
+    [west, south, east, north].
+    """
+    binned = get_binned_crimes(delito_like, year)
+    kernel = _gaussian_kernel(bandwidth_m)
+    pad = kernel.shape[0] // 2
+
+    r_c, c_c = _to_cells(lat, lon)
+    half = int(np.ceil(radius_m / CELL_M))
+    r0, r1 = r_c - half - pad, r_c + half + pad
+    c0, c1 = c_c - half - pad, c_c + half + pad
+
+    hist = binned.window(r0, r1, c0, c1)
+    surface = fftconvolve(hist, kernel, mode='same').clip(min=0)
+    surface = surface[pad:-pad, pad:-pad] * (1e6 / CELL_M ** 2)
+
+    ax = (np.arange(-half, half + 1)) * CELL_M
+    inside = ax[:, None] ** 2 + ax[None, :] ** 2 <= radius_m ** 2
+    masked = np.where(inside, surface, -1.0)
+    pr, pc = np.unravel_index(np.argmax(masked), masked.shape)
+    peak_lat, peak_lon = _cell_center(r_c - half + pr, c_c - half + pc)
+
+    south, west = _cell_center(r_c - half, c_c - half)
+    north, east = _cell_center(r_c + half, c_c + half)
+    h = CELL_M / 2
+    return {
+        "latitud": peak_lat,
+        "longitud": peak_lon,
+        "density": float(surface[pr, pc]),
+        "raster": np.where(inside, surface, 0.0).astype(np.float32),
+        "bounds": [float(west - h / M_PER_DEG_LON), float(south - h / M_PER_DEG_LAT),
+                   float(east + h / M_PER_DEG_LON), float(north + h / M_PER_DEG_LAT)],
+    }
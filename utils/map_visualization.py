@@ -1,61 +1,248 @@
+import base64
+import io
 import json
+import logging
+import os
+import re
+import time
 import pydeck as pdk
-import requests
 import streamlit as st
 import numpy as np
 import pandas as pd
+import shapely
+from PIL import Image
 
 from utils.database_queries import(
+    CUBE_CATEGORIES,
     get_affluence_density, get_alcaldia_boundaries,
     get_average_time_station,
     get_crime_counts_per_station,
-    get_hotspot_coords_station,
     get_most_common_robo_station, get_top_3_delitos_station,
     get_top_affluence_stations,
     get_top_crime_stations,
     get_top_robo_stations,
     get_total_crimes_station,
-    get_total_robos_station
+    get_total_robos_station,
+    get_station_coords,
+    get_station_counts_by_year
 )
+from utils.deck_animation import ColumnarFrames, animated_deck_html
+from utils.geocoding import reverse_geocode
+from utils.geofence import geofence_stats, parse_zone
+from utils.grid_aggregation import grid_cells, grid_frames_by_year, level_for_zoom
+from utils.hotspot_kde import station_hotspot
+from utils.metro_segments import segment_risk
+from utils.vector_tiles import MAX_ZOOM, MIN_ZOOM, TILE_URL
+
+logger = logging.getLogger(__name__)
+
+CITY_VIEW = {"latitude": 19.3176, "longitude": -99.1332, "zoom": 9.7}
+STATION_ZOOM = 13
+
+# Serialized size above which a deck build logs a warning
+PAYLOAD_BUDGET_KB = float(os.environ.get("MAP_PAYLOAD_BUDGET_KB", 1024))
+# 5 decimals is ~1 m, finer than anything drawn on these maps
+COORD_DECIMALS = 5
+COORD_FIELDS = {"lat", "lon", "latitud", "longitud"}
+# ~2 m: borough outlines lose no visible detail at city zoom
+BOUNDARY_SIMPLIFY_DEG = 2e-5
+
+# ----------------------------
+# ---- Payload profiling -----
+# ----------------------------
+_payload_reports = {}
+
+def _layer_fields(layer, tooltip=None):
+    # Columns referenced by the layer's accessors (pydeck sets them as
+    # attributes, e.g. get_position = "@@=[lon, lat]"), plus tooltip fields
+    # when the layer can be picked
+    exprs = [v for k, v in vars(layer).items() if k.startswith("get_")]
+    if isinstance(tooltip, dict) and getattr(layer, "pickable", False):
+        exprs += re.findall(r"{(\w+)}", tooltip.get("html", "") + tooltip.get("text", ""))
+    return set(re.findall(r"[A-Za-z_]\w*", json.dumps(exprs, default=str)))
+
+def slim_records(records, fields, decimals=COORD_DECIMALS):
+    return [
+        {k: round(v, decimals) if k in COORD_FIELDS and isinstance(v, float) else v
+         for k, v in r.items() if k in fields}
+        for r in records
+    ]
+
+def slim_layer(layer, tooltip=None):
+    data = layer.data
+    if isinstance(data, list) and data and isinstance(data[0], dict):
+        layer.data = slim_records(data, _layer_fields(layer, tooltip))
+    return layer
+
+def profile_deck(deck):
+    rows = []
+    for layer in deck.layers:
+        t0 = time.perf_counter()
+        size = len(layer.to_json().encode())
+        rows.append({
+            "layer": layer.id,
+            "type": layer.type,
+            "rows": len(layer.data) if isinstance(layer.data, list) else 1,
+            "kb": round(size / 1024, 1),
+            "serialize_ms": round((time.perf_counter() - t0) * 1000, 1),
+        })
+    return pd.DataFrame(rows, columns=["layer", "type", "rows", "kb", "serialize_ms"])
+
+def finalize_deck(deck, name, tooltip=None, budget_kb=PAYLOAD_BUDGET_KB):
+    """
+    Drops unused columns and quantizes coordinates in every layer, keeping
+    the fields `tooltip` (the one given to the deck) shows, then records
+    the per-layer payload under `name` and warns over budget.
+    """
+    for layer in deck.layers:
+        slim_layer(layer, tooltip)
+
+    report = profile_deck(deck)
+    _payload_reports[name] = report
+    total_kb = report["kb"].sum()
+    if total_kb > budget_kb:
+        heaviest = report.nlargest(3, "kb")
+        detail = ", ".join(f"{t} {kb:.0f} KB" for t, kb in zip(heaviest["type"], heaviest["kb"]))
+        logger.warning("El mapa '%s' pesa %.0f KB (presupuesto %.0f KB). Capas más pesadas: %s",
+                       name, total_kb, budget_kb, detail)
+    return deck
+
+def get_payload_report(name):
+    return _payload_reports.get(name)
+
+def kde_bitmap_layer(hotspot):
+    raster = hotspot["raster"]
+    peak = raster.max()
+    norm = raster / peak if peak > 0 else raster
+
+    # Yellow to red ramp, transparent where there is no density
+    rgba = np.zeros(raster.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = 255
+    rgba[..., 1] = (220 * (1 - norm)).astype(np.uint8)
+    rgba[..., 3] = (200 * np.sqrt(norm)).astype(np.uint8)
+
+    buf = io.BytesIO()
+    Image.fromarray(rgba[::-1], mode="RGBA").save(buf, format="PNG")
+    image = "data:image/png;base64," + base64.b64encode(buf.getvalue()).decode()
+
+    # pydeck reads unquoted strings it does not recognize as image URLs as
+    # JS expressions; quoting keeps the data URL a plain string
+    return pdk.Layer(
+        "BitmapLayer",
+        image=f"'{image}'",
+        bounds=hotspot["bounds"],
+        opacity=0.8,
+        pickable=False
+    )
 
-# Plot crimes Pydeck map
-@st.cache_data
-def plot_crime_map(highlight_station=None, show_affluence=False):
-    df_stations = get_crime_counts_per_station()
-    df_bounds = get_alcaldia_boundaries()
-    df_affluence = get_affluence_density()
-
-    # Borough Limits
-    geojson_features = []
-    for _, row in df_bounds.iterrows():
+# Borough limits
+def build_borough_geojson(df_bounds):
+    features = []
+    for nombre, geom_type, coords in zip(df_bounds['nombre'], df_bounds['geom_type'], df_bounds['coordinates']):
         try:
-            coords = json.loads(row['coordinates']) if isinstance(row['coordinates'], str) else row['coordinates']
+            coords = json.loads(coords) if isinstance(coords, str) else coords
             if isinstance(coords, np.ndarray):
                 coords = coords.tolist()
 
-            if row['geom_type'] == 'Polygon':
+            if geom_type == 'Polygon':
                 rings = coords
-            elif row['geom_type'] == 'MultiPolygon':
+            elif geom_type == 'MultiPolygon':
                 rings = [ring for poly in coords for ring in poly]
             else:
                 continue
 
             for ring in rings:
-                geojson_features.append({
+                ring = shapely.get_coordinates(
+                    shapely.simplify(shapely.linearrings(np.asarray(ring, dtype=float)), BOUNDARY_SIMPLIFY_DEG)
+                )
+                features.append({
                     "type": "Feature",
                     "geometry": {
                         "type": "Polygon",
-                        "coordinates": [[(lon, lat) for lon, lat in ring]]
+                        "coordinates": [np.round(ring, COORD_DECIMALS).tolist()]
                     },
-                    "properties": {"nombre": row["nombre"]}
+                    "properties": {"nombre": nombre}
                 })
         except Exception as e:
             print(f"Error parsing polygon: {e}")
 
-    geojson_data = {
-        "type": "FeatureCollection",
-        "features": geojson_features
-    }
+    return {"type": "FeatureCollection", "features": features}
+
+@st.cache_resource
+def get_borough_geojson_payload():
+    # Serialized once per process as a data URL: decks embed a single
+    # string instead of re-encoding every ring on each render.
+    geojson = build_borough_geojson(get_alcaldia_boundaries())
+    encoded = base64.b64encode(json.dumps(geojson, separators=(",", ":")).encode()).decode()
+    return "data:application/json;base64," + encoded
+
+def crime_grid_layer(cells):
+    peak = max(float(cells["n"].quantile(0.99)), 1.0) if len(cells) else 1.0
+    norm = (cells["n"] / peak).clip(upper=1.0).to_numpy()
+
+    cells = cells.assign(
+        lon=cells["lon"].round(5),
+        lat=cells["lat"].round(5),
+        fill=[[255, int(200 * (1 - v)), 60, int(40 + 180 * v)] for v in norm]
+    )
+    return pdk.Layer(
+        "GridCellLayer",
+        data=cells[["lon", "lat", "n", "fill"]],
+        get_position=["lon", "lat"],
+        cell_size=int(cells["cell_m"].iloc[0]) if len(cells) else 1000,
+        get_fill_color="fill",
+        extruded=False,
+        pickable=False
+    )
+
+def crime_tiles_layer(tile_url=TILE_URL):
+    # Individual crimes streamed as vector tiles by `python -m utils.vector_tiles serve`;
+    # the browser only fetches the tiles in view.
+    return pdk.Layer(
+        "MVTLayer",
+        data=tile_url,
+        min_zoom=MIN_ZOOM,
+        max_zoom=MAX_ZOOM,
+        point_type="'circle'",
+        get_point_radius=4,
+        point_radius_units="'pixels'",
+        get_fill_color=[255, 140, 0, 160],
+        stroked=False,
+        pickable=False
+    )
+
+def segment_risk_layer(segments):
+    # Field names match the station tooltip so both layers share it
+    v = (segments["risk_index"] / 3.0).clip(upper=1.0).to_numpy()
+    data = pd.DataFrame({
+        "path": [[[a, b], [c, d]] for a, b, c, d in zip(
+            segments["lon0"].round(COORD_DECIMALS), segments["lat0"].round(COORD_DECIMALS),
+            segments["lon1"].round(COORD_DECIMALS), segments["lat1"].round(COORD_DECIMALS))],
+        "nombre": segments["from_nombre"] + " – " + segments["to_nombre"],
+        "linea": segments["linea"],
+        "crime_count": segments["n"],
+        "color": [[255, int(220 * (1 - x)), 0, 200] for x in v],
+    })
+    return pdk.Layer(
+        "PathLayer",
+        data=data,
+        get_path="path",
+        get_color="color",
+        get_width=6,
+        width_units="'pixels'",
+        cap_rounded=True,
+        pickable=True,
+        auto_highlight=True
+    )
+
+# Plot crimes Pydeck map
+@st.cache_data
+def plot_crime_map(highlight_station=None, show_affluence=False,
+                   show_grid=False, grid_years=None, grid_categories=None,
+                   show_tiles=False, show_segments=False, segment_hours=None,
+                   segment_categories=None, radius_m=100):
+    df_stations = get_crime_counts_per_station(radius_m)
+    df_affluence = get_affluence_density()
 
     # Crimes
     crime_layer = pdk.Layer(
@@ -97,7 +284,11 @@ def plot_crime_map(highlight_station=None, show_affluence=False):
     }
 
     highlight_layer = None
+    hotspot_layer = None
     if highlight_station is not None:
+        hotspot_layer = kde_bitmap_layer(
+            station_hotspot(highlight_station["lat"], highlight_station["lon"], radius_m)
+        )
         highlight_layer = pdk.Layer(
             "ScatterplotLayer",
             data=[highlight_station.to_dict()],
@@ -113,55 +304,137 @@ def plot_crime_map(highlight_station=None, show_affluence=False):
     # Alcaldía boundary layer
     boundary_layer = pdk.Layer(
         "GeoJsonLayer",
-        data=geojson_data,
+        data=get_borough_geojson_payload(),
         stroked=True,
         get_line_color=[80, 80, 80],
         line_width_min_pixels=3
     )
 
-    view_state = pdk.ViewState(
-        latitude=19.3176,
-        longitude=-99.1332,
-        zoom=9.7,
-        pitch=0
-    )
+    view = dict(CITY_VIEW)
+    if highlight_station is not None:
+        view = {"latitude": highlight_station["lat"], "longitude": highlight_station["lon"], "zoom": STATION_ZOOM}
+    view_state = pdk.ViewState(pitch=0, **view)
 
     layers = [boundary_layer, crime_layer]
     if highlight_layer:
         layers.append(highlight_layer)
+        layers.append(hotspot_layer)
     if show_affluence:
         layers = [boundary_layer, affluence_layer, crime_layer]
-
-    return pdk.Deck(
+    if show_grid:
+        cells = grid_cells(view["zoom"], view["latitude"], view["longitude"],
+                           years=grid_years, categories=grid_categories)
+        layers.insert(1, crime_grid_layer(cells))
+    if show_tiles:
+        layers.insert(1, crime_tiles_layer())
+    if show_segments:
+        segments = segment_risk(segment_hours, segment_categories)
+        if not segments.empty:
+            layers.insert(layers.index(crime_layer), segment_risk_layer(segments))
+
+    deck = pdk.Deck(
         layers=layers,
         initial_view_state=view_state,
         map_style=pdk.map_styles.DARK,
         tooltip=tooltip
     )
+    return finalize_deck(deck, "crime_map", tooltip)
 
-# Stats
-def reverse_geocode(lat, lon):
-    url = "https://nominatim.openstreetmap.org/reverse"
-    params = {
-        "lat": lat,
-        "lon": lon,
-        "format": "json",
-        "addressdetails": 1,
-        "zoom": 18
-    }
-    headers = {
-        "User-Agent": "CrimesFGJApp/1.0 (paolasollano@gmail.com)"  # ✅ Use your real email or domain
+# Timeline
+@st.cache_data
+def plot_crime_timeline(radius_m=100, categories=None):
+    # Every year is aggregated once and shipped as columns; the slider in
+    # the page scrubs through them without a server round trip.
+    cell_m = level_for_zoom(CITY_VIEW["zoom"])
+    cells, years, counts = grid_frames_by_year(cell_m, categories)
+    peak = max(float(np.quantile(counts[counts > 0], 0.99)), 1.0) if (counts > 0).any() else 1.0
+    # At least 0.01 so cells with crimes are never dropped as empty
+    v = np.where(counts > 0, np.clip(np.round(counts / peak, 2), 0.01, 1.0), 0.0)
+    grid = ColumnarFrames(
+        columns={"lon": cells["lon"].round(COORD_DECIMALS), "lat": cells["lat"].round(COORD_DECIMALS)},
+        frames={"v": v},
+        skip_zero="v"
+    )
+
+    df = get_station_counts_by_year(radius_m)
+    if categories is not None:
+        df = df[df["category"].isin([CUBE_CATEGORIES.index(c) for c in categories])]
+    per_year = (df.pivot_table(index=["num", "nombre", "linea", "lat", "lon"], columns="year",
+                               values="crime_count", aggfunc="sum", fill_value=0)
+                  .reindex(columns=years, fill_value=0))
+    stations_info = per_year.index.to_frame(index=False)
+    stations = ColumnarFrames(
+        columns={
+            "nombre": stations_info["nombre"],
+            "linea": stations_info["linea"],
+            "lon": stations_info["lon"].round(COORD_DECIMALS),
+            "lat": stations_info["lat"].round(COORD_DECIMALS),
+        },
+        frames={"crime_count": per_year.to_numpy().T},
+        skip_zero="crime_count"
+    )
+    radius_per_crime = 900.0 / max(int(per_year.to_numpy().max()), 1)
+
+    boundary_layer = pdk.Layer(
+        "GeoJsonLayer",
+        data=get_borough_geojson_payload(),
+        stroked=True,
+        get_line_color=[80, 80, 80],
+        line_width_min_pixels=3
+    )
+
+    grid_layer = pdk.Layer(
+        "GridCellLayer",
+        id="grid_timeline",
+        data=grid.frame(0),
+        get_position=["lon", "lat"],
+        cell_size=int(cell_m),
+        get_fill_color="[255, 200 * (1 - v), 60, 40 + 180 * v]",
+        extruded=False,
+        pickable=False
+    )
+
+    station_layer = pdk.Layer(
+        "ScatterplotLayer",
+        id="stations_timeline",
+        data=stations.frame(0),
+        get_position=["lon", "lat"],
+        stroked=True,
+        filled=True,
+        get_fill_color=[255, 255, 100, 160],
+        get_line_color=[0, 0, 0, 105],
+        line_width_min_pixels=1,
+        get_radius=f"crime_count * {radius_per_crime:.4f}",
+        radius_min_pixels=3,
+        pickable=True,
+        auto_highlight=True,
+        transitions={"getRadius": 600}
+    )
+
+    tooltip = {
+        "html": """
+            <b>Estación:</b> {nombre} <br/>
+            <b>Línea:</b> {linea} <br/>
+            <b>Crímenes en el año:</b> {crime_count} <br/>
+        """,
+        "style": {
+            "backgroundColor": "black",
+            "color": "white",
+            "fontSize": "12px",
+        }
     }
 
-    try:
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        return data.get("display_name", "Dirección no disponible")
-    except Exception as e:
-        print(f"Error en geocodificación inversa: {e}")
-        return "Error al obtener dirección"
+    deck = pdk.Deck(
+        layers=[boundary_layer, grid_layer, station_layer],
+        initial_view_state=pdk.ViewState(pitch=0, **CITY_VIEW),
+        map_style=pdk.map_styles.DARK,
+        tooltip=tooltip
+    )
+    finalize_deck(deck, "timeline_map", tooltip)
+    labels = [f"Año {int(y)}" for y in years]
+    return animated_deck_html(deck, {"grid_timeline": grid, "stations_timeline": stations}, labels)
 
+# Stats
 @st.cache_data
 def show_station_stats(nombre, linea, radius_m=100):
     if not nombre:
@@ -175,7 +448,8 @@ def show_station_stats(nombre, linea, radius_m=100):
     most_common_robo = get_most_common_robo_station(nombre, radius_m)
     top_3_crimes = get_top_3_delitos_station(nombre, radius_m)
     avg_hour, avg_minute = get_average_time_station(nombre, radius_m)
-    hotspot = get_hotspot_coords_station(nombre, radius_m)
+    coords = get_station_coords(nombre)
+    hotspot = station_hotspot(coords["lat"], coords["lon"], radius_m)
     address = reverse_geocode(hotspot["latitud"], hotspot["longitud"])
 
     col1, col2 = st.columns(2)
@@ -185,7 +459,7 @@ def show_station_stats(nombre, linea, radius_m=100):
         st.markdown(f"**Tipo de robo más común:** {most_common_robo}")
     with col2:
         st.markdown(f"**Hora promedio del crimen:** {int(avg_hour):02d}:{int(avg_minute):02d}")
-        st.markdown(f"**Coordenada más frecuente:** {address}")
+        st.markdown(f"**Punto de mayor densidad:** {address}")
     
     st.markdown("#### Top 3 delitos más comunes:")
     col3, col4, col5 = st.columns(3)
@@ -197,6 +471,40 @@ def show_station_stats(nombre, linea, radius_m=100):
     with col5:
         st.metric(label=top_3_crimes.iloc[2]['delito'], value=top_3_crimes.iloc[2]['count'])
 
+def show_zone_stats(geojson_text):
+    try:
+        zone = parse_zone(geojson_text)
+    except ValueError as e:
+        st.error(str(e))
+        return
+
+    stats = geofence_stats(zone)
+    st.markdown("### Estadísticas de la zona")
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Total de crímenes", stats["total"])
+    col2.metric("Área", f"{stats['area_km2']:.2f} km²")
+    col3.metric("Crímenes por km²", f"{stats['density_km2']:.0f}")
+    if stats["total"] == 0:
+        st.info("No hay crímenes registrados dentro de la zona.")
+        return
+
+    st.markdown("#### Delitos más comunes:")
+    st.dataframe(stats["top_delitos"].rename(columns={"delito": "Delito", "count": "Total"}),
+                 hide_index=True, width='stretch')
+
+    col4, col5 = st.columns(2)
+    with col4:
+        st.markdown("##### Por hora del día")
+        st.bar_chart(stats["by_hour"].set_index("hora")["count"], color="#9F2241")
+    with col5:
+        st.markdown("##### Por día de la semana")
+        st.bar_chart(stats["by_dow"].set_index("dia")["count"].reindex(stats["by_dow"]["dia"]),
+                     color="#E7BB67")
+
+    st.markdown("##### Serie diaria")
+    st.line_chart(stats["daily"].set_index("fecha")["count"], color="#9F2241")
+
 # Data table
 @st.cache_data
 def view_tables():
@@ -240,33 +548,7 @@ def get_thermometer_color(probability):
         return [148, 0, 211, 220]
 
 
-def plot_prediction_animated_map(station_lat, station_lon, station_name, prediction_row, radius_m):
-    try:
-        df_bounds = get_alcaldia_boundaries() 
-    except NameError:
-        df_bounds = pd.DataFrame()
-
-    geojson_features = []
-    if not df_bounds.empty:
-        for _, row in df_bounds.iterrows():
-            try:
-                coords = json.loads(row['coordinates']) if isinstance(row['coordinates'], str) else row['coordinates']
-                if isinstance(coords, np.ndarray):
-                    coords = coords.tolist()
-                
-                rings = coords if row['geom_type'] == 'Polygon' else [ring for poly in coords for ring in poly]
-                for ring in rings:
-                    geojson_features.append({
-                        "type": "Feature",
-                        "geometry": {"type": "Polygon", "coordinates": [[(lon, lat) for lon, lat in ring]]},
-                    })
-            except Exception:
-                continue
-
-    geojson_data = {"type": "FeatureCollection", "features": geojson_features}
-
-    prob = float(prediction_row['Prob. de evento (%)'])
-
+def _prediction_frame(station_lat, station_lon, station_name, prob):
     MAX_HEIGHT_M = 3500
     VISUAL_CEILING = 60
     
@@ -276,18 +558,32 @@ def plot_prediction_animated_map(station_lat, station_lon, station_name, predict
     liquid_height = min(liquid_height, MAX_HEIGHT_M)
     liquid_height = max(200, liquid_height)
 
-    data_point = pd.DataFrame({
+    return pd.DataFrame({
         'lat': [float(station_lat)],
         'lon': [float(station_lon)],
         'name': [str(station_name)],
-        'prob': [prob],
+        'prob': [round(prob, 1)],
         'liquid_height': [float(liquid_height)],
-        'glass_height': [float(MAX_HEIGHT_M)]
+        'glass_height': [float(MAX_HEIGHT_M)],
+        'color': [get_thermometer_color(prob)]
     })
+
+def plot_prediction_animated_map(station_lat, station_lon, station_name, pred_df, radius_m):
+    # One deck for every forecast week; the browser steps through the
+    # weeks, so animating costs no server time.
+    frames = [
+        _prediction_frame(station_lat, station_lon, station_name, float(prob))
+        for prob in pred_df['Prob. de evento (%)']
+    ]
+    labels = [
+        f"Semana al {week} | Riesgo: {float(prob):.1f}%"
+        for week, prob in zip(pred_df['Semana termina el'], pred_df['Prob. de evento (%)'])
+    ]
+    data_point = frames[0]
     
     boundary_layer = pdk.Layer(
         "GeoJsonLayer",
-        data=geojson_data,
+        data=get_borough_geojson_payload(),
         stroked=True,
         filled=False,
         get_line_color=[80, 80, 80],
@@ -322,15 +618,17 @@ def plot_prediction_animated_map(station_lat, station_lon, station_name, predict
 
     liquid_layer = pdk.Layer(
         "ColumnLayer",
+        id="liquid",
         data=data_point,
         get_position=["lon", "lat"],
         get_elevation="liquid_height",
         elevation_scale=1,
         radius=120,
-        get_fill_color=get_thermometer_color(prob),
+        get_fill_color="color",
         pickable=True,
         auto_highlight=True,
         extruded=True, 
+        transitions={"getElevation": 600, "getFillColor": 600},
         material={
             "ambient": 0.8, 
             "diffuse": 0.9,
@@ -352,9 +650,74 @@ def plot_prediction_animated_map(station_lat, station_lon, station_name, predict
         "style": {"backgroundColor": "black", "color": "white"}
     }
 
-    return pdk.Deck(
+    deck = pdk.Deck(
         layers=[boundary_layer, context_layer, liquid_layer, glass_layer],
         initial_view_state=view_state,
         map_style=pdk.map_styles.DARK,
         tooltip=tooltip
-    )
\ No newline at end of file
+    )
+    finalize_deck(deck, "prediction_map", tooltip)
+    frames = [slim_records(f.to_dict("records"), _layer_fields(liquid_layer, tooltip)) for f in frames]
+    return animated_deck_html(deck, {"liquid": frames}, labels)
+
+def plot_citywide_risk_map(forecasts):
+    # Every station at once, one frame per forecast week
+    MAX_HEIGHT_M = 3500
+    VISUAL_CEILING = 60
+
+    weeks = sorted(forecasts["ds"].unique())
+    frames = []
+    for week in weeks:
+        wk = forecasts[forecasts["ds"] == week]
+        prob = wk["prob_semana"].astype(float)
+        frames.append(pd.DataFrame({
+            "lat": wk["lat"].round(5).to_numpy(),
+            "lon": wk["lon"].round(5).to_numpy(),
+            "nombre": wk["nombre"].to_numpy(),
+            "prob": prob.round(1).to_numpy(),
+            "height": (prob / VISUAL_CEILING * MAX_HEIGHT_M).clip(200, MAX_HEIGHT_M).to_numpy(),
+            "color": [get_thermometer_color(p) for p in prob],
+        }))
+    labels = [f"Semana al {pd.Timestamp(w):%Y-%m-%d}" for w in weeks]
+
+    boundary_layer = pdk.Layer(
+        "GeoJsonLayer",
+        data=get_borough_geojson_payload(),
+        stroked=True,
+        filled=False,
+        get_line_color=[80, 80, 80],
+        line_width_min_pixels=2
+    )
+
+    risk_layer = pdk.Layer(
+        "ColumnLayer",
+        id="risk",
+        data=frames[0],
+        get_position=["lon", "lat"],
+        get_elevation="height",
+        elevation_scale=1,
+        radius=250,
+        get_fill_color="color",
+        pickable=True,
+        auto_highlight=True,
+        extruded=True,
+        transitions={"getElevation": 600, "getFillColor": 600}
+    )
+
+    view_state = pdk.ViewState(pitch=45, bearing=15, **CITY_VIEW)
+
+    tooltip = {
+        "html": "<b>Estación:</b> {nombre}<br/><b>Riesgo:</b> {prob}%",
+        "style": {"backgroundColor": "black", "color": "white"}
+    }
+
+    deck = pdk.Deck(
+        layers=[boundary_layer, risk_layer],
+        initial_view_state=view_state,
+        map_style=pdk.map_styles.DARK,
+        tooltip=tooltip
+    )
+    finalize_deck(deck, "citywide_risk_map", tooltip)
+    frames = [slim_records(f.to_dict("records"), _layer_fields(risk_layer, tooltip)) for f in frames]
+    return animated_deck_html(deck, {"risk": frames}, labels)
+
@@ -0,0 +1,142 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from utils.database_queries import (
+    CUBE_CATEGORIES, get_connection, get_crime_hour_categories,
+    get_segment_crime_totals, run_query
+)
+from utils.hotspot_kde import LAT0, LON0, M_PER_DEG_LAT, M_PER_DEG_LON
+
+CORRIDOR_M = 150.0
+# Consecutive stations further apart than this are not a real segment
+# (gaps or ordering breaks in lines_metro)
+MAX_SEGMENT_M = 5000.0
+CHUNK = 500_000
+
+SEGMENTS_TABLE = "metro_segments"
+COUNTS_TABLE = "segment_crime_counts"
+
+
+def _project(lat, lon):
+    return ((np.asarray(lon, dtype=float) - LON0) * M_PER_DEG_LON,
+            (np.asarray(lat, dtype=float) - LAT0) * M_PER_DEG_LAT)
+
+# ----------------------------
+# ----- Segment geometry -----
+# ----------------------------
+def build_segments(stations):
+    # Stations are numbered along each line, so consecutive `num` within
+    # a `linea` are adjacent stops.
+    s = stations.sort_values(["linea", "num"]).reset_index(drop=True)
+    nxt = s.groupby("linea").shift(-1)
+    keep = nxt["num"].notna()
+
+    seg = pd.DataFrame({
+        "linea": s.loc[keep, "linea"],
+        "from_num": s.loc[keep, "num"],
+        "to_num": nxt.loc[keep, "num"].astype(s["num"].dtype),
+        "from_nombre": s.loc[keep, "nombre"],
+        "to_nombre": nxt.loc[keep, "nombre"],
+        "lat0": s.loc[keep, "lat"], "lon0": s.loc[keep, "lon"],
+        "lat1": nxt.loc[keep, "lat"], "lon1": nxt.loc[keep, "lon"],
+    }).reset_index(drop=True)
+
+    x0, y0 = _project(seg["lat0"], seg["lon0"])
+    x1, y1 = _project(seg["lat1"], seg["lon1"])
+    seg["length_m"] = np.hypot(x1 - x0, y1 - y0)
+
+    too_long = seg["length_m"] > MAX_SEGMENT_M
+    if too_long.any():
+        print(f"Skipping {int(too_long.sum())} segments longer than {MAX_SEGMENT_M:.0f} m.")
+    seg = seg[~too_long].reset_index(drop=True)
+    seg.insert(0, "segment_id", np.arange(len(seg), dtype=np.int32))
+    return seg
+
+def corridor_polygons(segments, corridor_m=CORRIDOR_M):
+    x0, y0 = _project(segments["lat0"], segments["lon0"])
+    x1, y1 = _project(segments["lat1"], segments["lon1"])
+    coords = np.stack([np.column_stack([x0, y0]), np.column_stack([x1, y1])], axis=1)
+    return shapely.buffer(shapely.linestrings(coords), corridor_m)
+
+# ----------------------------
+# ----- Crime assignment -----
+# ----------------------------
+def count_segment_crimes(segments, crimes, corridor_m=CORRIDOR_M):
+    """
+    Crimes inside each buffered corridor by hour and category. A crime
+    near a shared station counts for every corridor that contains it.
+    """
+    tree = shapely.STRtree(corridor_polygons(segments, corridor_m))
+    n_cat = len(CUBE_CATEGORIES)
+    counts = np.zeros(len(segments) * 24 * n_cat, dtype=np.int64)
+
+    for start in range(0, len(crimes), CHUNK):
+        part = crimes.iloc[start:start + CHUNK]
+        x, y = _project(part["latitud"], part["longitud"])
+        p_idx, s_idx = tree.query(shapely.points(x, y), predicate="within")
+        hora = part["hora"].to_numpy()[p_idx].astype(np.int64)
+        cat = part["category"].to_numpy()[p_idx].astype(np.int64)
+        ok = (hora >= 0) & (hora < 24)
+        key = (s_idx[ok] * 24 + hora[ok]) * n_cat + cat[ok]
+        counts += np.bincount(key, minlength=len(counts))
+
+    seg_id, hora, cat = np.unravel_index(np.flatnonzero(counts), (len(segments), 24, n_cat))
+    return pd.DataFrame({
+        "segment_id": segments["segment_id"].to_numpy()[seg_id],
+        "hora": hora.astype(np.int8),
+        "category": cat.astype(np.int8),
+        "n": counts[counts > 0].astype(np.int32),
+    })
+
+def build_segment_tables(corridor_m=CORRIDOR_M):
+    t0 = time.perf_counter()
+    stations = run_query("SELECT num, linea, nombre, lat, lon FROM lines_metro WHERE lat IS NOT NULL AND lon IS NOT NULL")
+    segments = build_segments(stations)
+    segments["corridor_m"] = corridor_m
+
+    crimes = get_crime_hour_categories()
+    crimes["hora"] = crimes["hora"].fillna(-1)
+    counts = count_segment_crimes(segments, crimes, corridor_m)
+
+    con = get_connection()
+    try:
+        for name, df in [(SEGMENTS_TABLE, segments), (COUNTS_TABLE, counts)]:
+            con.register("df_table", df)
+            con.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM df_table")
+            con.unregister("df_table")
+    finally:
+        con.close()
+
+    print(f"- {SEGMENTS_TABLE}: {len(segments)} segments, {COUNTS_TABLE}: {len(counts)} rows "
+          f"({int(counts['n'].sum())} crime-segment pairs) in {time.perf_counter() - t0:.1f}s")
+    return segments, counts
+
+# ----------------------------
+# -------- Query API ---------
+# ----------------------------
+def segment_risk(hour_range=None, categories=None):
+    """
+    Crimes per segment corridor from the precomputed counts, optionally
+    for an hour range (inclusive) and a list of CUBE_CATEGORIES.
+    risk_index is crimes per km relative to the network median (1 = median).
+    """
+    df = get_segment_crime_totals(hour_range, tuple(categories) if categories else None)
+    if df.empty:
+        return df
+    df = df.copy()
+    df["per_km"] = df["n"] / (df["length_m"] / 1000.0).clip(lower=0.1)
+    median = df["per_km"].median()
+    df["risk_index"] = df["per_km"] / median if median > 0 else 0.0
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Metro segment corridors and their crime counts.")
+    parser.add_argument("--corridor-m", type=float, default=CORRIDOR_M)
+    args = parser.parse_args()
+
+    build_segment_tables(corridor_m=args.corridor_m)
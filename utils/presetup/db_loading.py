@@ -1,10 +1,13 @@
 # !! This is NOT meant to run as a module.
 # This was executed manually as an app setup.
 import duckdb
+import numpy as np
 import pandas as pd
 import os
+import sys
 import json
 
+from sklearn.neighbors import BallTree
 from unidecode import unidecode
 
 # Base path to the root
@@ -20,6 +23,13 @@ BOROUGH_JSON = os.path.join(DATA_DIR, "limite-de-las-alcaldas.json")
 METRO_CSV = os.path.join(DATA_DIR, "lineas_metro.csv")
 AFFLUENCE_CSV = os.path.join(DATA_DIR, "affluence_with_num_key.csv")
 
+EARTH_RADIUS_M = 6371000.0
+# crime_station_knn keeps every station within this distance of each
+# crime, so radius queries on it are exact up to it. Must match
+# MAX_STATION_RADIUS_M in utils/database_queries.py.
+MAX_STATION_RADIUS_M = 1000.0
+RADIUS_CHUNK = 500_000
+
 # ----------------------------
 # ---- Cleaning Functions ----
 # ----------------------------
@@ -70,9 +80,67 @@ def clean_data(df):
     df['Year'] = df['fecha_hecho'].dt.year
     df['Hour'] = pd.to_datetime(df['hora_hecho_dt'], format='%H:%M:%S', errors='coerce').dt.hour
 
+    df.insert(0, 'crime_id', np.arange(len(df), dtype=np.int64))
+
     print("Data cleaned. Final shape:", df.shape)
     return df
 
+# ----------------------------
+# --- Station Assignment -----
+# ----------------------------
+def assign_nearest_stations(con, max_radius_m=MAX_STATION_RADIUS_M):
+    cols = con.execute("SELECT column_name FROM information_schema.columns WHERE table_name = 'crimes_clean'").fetchdf()
+    if 'crime_id' not in cols['column_name'].values:
+        con.execute("CREATE OR REPLACE TABLE crimes_clean AS SELECT row_number() OVER () - 1 AS crime_id, * FROM crimes_clean")
+
+    crimes = con.execute("""
+        SELECT crime_id, latitud, longitud FROM crimes_clean
+        WHERE latitud IS NOT NULL AND longitud IS NOT NULL
+    """).fetchdf()
+    stations = con.execute("SELECT num, lat, lon FROM lines_metro WHERE lat IS NOT NULL AND lon IS NOT NULL").fetchdf()
+
+    tree = BallTree(np.radians(stations[['lat', 'lon']].values), metric='haversine')
+    X = np.radians(crimes[['latitud', 'longitud']].values)
+    crime_ids = crimes['crime_id'].to_numpy()
+    station_nums = stations['num'].to_numpy()
+
+    # Nearest station of every crime, however far
+    dist, idx = tree.query(X, k=1)
+    dist = (dist[:, 0] * EARTH_RADIUS_M).astype(np.float32)
+    nearest = station_nums[idx[:, 0]]
+
+    # Every station within max_radius_m, in chunks to bound memory
+    parts = []
+    for start in range(0, len(X), RADIUS_CHUNK):
+        ind, d = tree.query_radius(X[start:start + RADIUS_CHUNK], r=max_radius_m / EARTH_RADIUS_M,
+                                   return_distance=True, sort_results=True)
+        counts = np.fromiter((len(i) for i in ind), dtype=np.int64, count=len(ind))
+        parts.append(pd.DataFrame({
+            'crime_id': np.repeat(crime_ids[start:start + RADIUS_CHUNK], counts),
+            'rank': (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + 1).astype(np.int16),
+            'station_num': station_nums[np.concatenate(ind)],
+            'dist_m': (np.concatenate(d) * EARTH_RADIUS_M).astype(np.float32)
+        }))
+    df_knn = pd.concat(parts, ignore_index=True)
+    con.register("df_knn", df_knn)
+    con.execute("CREATE OR REPLACE TABLE crime_station_knn AS SELECT * FROM df_knn ORDER BY station_num, dist_m")
+
+    df_nearest = pd.DataFrame({
+        'crime_id': crimes['crime_id'].to_numpy(),
+        'nearest_station': nearest,
+        'nearest_dist_m': dist
+    })
+    con.register("df_nearest", df_nearest)
+    con.execute("""
+        CREATE OR REPLACE TABLE crimes_clean AS
+        SELECT COLUMNS(c -> c NOT IN ('nearest_station', 'nearest_dist_m')),
+               n.nearest_station, n.nearest_dist_m
+        FROM crimes_clean
+        LEFT JOIN df_nearest n USING (crime_id)
+        ORDER BY crime_id
+    """)
+    print(f"Nearest stations assigned: {len(crimes)} crimes, {len(df_knn)} pairs within {max_radius_m:.0f} m")
+
 # ----------------------------
 # ---- Load CSV into DB ------
 # ----------------------------
@@ -136,8 +204,15 @@ def create_database():
         except Exception as e:
             print(f"Error loading 'daily_affluence': {e}")
 
+        # Nearest metro stations per crime
+        try:
+            assign_nearest_stations(con)
+            print("Table 5: 'crime_station_knn' CREATED")
+        except Exception as e:
+            print(f"Error assigning nearest stations: {e}")
+
         # Confirm row counts
-        for table in ["crimes_clean", "lines_metro", "borough_limits", "daily_affluence"]:
+        for table in ["crimes_clean", "lines_metro", "borough_limits", "daily_affluence", "crime_station_knn"]:
             count = con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
             print(f"- {table}: {count} rows")
 
@@ -148,4 +223,10 @@ def create_database():
         print(f"Error: {e}")
 
 if __name__ == "__main__":
-    create_database()
\ No newline at end of file
+    # --stations only adds the nearest-station columns to an existing DB
+    if "--stations" in sys.argv:
+        con = duckdb.connect(DB_FILE)
+        assign_nearest_stations(con)
+        con.close()
+    else:
+        create_database()
\ No newline at end of file
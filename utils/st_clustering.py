@@ -0,0 +1,241 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from sklearn.neighbors import BallTree
+
+from utils.database_queries import get_connection, run_query
+
+EARTH_RADIUS_M = 6371000.0
+
+EPS_M = 150.0
+EPS_DAYS = 7
+MIN_SAMPLES = 10
+STATION_RADIUS_M = 500.0
+
+CLUSTERS_TABLE = "crime_clusters"
+# One row per processed month, with the source row count it was clustered
+# from, so incremental runs pick up empty months and late-loaded crimes
+MONTHS_TABLE = "crime_cluster_months"
+
+# ----------------------------
+# -------- ST-DBSCAN ---------
+# ----------------------------
+def st_dbscan(lat, lon, t_days, eps_m=EPS_M, eps_days=EPS_DAYS, min_samples=MIN_SAMPLES):
+    """
+    Density clustering over (lat, lon, time). Two points are neighbours
+    when they are within eps_m on the sphere and eps_days in time.
+    Returns one label per point, -1 for noise.
+    """
+    n = len(lat)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    X = np.radians(np.column_stack([lat, lon]))
+    neigh = BallTree(X, metric='haversine').query_radius(X, r=eps_m / EARTH_RADIUS_M)
+
+    rows = np.repeat(np.arange(n), [len(ix) for ix in neigh])
+    cols = np.concatenate(neigh)
+    close_in_time = np.abs(t_days[rows] - t_days[cols]) <= eps_days
+    rows, cols = rows[close_in_time], cols[close_in_time]
+
+    # Neighbourhoods include the point itself, as in DBSCAN
+    core = np.bincount(rows, minlength=n) >= min_samples
+
+    labels = np.full(n, -1, dtype=np.int64)
+    core_edges = core[rows] & core[cols]
+    graph = coo_matrix(
+        (np.ones(core_edges.sum(), dtype=np.int8), (rows[core_edges], cols[core_edges])),
+        shape=(n, n)
+    )
+    _, comp = connected_components(graph, directed=False)
+    _, core_labels = np.unique(comp[core], return_inverse=True)
+    labels[core] = core_labels
+
+    # Border points join the cluster of their first core neighbour
+    border = ~core[rows] & core[cols]
+    b_rows, b_cols = rows[border], cols[border]
+    first = np.unique(b_rows, return_index=True)[1]
+    labels[b_rows[first]] = labels[b_cols[first]]
+    return labels
+
+def _summarize_clusters(month, df, labels, station_tree, station_nums):
+    df = df.assign(cluster=labels)
+    df = df[df['cluster'] >= 0]
+    if df.empty:
+        return pd.DataFrame()
+
+    g = df.groupby('cluster')
+    out = g.agg(
+        n_crimes=('latitud', 'size'),
+        lat=('latitud', 'mean'),
+        lon=('longitud', 'mean'),
+        fecha_inicio=('fecha_hecho', 'min'),
+        fecha_fin=('fecha_hecho', 'max'),
+        top_delito=('delito', lambda s: s.value_counts().index[0]),
+    ).reset_index().rename(columns={'cluster': 'cluster_id'})
+
+    centroid = out.set_index('cluster_id')[['lat', 'lon']].loc[df['cluster']].to_numpy()
+    spread = _haversine_m(df['latitud'].to_numpy(), df['longitud'].to_numpy(), centroid[:, 0], centroid[:, 1])
+    out['radius_m'] = pd.Series(spread).groupby(df['cluster'].to_numpy()).max().to_numpy()
+
+    dist, idx = station_tree.query(np.radians(out[['lat', 'lon']].to_numpy()), k=1)
+    out['nearest_station'] = station_nums[idx[:, 0]]
+    out['station_dist_m'] = dist[:, 0] * EARTH_RADIUS_M
+    out.insert(0, 'month', month)
+    return out
+
+def _haversine_m(lat1, lon1, lat2, lon2):
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    a = (np.sin((p2 - p1) / 2) ** 2
+         + np.cos(p1) * np.cos(p2) * np.sin(np.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+def _cluster_month(args):
+    # Runs in a worker process, one calendar month per task.
+    month, df, stations, eps_m, eps_days, min_samples = args
+    station_tree = BallTree(np.radians(stations[['lat', 'lon']].to_numpy()), metric='haversine')
+
+    t_days = (df['fecha_hecho'] - month).dt.total_seconds().to_numpy() / 86400.0
+    labels = st_dbscan(df['latitud'].to_numpy(), df['longitud'].to_numpy(), t_days,
+                       eps_m=eps_m, eps_days=eps_days, min_samples=min_samples)
+    return _summarize_clusters(month, df, labels, station_tree, stations['num'].to_numpy())
+
+# ----------------------------
+# ------- Batch runner -------
+# ----------------------------
+def _months_to_process(incremental, params):
+    """
+    Months with their current crimes_clean row count. Incremental runs
+    keep only months never processed, or processed from a different row
+    count or with different parameters.
+    """
+    months = run_query("""
+    SELECT CAST(date_trunc('month', fecha_hecho) AS DATE) AS month, COUNT(*) AS n_source
+    FROM crimes_clean
+    WHERE fecha_hecho IS NOT NULL
+    GROUP BY month
+    ORDER BY month
+    """)
+    months['month'] = pd.to_datetime(months['month'])
+
+    if incremental:
+        con = get_connection()
+        try:
+            exists = con.execute(
+                f"SELECT COUNT(*) FROM information_schema.tables WHERE table_name = '{MONTHS_TABLE}'"
+            ).fetchone()[0]
+            done = con.execute(f"SELECT * FROM {MONTHS_TABLE}").fetchdf() if exists else pd.DataFrame()
+        finally:
+            con.close()
+        if not done.empty:
+            done['month'] = pd.to_datetime(done['month'])
+            merged = months.merge(done, on='month', how='left', suffixes=('', '_done'))
+            fresh = merged['n_source'] == merged['n_source_done']
+            for name, value in params.items():
+                fresh &= merged[name] == value
+            months = months[~fresh.to_numpy()]
+    return months.reset_index(drop=True)
+
+def _load_month_crimes(months, station_radius_m):
+    month_list = ", ".join(f"DATE '{m:%Y-%m-%d}'" for m in months)
+    df = run_query(f"""
+    SELECT latitud, longitud, fecha_hecho, delito,
+           CAST(date_trunc('month', fecha_hecho) AS DATE) AS month
+    FROM crimes_clean
+    WHERE fecha_hecho IS NOT NULL
+    AND nearest_dist_m <= {station_radius_m}
+    AND CAST(date_trunc('month', fecha_hecho) AS DATE) IN ({month_list})
+    """)
+    df['fecha_hecho'] = pd.to_datetime(df['fecha_hecho'])
+    df['month'] = pd.to_datetime(df['month'])
+    return df
+
+def run_clustering(incremental=True, eps_m=EPS_M, eps_days=EPS_DAYS, min_samples=MIN_SAMPLES,
+                   station_radius_m=STATION_RADIUS_M, workers=None):
+    t0 = time.perf_counter()
+    params = {"eps_m": eps_m, "eps_days": eps_days, "min_samples": min_samples,
+              "station_radius_m": station_radius_m}
+    todo = _months_to_process(incremental, params)
+    if todo.empty:
+        print("No new or changed months to cluster.")
+        return pd.DataFrame()
+    months = list(todo['month'])
+
+    stations = run_query("SELECT num, lat, lon FROM lines_metro WHERE lat IS NOT NULL AND lon IS NOT NULL")
+    crimes = _load_month_crimes(months, station_radius_m)
+    print(f"Clustering {len(months)} months, {len(crimes)} crimes within {station_radius_m:.0f} m of a station.")
+
+    tasks = [
+        (m, g.drop(columns='month'), stations, eps_m, eps_days, min_samples)
+        for m, g in crimes.groupby('month')
+    ]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        parts = [p for p in pool.map(_cluster_month, tasks) if not p.empty]
+
+    clusters = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+    if not clusters.empty:
+        clusters = clusters.assign(eps_m=eps_m, eps_days=eps_days, min_samples=min_samples)
+    processed = todo.assign(
+        n_clusters=todo['month'].map(clusters.groupby('month').size() if not clusters.empty else {}).fillna(0).astype(int),
+        processed_at=pd.Timestamp.now(), **params
+    )
+    _store_clusters(clusters, processed, replace_all=not incremental)
+
+    print(f"- {CLUSTERS_TABLE}: {len(clusters)} clusters in {time.perf_counter() - t0:.1f}s")
+    return clusters
+
+def _store_clusters(clusters, processed, replace_all):
+    con = get_connection()
+    try:
+        if replace_all:
+            con.execute(f"DROP TABLE IF EXISTS {CLUSTERS_TABLE}")
+            con.execute(f"DROP TABLE IF EXISTS {MONTHS_TABLE}")
+        con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CLUSTERS_TABLE} (
+            month DATE, cluster_id INTEGER, n_crimes INTEGER,
+            lat DOUBLE, lon DOUBLE,
+            fecha_inicio TIMESTAMP, fecha_fin TIMESTAMP,
+            top_delito VARCHAR, radius_m DOUBLE,
+            nearest_station INTEGER, station_dist_m DOUBLE,
+            eps_m DOUBLE, eps_days DOUBLE, min_samples INTEGER
+        )
+        """)
+        con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MONTHS_TABLE} (
+            month DATE, n_source INTEGER, n_clusters INTEGER, processed_at TIMESTAMP,
+            eps_m DOUBLE, eps_days DOUBLE, min_samples INTEGER, station_radius_m DOUBLE
+        )
+        """)
+        month_list = ", ".join(f"DATE '{m:%Y-%m-%d}'" for m in processed['month'])
+        con.execute(f"DELETE FROM {CLUSTERS_TABLE} WHERE month IN ({month_list})")
+        con.execute(f"DELETE FROM {MONTHS_TABLE} WHERE month IN ({month_list})")
+        if not clusters.empty:
+            con.register("df_clusters", clusters)
+            con.execute(f"INSERT INTO {CLUSTERS_TABLE} BY NAME SELECT * FROM df_clusters")
+        con.register("df_months", processed)
+        con.execute(f"INSERT INTO {MONTHS_TABLE} BY NAME SELECT * FROM df_months")
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Spatio-temporal crime clustering around metro stations.")
+    parser.add_argument("--full", action="store_true", help="Recompute every month instead of only new or changed ones.")
+    parser.add_argument("--eps-m", type=float, default=EPS_M)
+    parser.add_argument("--eps-days", type=float, default=EPS_DAYS)
+    parser.add_argument("--min-samples", type=int, default=MIN_SAMPLES)
+    parser.add_argument("--station-radius", type=float, default=STATION_RADIUS_M)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    run_clustering(
+        incremental=not args.full,
+        eps_m=args.eps_m, eps_days=args.eps_days, min_samples=args.min_samples,
+        station_radius_m=args.station_radius, workers=args.workers
+    )
@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from utils.database_queries import run_query
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+TILES_DIR = os.path.join(BASE_DIR, "data", "tiles", "crimes")
+TILE_URL = os.environ.get("CRIME_TILES_URL", "http://localhost:8765/{z}/{x}/{y}.pbf")
+
+LAYER_NAME = "crimes"
+EXTENT = 4096
+MIN_ZOOM = 12
+MAX_ZOOM = 16
+# Lower zooms are thinned to this many points per tile
+MAX_FEATURES_PER_TILE = 20000
+
+# ----------------------------
+# ------ Protobuf / MVT ------
+# ----------------------------
+# Only what a point layer needs from the Mapbox Vector Tile 2.1 spec.
+def _varint(n):
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+def _field(number, wire_type):
+    return _varint((number << 3) | wire_type)
+
+def _bytes_field(number, payload):
+    return _field(number, 2) + _varint(len(payload)) + payload
+
+def _packed(number, values):
+    return _bytes_field(number, b"".join(_varint(v) for v in values))
+
+def encode_point_tile(xs, ys, props, layer_name=LAYER_NAME):
+    """
+    One MVT tile with a single point layer.
+    xs, ys: integer tile-local coordinates in [0, EXTENT).
+    props: {key: array of strings}, one value per point.
+    """
+    keys = list(props)
+    values, tags = [], []
+    for k in keys:
+        codes, uniques = pd.factorize(pd.Series(props[k], dtype=object).fillna(""))
+        tags.append(codes + len(values))
+        values.extend(uniques)
+    tags = np.column_stack(tags) if tags else np.empty((len(xs), 0), dtype=int)
+
+    point_type = _field(3, 0) + _varint(1)
+    features = []
+    for x, y, t in zip(xs.tolist(), ys.tolist(), tags.tolist()):
+        tag_pairs = [v for i, code in enumerate(t) for v in (i, code)]
+        feature = (_packed(2, tag_pairs) + point_type
+                   + _packed(4, (9, _zigzag(x), _zigzag(y))))  # MoveTo(1)
+        features.append(_bytes_field(2, feature))
+
+    layer = (_field(15, 0) + _varint(2)
+             + _bytes_field(1, layer_name.encode())
+             + b"".join(features)
+             + b"".join(_bytes_field(3, k.encode()) for k in keys)
+             + b"".join(_bytes_field(4, _bytes_field(1, v.encode())) for v in values)
+             + _field(5, 0) + _varint(EXTENT))
+    return _bytes_field(3, layer)
+
+# ----------------------------
+# ------- Tile pyramid -------
+# ----------------------------
+def _mercator(lat, lon, z):
+    n = 2 ** z
+    x = (lon + 180.0) / 360.0 * n
+    lat_r = np.radians(lat)
+    y = (1.0 - np.log(np.tan(lat_r) + 1.0 / np.cos(lat_r)) / np.pi) / 2.0 * n
+    return x, y
+
+def _write_zoom(z, df, out_dir):
+    x, y = _mercator(df['latitud'].to_numpy(), df['longitud'].to_numpy(), z)
+    tx, ty = np.floor(x).astype(np.int64), np.floor(y).astype(np.int64)
+    px = np.minimum(((x - tx) * EXTENT).astype(np.int64), EXTENT - 1)
+    py = np.minimum(((y - ty) * EXTENT).astype(np.int64), EXTENT - 1)
+
+    order = np.lexsort((ty, tx))
+    key = tx[order] * (1 << 32) + ty[order]
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    ends = np.r_[starts[1:], len(order)]
+
+    delito = df['delito'].to_numpy(dtype=object)
+    fecha = df['fecha'].to_numpy(dtype=object)
+    rng = np.random.default_rng(z)
+    n_tiles = 0
+    for a, b in zip(starts, ends):
+        idx = order[a:b]
+        if len(idx) > MAX_FEATURES_PER_TILE:
+            idx = np.sort(rng.choice(idx, MAX_FEATURES_PER_TILE, replace=False))
+        tile = encode_point_tile(px[idx], py[idx], {'delito': delito[idx], 'fecha': fecha[idx]})
+        path = os.path.join(out_dir, str(z), str(tx[idx[0]]))
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, f"{ty[idx[0]]}.pbf"), "wb") as f:
+            f.write(tile)
+        n_tiles += 1
+    return z, n_tiles
+
+def build_tiles(out_dir=TILES_DIR, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, workers=None):
+    t0 = time.perf_counter()
+    df = run_query("""
+    SELECT latitud, longitud, delito, strftime(fecha_hecho, '%Y-%m-%d') AS fecha
+    FROM crimes_clean
+    WHERE latitud IS NOT NULL AND longitud IS NOT NULL
+    """)
+    print(f"Building tiles z{min_zoom}-{max_zoom} for {len(df)} crimes into {out_dir}")
+
+    zooms = range(min_zoom, max_zoom + 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for z, n_tiles in pool.map(partial(_write_zoom, df=df, out_dir=out_dir), zooms):
+            print(f"- z{z}: {n_tiles} tiles")
+
+    metadata = {
+        "name": LAYER_NAME,
+        "format": "pbf",
+        "minzoom": min_zoom,
+        "maxzoom": max_zoom,
+        "bounds": [float(df['longitud'].min()), float(df['latitud'].min()),
+                   float(df['longitud'].max()), float(df['latitud'].max())],
+        "fields": {"delito": "String", "fecha": "String"},
+        "count": len(df),
+    }
+    with open(os.path.join(out_dir, "metadata.json"), "w") as f:
+        json.dump(metadata, f, indent=2)
+    print(f"Done in {time.perf_counter() - t0:.1f}s")
+
+def tiles_available(out_dir=TILES_DIR):
+    return os.path.exists(os.path.join(out_dir, "metadata.json"))
+
+# ----------------------------
+# ------- Tile server --------
+# ----------------------------
+class _TileHandler(SimpleHTTPRequestHandler):
+    extensions_map = {".pbf": "application/x-protobuf", ".json": "application/json"}
+
+    def end_headers(self):
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Cache-Control", "public, max-age=86400")
+        super().end_headers()
+
+    def send_error(self, code, message=None, explain=None):
+        # Tiles with no crimes are simply absent: answer with an empty tile
+        if code == 404 and self.path.endswith(".pbf"):
+            self.send_response(204)
+            self.end_headers()
+            return
+        super().send_error(code, message, explain)
+
+    def log_message(self, format, *args):
+        pass
+
+# Loopback only unless a host is given: the browser that renders the map
+# usually runs on the same machine as the app
+def serve_tiles(out_dir=TILES_DIR, port=8765, host="127.0.0.1"):
+    handler = partial(_TileHandler, directory=out_dir)
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Serving {out_dir} at http://{host}:{port}/{{z}}/{{x}}/{{y}}.pbf")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline vector tiles for crimes_clean.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build")
+    build.add_argument("--out", default=TILES_DIR)
+    build.add_argument("--min-zoom", type=int, default=MIN_ZOOM)
+    build.add_argument("--max-zoom", type=int, default=MAX_ZOOM)
+    build.add_argument("--workers", type=int, default=None)
+    serve = sub.add_parser("serve")
+    serve.add_argument("--dir", default=TILES_DIR)
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--host", default="127.0.0.1", help="Interface to bind; 0.0.0.0 exposes the tiles to the network.")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_tiles(args.out, args.min_zoom, args.max_zoom, args.workers)
+    else:
+        serve_tiles(args.dir, args.port, args.host)